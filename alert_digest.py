@@ -0,0 +1,124 @@
+import logging
+import math
+import os
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def build_contact_sheet(events, tile_width=320, max_tiles=12, jpeg_quality=80):
+    """
+    Buduje arkusz miniatur (siatkę) z podglądów detekcji w jednym przebiegu.
+
+    Args:
+        events: Lista zdarzeń digestu (dict z kluczami artifact, location, time, confidence)
+
+    Returns:
+        Bajty JPEG lub None, jeśli żadne zdarzenie nie ma podglądu
+    """
+    # Artefakty odtworzone po restarcie nie mają podglądu - tworzony z zapisanego obrazu
+    tiles = [e for e in events if e.get('artifact') is not None and e['artifact'].ensure_preview()][:max_tiles]
+    if not tiles:
+        return None
+
+    tile_height = int(tile_width * 9 / 16)
+    cols = min(len(tiles), int(math.ceil(math.sqrt(len(tiles)))))
+    rows = int(math.ceil(len(tiles) / float(cols)))
+    sheet = np.zeros((rows * tile_height, cols * tile_width, 3), dtype=np.uint8)
+
+    for i, event in enumerate(tiles):
+        preview = cv2.imdecode(np.frombuffer(event['artifact'].preview, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if preview is None:
+            continue
+        h, w = preview.shape[:2]
+        scale = min(tile_width / float(w), tile_height / float(h))
+        resized = cv2.resize(preview, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        rh, rw = resized.shape[:2]
+        top = (i // cols) * tile_height + (tile_height - rh) // 2
+        left = (i % cols) * tile_width + (tile_width - rw) // 2
+        sheet[top:top + rh, left:left + rw] = resized
+
+        label = f"{event.get('location', '')} {event['time'].strftime('%H:%M:%S')} {event.get('confidence', 0):.0%}"
+        origin = ((i % cols) * tile_width + 4, (i // cols) * tile_height + tile_height - 6)
+        cv2.putText(sheet, label, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 3)
+        cv2.putText(sheet, label, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+    success, buffer = cv2.imencode('.jpg', sheet, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return buffer.tobytes() if success else None
+
+
+class AlertDigest:
+    """
+    Tryb digest: zbiera detekcje przez okno czasowe i przekazuje je razem
+    do on_flush, zamiast wysyłać osobny SMS i e-mail dla każdej strefy.
+
+    Okno otwiera pierwsze zdarzenie; po window sekundach wszystkie zebrane
+    zdarzenia są wysyłane jednym wywołaniem.
+    """
+
+    def __init__(self, on_flush, window=60.0, max_events=200):
+        self.on_flush = on_flush
+        self.window = window
+        self.max_events = max_events
+
+        self._lock = threading.Lock()
+        self._events = []
+        self._timer = None
+        self.digests_sent = 0
+        self.events_coalesced = 0
+
+    @classmethod
+    def from_env(cls, on_flush):
+        """Zwraca AlertDigest lub None, jeśli ALERT_DIGEST_ENABLED jest wyłączone."""
+        if not _env_bool('ALERT_DIGEST_ENABLED'):
+            return None
+        return cls(on_flush, window=float(os.getenv('ALERT_DIGEST_WINDOW', '60')))
+
+    def add(self, event):
+        """Dodaje zdarzenie do bieżącego okna (otwiera okno, jeśli żadne nie trwa)."""
+        flush_now = False
+        with self._lock:
+            self._events.append(event)
+            if len(self._events) >= self.max_events:
+                flush_now = True
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not events:
+            return
+        self.digests_sent += 1
+        self.events_coalesced += len(events)
+        try:
+            self.on_flush(events)
+        except Exception as e:
+            logger.error(f"Error sending alert digest ({len(events)} events): {e}")
+
+    def get_stats(self):
+        with self._lock:
+            pending = len(self._events)
+        return {
+            'window_s': self.window,
+            'pending_events': pending,
+            'digests_sent': self.digests_sent,
+            'events_coalesced': self.events_coalesced,
+        }
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class TokenBucket:
+    """Kubełek tokenów: capacity tokenów, uzupełniany z szybkością refill_rate tokenów/s."""
+
+    __slots__ = ('capacity', 'refill_rate', 'tokens', 'updated_at')
+
+    def __init__(self, capacity, refill_rate, now):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.tokens = float(capacity)
+        self.updated_at = now
+
+    def _refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+            self.updated_at = now
+
+    def try_take(self, now):
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def next_available(self, now):
+        """Czas (timestamp), od którego dostępny będzie kolejny token."""
+        self._refill(now)
+        if self.tokens >= 1.0 or self.refill_rate <= 0:
+            return now if self.tokens >= 1.0 else None
+        return now + (1.0 - self.tokens) / self.refill_rate
+
+
+class SlidingWindow:
+    """Limit max_events zdarzeń w ostatnich window sekundach (0 = bez limitu, tylko licznik)."""
+
+    __slots__ = ('max_events', 'window', 'events')
+
+    def __init__(self, max_events, window):
+        self.max_events = max_events
+        self.window = window
+        self.events = deque()
+
+    def _expire(self, now):
+        while self.events and now - self.events[0] >= self.window:
+            self.events.popleft()
+
+    def _has_room(self):
+        return not self.max_events or len(self.events) < self.max_events
+
+    def try_take(self, now):
+        self._expire(now)
+        if self._has_room():
+            self.events.append(now)
+            return True
+        return False
+
+    def next_available(self, now):
+        self._expire(now)
+        if self._has_room():
+            return now
+        return self.events[0] + self.window
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class AlertThrottle:
+    """
+    Silnik ograniczania alertów.
+
+    - Strefy: cooldown po każdym alercie + kubełek tokenów (burst, alerty/godzinę).
+    - Kanały (sms, email): przesuwne okno (maks. wiadomości na godzinę);
+      domyślnie bez limitu - limit kanału pomija alerty, więc włączany jest jawnie.
+
+    Decyzja to kilka operacji arytmetycznych pod krótką blokadą - nie wykonuje
+    żadnego I/O, więc może być wywoływana bezpośrednio z pętli kamery.
+    """
+
+    def __init__(self, zone_cooldown=300.0, zone_burst=3, zone_per_hour=12, channel_per_hour=None):
+        self.zone_cooldown = zone_cooldown
+        self.zone_burst = zone_burst
+        self.zone_per_hour = zone_per_hour
+        self.channel_per_hour = {'sms': 0, 'email': 0}
+        if channel_per_hour:
+            self.channel_per_hour.update(channel_per_hour)
+
+        self._lock = threading.Lock()
+        self._zone_buckets = {}
+        self._zone_cooldown_until = {}
+        self._zone_last_alert = {}
+        self._zone_suppressed = {}
+        self._channels = {
+            channel: SlidingWindow(limit, 3600.0) for channel, limit in self.channel_per_hour.items()
+        }
+        self._channel_suppressed = {channel: 0 for channel in self.channel_per_hour}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            zone_cooldown=float(os.getenv('ALERT_ZONE_COOLDOWN', '300')),
+            zone_burst=int(os.getenv('ALERT_ZONE_BURST', '3')),
+            zone_per_hour=float(os.getenv('ALERT_ZONE_PER_HOUR', '12')),
+            channel_per_hour={
+                'sms': int(os.getenv('ALERT_SMS_PER_HOUR', '0')),
+                'email': int(os.getenv('ALERT_EMAIL_PER_HOUR', '0')),
+            }
+        )
+
+    def configure(self, zone_cooldown=None):
+        """Zmienia cooldown stref w locie (np. z ustawień)."""
+        if zone_cooldown is not None:
+            self.zone_cooldown = zone_cooldown
+
+    def _zone_bucket(self, zone_name, now):
+        bucket = self._zone_buckets.get(zone_name)
+        if bucket is None:
+            bucket = TokenBucket(self.zone_burst, self.zone_per_hour / 3600.0, now)
+            self._zone_buckets[zone_name] = bucket
+        return bucket
+
+    def allow_zone(self, zone_name, now=None):
+        """
+        Decyduje, czy detekcja w strefie ma wywołać alert.
+
+        Returns:
+            (True, None) jeśli alert dozwolony, (False, muted_until_timestamp) w przeciwnym razie
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            cooldown_until = self._zone_cooldown_until.get(zone_name, 0.0)
+            if now < cooldown_until:
+                self._zone_suppressed[zone_name] = self._zone_suppressed.get(zone_name, 0) + 1
+                return False, cooldown_until
+
+            bucket = self._zone_bucket(zone_name, now)
+            if not bucket.try_take(now):
+                self._zone_suppressed[zone_name] = self._zone_suppressed.get(zone_name, 0) + 1
+                return False, bucket.next_available(now)
+
+            self._zone_cooldown_until[zone_name] = now + self.zone_cooldown
+            self._zone_last_alert[zone_name] = now
+            return True, None
+
+    def allow_channel(self, channel, now=None):
+        """Decyduje, czy kanał (sms/email) może wysłać kolejną wiadomość."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            window = self._channels.get(channel)
+            if window is None:
+                return True
+            if window.try_take(now):
+                return True
+            self._channel_suppressed[channel] += 1
+            return False
+
+    def reset_zone(self, zone_name=None):
+        """Zdejmuje wyciszenie ze strefy (lub ze wszystkich stref)."""
+        with self._lock:
+            names = [zone_name] if zone_name is not None else list(self._zone_cooldown_until)
+            for name in names:
+                self._zone_cooldown_until.pop(name, None)
+                self._zone_buckets.pop(name, None)
+
+    def get_state(self):
+        """Stan silnika dla API: wyciszone strefy (do kiedy), tokeny, limity kanałów."""
+        now = time.time()
+        with self._lock:
+            zones = {}
+            for zone_name in set(self._zone_buckets) | set(self._zone_cooldown_until):
+                bucket = self._zone_bucket(zone_name, now)
+                cooldown_until = self._zone_cooldown_until.get(zone_name, 0.0)
+                muted_until = cooldown_until if cooldown_until > now else None
+                if muted_until is None and bucket.tokens < 1.0:
+                    muted_until = bucket.next_available(now)
+                zones[zone_name] = {
+                    'muted': muted_until is not None,
+                    'muted_until': _iso(muted_until),
+                    'tokens': round(bucket.tokens, 2),
+                    'last_alert': _iso(self._zone_last_alert.get(zone_name)),
+                    'suppressed': self._zone_suppressed.get(zone_name, 0),
+                }
+            channels = {}
+            for channel, window in self._channels.items():
+                next_at = window.next_available(now)
+                channels[channel] = {
+                    'sent_last_hour': len(window.events),
+                    'limit_per_hour': window.max_events or None,
+                    'limited_until': _iso(next_at) if next_at > now else None,
+                    'suppressed': self._channel_suppressed[channel],
+                }
+            return {
+                'zone_cooldown_s': self.zone_cooldown,
+                'zone_burst': self.zone_burst,
+                'zone_per_hour': self.zone_per_hour,
+                'zones': zones,
+                'channels': channels,
+            }
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory, Response
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 import time
 import cv2
 from flask_cors import CORS
@@ -8,8 +8,19 @@ from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 from ultralytics import YOLO
-from models import db, User, Detection, Settings, DEFAULT_SCHEDULE
+from models import db, User, Detection, Notification, Settings, DEFAULT_SCHEDULE
 from camera_controller import CameraController
+from latency_tracer import LatencyTracer
+from schedule_evaluator import CompiledSchedule
+from dashboard_stats import DashboardStats, detection_item, detections_per_day
+from event_bus import EventBus
+from thumbnail_store import ThumbnailStore
+from storage_manager import StorageManager, get_media_root
+from werkzeug.exceptions import NotFound
+from detection_query import estimate_total, keyset_page, offset_page, parse_bound, parse_fields, parse_filters, parse_page, serialize_row
+from detection_rollup import query_series, subtract_detections
+from detection_export import EXPORT_FORMATS, export_filename, export_stream
+from db_config import DatabaseConfig
 import logging
 from flask_migrate import Migrate
 from sqlalchemy import func
@@ -34,12 +45,12 @@ CORS(
 )
 
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'novaya')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///admin.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-DETECTION_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detections')
+DETECTION_FOLDER = get_media_root()
 
-db.init_app(app)
+database = DatabaseConfig.from_env()
+database.init_app(app, db)
 migrate = Migrate(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -154,8 +165,40 @@ camera_controller = CameraController(
     email_recipient=GLOBAL_EMAIL_RECIPIENT,
     available_cameras_list=GLOBAL_CAMERA_LIST
 )
+camera_controller.init_app(app)
 logger.info("Camera controller initialized with global resources")
 
+dashboard_stats = DashboardStats.from_env()
+camera_controller.detection_writer.add_commit_listener(dashboard_stats.on_commit)
+event_bus = EventBus.from_env()
+thumbnails = camera_controller.anonymizer_worker.thumbnails
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+storage_manager = StorageManager.from_env(DETECTION_FOLDER, thumbnails=thumbnails)
+storage_manager.init_app(app)
+storage_manager.start()
+
+def _with_thumbnails(item):
+    """Adds thumbnail URLs (relative to /detections/) to a serialized detection with image_path."""
+    if 'image_path' in item:
+        item['thumbnails'] = thumbnails.urls(item['image_path'])
+    return item
+
+def _publish_committed(committed):
+    """Słuchacz commitów: nowe detekcje i zmiana statystyk jako zdarzenia SSE (bez zapytań do bazy)."""
+    if not committed:
+        return
+    for record in committed:
+        event_bus.publish('detection', _with_thumbnails(detection_item(record)))
+    cached = dashboard_stats.peek() or {}
+    event_bus.publish('stats', {
+        'added': len(committed),
+        'total_detections': cached.get('total_detections'),
+        'today_detections': cached.get('today_detections')
+    })
+
+camera_controller.detection_writer.add_commit_listener(_publish_committed)
+camera_controller.add_status_listener(lambda status: event_bus.publish('status', status))
+
 with app.app_context():
     try:
         settings = Settings.get_or_create_default()
@@ -197,29 +240,72 @@ def logout_api():
 @app.route('/api/detections', methods=['GET'])
 @login_required
 def get_detections():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    """
+    List detections newest-first.
+    Filters: from, to, location, min_confidence, status; projection: fields=id,timestamp,...
+    """
+    try:
+        where = parse_filters(request.args)
+        columns = parse_fields(request.args.get('fields'))
+        if 'cursor' not in request.args:
+            page, per_page = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if 'cursor' in request.args:
+        return get_detections_keyset(where, columns)
     
-    pagination = Detection.query.order_by(Detection.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    detections = pagination.items
+    rows, pagination = offset_page(db.session, columns, page, per_page, where)
     
     return jsonify({
-        'detections': [{
-            'id': d.id,
-            'timestamp': d.timestamp.isoformat(),
-            'location': d.location,
-            'confidence': d.confidence,
-            'image_path': os.path.basename(d.image_path),
-            'status': d.status
-        } for d in detections],
+        'detections': [_with_thumbnails(serialize_row(row)) for row in rows],
         'total_pages': pagination.pages,
         'current_page': pagination.page,
         'has_next': pagination.has_next,
         'has_prev': pagination.has_prev
     })
 
+def get_detections_keyset(where, columns):
+    """
+    Keyset pagination on (timestamp, id): ?cursor= (empty for the first page), limit, include_total.
+    Every page is an index seek, so deep pages cost the same as the first one.
+    """
+    limit = max(1, min(request.args.get('limit', request.args.get('per_page', 20, type=int), type=int), 100))
+    try:
+        rows, next_cursor, prev_cursor = keyset_page(
+            db.session, columns, limit, cursor=request.args.get('cursor') or None, where=where
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = {
+        'detections': [_with_thumbnails(serialize_row(row)) for row in rows],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_next': next_cursor is not None,
+        'has_prev': prev_cursor is not None
+    }
+    if request.args.get('include_total', 'false').lower() in ('1', 'true', 'yes'):
+        response.update(estimate_total(db.session, where, lambda: dashboard_stats.get()['total_detections']))
+    return jsonify(response)
+
+@app.route('/api/detections/export', methods=['GET'])
+@login_required
+def export_detections():
+    """
+    Stream all matching detections oldest-first: format=ndjson|csv|zip (zip = images + detections.ndjson).
+    Same filters and fields as /api/detections; memory use does not depend on the export size.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    try:
+        stream = export_stream(db.session, export_format, request.args, images_dir=DETECTION_FOLDER)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(stream), mimetype=EXPORT_FORMATS[export_format][0], headers={
+        'Content-Disposition': f'attachment; filename="{export_filename(export_format)}"',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/detections/<int:detection_id>', methods=['GET'])
 @login_required
 def get_detection_detail(detection_id: int):
@@ -230,16 +316,35 @@ def get_detection_detail(detection_id: int):
         'location': d.location,
         'confidence': d.confidence,
         'image_path': os.path.basename(d.image_path) if d.image_path else None,
+        'clip_path': d.clip_path,
         'status': d.status,
         'user_id': d.user_id
     })
 
+@app.route('/api/detections/<int:detection_id>/trace', methods=['GET'])
+@login_required
+def get_detection_trace(detection_id: int):
+    """Get the latency trace of one detection (capture ... per-channel send)"""
+    d = Detection.query.get_or_404(detection_id)
+    notifications = Notification.query.filter_by(detection_id=d.id).order_by(Notification.id).all()
+    return jsonify({
+        'id': d.id,
+        'trace': d.trace,
+        'notifications': {n.channel: {'status': n.status, 'trace': n.trace} for n in notifications},
+        'timeline': LatencyTracer.timeline(d.trace, [(n.channel, n.trace) for n in notifications])
+    })
+
 @app.route('/api/detections/<int:detection_id>', methods=['DELETE'])
 @login_required
 def delete_detection(detection_id: int):
     d = Detection.query.get_or_404(detection_id)
+    Notification.query.filter_by(detection_id=d.id).delete(synchronize_session=False)
+    subtract_detections(db.session, Detection.id == d.id)
     db.session.delete(d)
     db.session.commit()
+    dashboard_stats.invalidate()
+    event_bus.publish('deleted', {'ids': [detection_id]})
+    storage_manager.wake()
     return jsonify({'message': 'Detection deleted successfully'})
 
 @app.route('/api/detections/batch', methods=['DELETE'])
@@ -253,8 +358,13 @@ def delete_many_detections():
 
     try:
         ids_to_delete = [int(id) if isinstance(id, str) else id for id in ids_to_delete]
+        Notification.query.filter(Notification.detection_id.in_(ids_to_delete)).delete(synchronize_session=False)
+        subtract_detections(db.session, Detection.id.in_(ids_to_delete))
         num_deleted = Detection.query.filter(Detection.id.in_(ids_to_delete)).delete(synchronize_session=False)
         db.session.commit()
+        dashboard_stats.invalidate()
+        event_bus.publish('deleted', {'ids': ids_to_delete})
+        storage_manager.wake()
 
         return jsonify({'message': f'Usunięto {num_deleted} detekcji.', 'deleted_count': num_deleted}), 200
     except Exception as e:
@@ -262,64 +372,41 @@ def delete_many_detections():
         logger.error(f"Error deleting detections: {e}")
         return jsonify({'message': f'Błąd podczas usuwania detekcji: {str(e)}'}), 500
 
+@app.route('/api/events', methods=['GET'])
+@login_required
+def event_stream():
+    """Server-Sent Events: detection, stats, status, deleted (resume with Last-Event-ID, 'reset' = refetch state)"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    stream = event_bus.stream(last_event_id)
+    if stream is None:
+        return jsonify({'error': 'Too many event stream clients'}), 503
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/dashboard-stats', methods=['GET'])
 @login_required
 def get_dashboard_stats():
-    """Get real-time dashboard statistics"""
-    all_detections = Detection.query.all()
-    total_detections = len(all_detections)
-    
-    today = datetime.now().date()
-    today_detections = Detection.query.filter(
-        db.func.date(Detection.timestamp) == today
-    ).count()
+    """Get real-time dashboard statistics (SQL aggregates, cached and updated by the detection writer)"""
+    stats = dashboard_stats.get()
     
     camera_status = 'Online' if camera_controller.is_running else 'Offline'
     within_schedule = camera_controller._is_within_schedule()
     
-    recent_detections = Detection.query.order_by(
-        Detection.timestamp.desc()
-    ).limit(5).all()
-    
-    recent_detections_list = [{
-        'id': d.id,
-        'timestamp': d.timestamp.isoformat(),
-        'location': d.location,
-        'confidence': d.confidence,
-        'image_path': os.path.basename(d.image_path),
-        'status': d.status
-    } for d in recent_detections]
-    
     return jsonify({
-        'total_detections': total_detections,
-        'today_detections': today_detections,
+        'total_detections': stats['total_detections'],
+        'today_detections': stats['today_detections'],
         'camera_status': camera_status,
         'within_schedule': within_schedule,
-        'recent_detections': recent_detections_list
+        'recent_detections': stats['recent_detections']
     })
 
 @app.route('/api/stats/detections_over_time', methods=['GET'])
 def detections_over_time_stats():
     """Return detections count for the last 7 days, grouped by date."""
     try:
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        rows = db.session.query(
-            func.date(Detection.timestamp).label('date'),
-            func.count(Detection.id).label('count')
-        ).filter(
-            Detection.timestamp >= seven_days_ago
-        ).group_by(
-            func.date(Detection.timestamp)
-        ).order_by(
-            func.date(Detection.timestamp)
-        ).all()
-
-        formatted = [{
-            'name': str(r.date),
-            'count': int(r.count)
-        } for r in rows]
-
-        return jsonify(formatted)
+        return jsonify(detections_per_day(7))
     except Exception as e:
         logger.error(f"Error building detections_over_time stats: {e}")
         return jsonify({'error': str(e)}), 500
@@ -390,18 +477,11 @@ def update_settings():
         
         if 'schedule' in data:
             schedule = data['schedule']
-            days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-            for day in days:
-                if day not in schedule:
-                    raise ValueError(f"Missing day in schedule: {day}")
-                day_config = schedule[day]
-                if 'enabled' not in day_config or 'start' not in day_config or 'end' not in day_config:
-                    raise ValueError(f"Invalid config for {day}")
-                try:
-                    datetime.strptime(day_config['start'], '%H:%M')
-                    datetime.strptime(day_config['end'], '%H:%M')
-                except ValueError as e:
-                    raise ValueError(f"Invalid time format for {day}: {e}")
+            # Walidacja = kompilacja (dni tygodnia, wiele okien na dzień, wyjątki 'holidays')
+            try:
+                CompiledSchedule.compile(schedule)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             camera_settings['schedule'] = schedule
         
         if 'camera_index' in data:
@@ -518,6 +598,34 @@ def stop_camera():
         logger.error(f"Error stopping camera: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats/rollup', methods=['GET'])
+@login_required
+def detection_rollup_stats():
+    """Detection counts for any range at hour/day/week/month granularity, served from hourly rollups"""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        end = parse_bound(request.args['to'], 'to', end=True) if request.args.get('to') else datetime.utcnow()
+        start = parse_bound(request.args['from'], 'from') if request.args.get('from') else end - timedelta(days=30)
+        zones = [zone.strip() for zone in request.args.get('location', '').split(',') if zone.strip()]
+        series = query_series(
+            db.session, start, end, granularity,
+            camera=request.args.get('camera') or None,
+            zones=zones or None,
+            group_by_zone=request.args.get('group_by') == 'zone'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error building rollup stats: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'total': sum(item['count'] for item in series),
+        'series': series
+    })
+
 @app.route('/api/camera/status', methods=['GET'])
 @login_required
 def camera_status():
@@ -528,13 +636,112 @@ def camera_status():
             'within_schedule': camera_controller._is_within_schedule(),
             'settings': {
                 'schedule': camera_controller.settings.get('schedule', DEFAULT_SCHEDULE.copy()),
+                'schedule_state': camera_controller.get_schedule_state(),
                 'camera_name': camera_controller.settings['camera_name']
-            }
+            },
+            'image_writer': camera_controller.image_writer.get_stats(),
+            'detection_writer': camera_controller.detection_writer.get_stats(),
+            'task_journal': camera_controller.task_journal.get_stats(),
+            'clip_recorder': camera_controller.clip_recorder.get_stats() if camera_controller.clip_recorder else None,
+            'notifications': camera_controller.notification_dispatcher.get_stats(),
+            'uploads': camera_controller.upload_service.get_stats() if camera_controller.upload_service else None,
+            'notification_outbox': camera_controller.notification_outbox.get_stats(),
+            'notification_media': camera_controller.anonymizer_worker.notification_media.get_stats(),
+            'alert_throttle': camera_controller.alert_throttle.get_state(),
+            'smtp_pool': camera_controller.anonymizer_worker.smtp_pool.get_stats() if camera_controller.anonymizer_worker.smtp_pool else None,
+            'alert_digest': camera_controller.anonymizer_worker.alert_digest.get_stats() if camera_controller.anonymizer_worker.alert_digest else None,
+            'circuit_breakers': camera_controller.get_circuit_breakers(),
+            'latency': camera_controller.latency_tracer.get_stats()['slo'],
+            'dashboard_stats': dashboard_stats.get_stats(),
+            'event_bus': event_bus.get_stats(),
+            'thumbnails': thumbnails.get_stats(),
+            'storage': storage_manager.get_stats(),
+            'database': database.get_stats()
         })
     except Exception as e:
         logger.error(f"Error getting camera status: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/notifications', methods=['GET'])
+@login_required
+def get_notifications():
+    """Get notification outbox rows (delivery backlog), optionally filtered by status"""
+    try:
+        status = request.args.get('status')
+        limit = min(request.args.get('limit', 100, type=int), 500)
+        query = Notification.query
+        if status:
+            query = query.filter_by(status=status)
+        rows = query.order_by(Notification.id.desc()).limit(limit).all()
+        return jsonify({
+            'notifications': [{
+                'id': n.id,
+                'detection_id': n.detection_id,
+                'channel': n.channel,
+                'status': n.status,
+                'attempts': n.attempts,
+                'created_at': n.created_at.isoformat(),
+                'next_attempt_at': n.next_attempt_at.isoformat() if n.next_attempt_at else None,
+                'delivered_at': n.delivered_at.isoformat() if n.delivered_at else None,
+                'latency_ms': n.latency_ms,
+                'last_error': n.last_error
+            } for n in rows],
+            'backlog': dict(db.session.query(Notification.status, func.count(Notification.id)).group_by(Notification.status).all())
+        })
+    except Exception as e:
+        logger.error(f"Error getting notifications: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/alerts/throttle', methods=['GET'])
+@login_required
+def alert_throttle_state():
+    """Get alert throttling state (muted zones and until when, channel limits)"""
+    try:
+        return jsonify(camera_controller.alert_throttle.get_state())
+    except Exception as e:
+        logger.error(f"Error getting alert throttle state: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/alerts/throttle', methods=['DELETE'])
+@login_required
+def reset_alert_throttle():
+    """Unmute a zone (?zone=<name>) or all zones; returns the new throttling state"""
+    try:
+        camera_controller.alert_throttle.reset_zone(request.args.get('zone') or None)
+        return jsonify(camera_controller.alert_throttle.get_state())
+    except Exception as e:
+        logger.error(f"Error resetting alert throttle: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/latency', methods=['GET'])
+@login_required
+def latency_stats():
+    """Get per-stage latency percentiles/histograms and alert SLO status"""
+    try:
+        return jsonify(camera_controller.latency_tracer.get_stats())
+    except Exception as e:
+        logger.error(f"Error getting latency stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/detections/thumbs/<int:size>/<name>')
+@login_required
+def serve_detection_thumbnail(size, name):
+    """Content-addressed thumbnail: ETag = source image digest, cached forever, 304 on If-None-Match"""
+    parsed = ThumbnailStore.parse_name(name)
+    if parsed is None or size not in thumbnails.sizes:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    digest = parsed[1]
+    if request.if_none_match.contains(digest):
+        response = Response(status=304)
+    else:
+        try:
+            response = send_from_directory(os.path.join(DETECTION_FOLDER, 'thumbs', str(size)), name, etag=False)
+        except NotFound:
+            return jsonify({'error': 'Thumbnail not found'}), 404
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = f'private, max-age={THUMBNAIL_MAX_AGE}, immutable'
+    return response
+
 @app.route('/detections/<path:filename>')
 @login_required
 def serve_detection_image(filename):
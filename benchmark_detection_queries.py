@@ -0,0 +1,155 @@
+"""
+Test skali zapytań o detekcje.
+
+Zasiewa osobną bazę SQLite (domyślnie 1 000 000 detekcji z ostatniego roku),
+sprawdza plany zapytań (EXPLAIN QUERY PLAN) i mierzy czasy zapytań dashboardu,
+wykresu dziennego i listy detekcji. Kończy się kodem 1, jeśli zapytanie
+zakresowe nie korzysta z indeksu lub przekracza limit czasu.
+
+Użycie:
+    python benchmark_detection_queries.py [--rows 1000000] [--max-ms 100] [--db instance/benchmark_detections.db]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import insert, select, tuple_
+
+from models import db, Detection
+from dashboard_stats import day_ranges_utc, today_range_utc, totals_query, recent_query, per_day_query
+from detection_query import parse_filters
+
+LOCATIONS = ['ławka 1', 'ławka 2', 'ławka 3', 'tablica', 'drzwi', 'okno']
+STATUSES = ['Pending', 'Reviewed', 'Confirmed', 'Dismissed']
+
+
+def create_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(db_path)}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(rows, days=365, chunk=50000):
+    """Wstawia rows detekcji rozłożonych losowo na ostatnie days dni."""
+    now = datetime.utcnow()
+    span = days * 86400
+    rng = random.Random(42)
+    inserted = 0
+    start = time.perf_counter()
+    while inserted < rows:
+        batch = min(chunk, rows - inserted)
+        db.session.execute(insert(Detection), [{
+            'timestamp': now - timedelta(seconds=rng.random() * span),
+            'location': rng.choice(LOCATIONS),
+            'confidence': round(rng.uniform(0.2, 0.99), 3),
+            'image_path': f'phone_bench_{inserted + i}.jpg',
+            'status': rng.choice(STATUSES),
+        } for i in range(batch)])
+        db.session.commit()
+        inserted += batch
+        print(f"   {inserted:,}/{rows:,}", end='\r')
+    print(f"✅ Zasiano {rows:,} detekcji w {time.perf_counter() - start:.1f}s        ")
+
+
+def explain(statement):
+    """Plan zapytania SQLite (lista opisów kroków)."""
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(
+        value.strftime('%Y-%m-%d %H:%M:%S.%f') if isinstance(value, datetime) else value
+        for value in (compiled.params[name] for name in compiled.positiontup)
+    )
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+    return [row[-1] for row in rows]
+
+
+def measure(statement, repeat=5):
+    """Mediana czasu wykonania (ms)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--max-ms', type=float, default=100.0, help='limit czasu zapytań zakresowych (ms)')
+    parser.add_argument('--db', default=os.path.join('instance', 'benchmark_detections.db'))
+    parser.add_argument('--keep', action='store_true', help='nie usuwaj bazy po teście')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    app = create_app(args.db)
+    failures = []
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(args.rows)
+            db.session.connection().exec_driver_sql('ANALYZE')
+
+            today_start, today_end = today_range_utc()
+            week = day_ranges_utc(7)
+            last_day = week[-1]
+            checks = [
+                # (nazwa, zapytanie, wymagany indeks w planie lub None, czy obowiązuje limit czasu)
+                ('dashboard totals', totals_query(today_start, today_end), 'ix_detection_timestamp', False),
+                ('recent detections', recent_query(5), 'ix_detection_timestamp', True),
+                ('detections per day (7d)', per_day_query(week), 'ix_detection_timestamp', True),
+                ('zone + day range', select(Detection.id, Detection.timestamp).where(
+                    Detection.location == LOCATIONS[0],
+                    Detection.timestamp >= last_day[1], Detection.timestamp < last_day[2]
+                ), 'ix_detection_location_timestamp', True),
+                ('status filter page', select(Detection.id).where(Detection.status == 'Confirmed').limit(20),
+                 'ix_detection_status', True),
+                ('list page 1', select(Detection.id, Detection.timestamp).order_by(Detection.timestamp.desc()).limit(20),
+                 'ix_detection_timestamp', True),
+                ('keyset page (300 days back)', select(Detection.id, Detection.timestamp).where(
+                    tuple_(Detection.timestamp, Detection.id) < tuple_(datetime.utcnow() - timedelta(days=300), 0)
+                ).order_by(Detection.timestamp.desc(), Detection.id.desc()).limit(21), 'ix_detection_timestamp', True),
+                ('filtered page (zone, 30d)', select(Detection.id, Detection.timestamp).where(*parse_filters({
+                    'location': LOCATIONS[1], 'status': 'Confirmed', 'min_confidence': '0.5',
+                    'from': (datetime.now() - timedelta(days=30)).date().isoformat(),
+                })).order_by(Detection.timestamp.desc(), Detection.id.desc()).limit(21), 'ix_detection_', True),
+            ]
+
+            print()
+            for name, statement, index, timed in checks:
+                plan = explain(statement)
+                elapsed = measure(statement)
+                plan_text = ' | '.join(plan)
+                ok = True
+                if index is not None and index not in plan_text:
+                    ok = False
+                    failures.append(f"{name}: plan nie używa {index}: {plan_text}")
+                if timed and elapsed > args.max_ms:
+                    ok = False
+                    failures.append(f"{name}: {elapsed:.1f} ms > {args.max_ms:.0f} ms")
+                print(f"{'✅' if ok else '❌'} {name:<28} {elapsed:8.2f} ms   {plan_text}")
+    finally:
+        if not args.keep and os.path.exists(args.db):
+            with app.app_context():
+                db.engine.dispose()
+            os.remove(args.db)
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("✅ Wszystkie zapytania zakresowe korzystają z indeksów i mieszczą się w limicie")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,35 @@
 import threading
 import time
-from datetime import datetime, timedelta, time as dt_time
+from datetime import datetime, timedelta, timezone, time as dt_time
 import cv2
 from ultralytics import YOLO
 import os
-from models import db, Detection, User
 from queue import Queue
 import json
 import subprocess
 import re
+import unicodedata
+import uuid
 import numpy as np
 from dotenv import load_dotenv
+from image_writer import ImageWriter
+from detection_artifact import DetectionArtifact
+from detection_writer import DetectionWriter
+from task_journal import TaskJournal, STAGE_ANONYMIZED, STAGE_STORED
+from clip_recorder import ClipRecorder
+from smtp_pool import SMTPPool
+from notification_dispatcher import NotificationDispatcher, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from alert_digest import AlertDigest, build_contact_sheet
+from upload_service import UploadService
+from notification_media import NotificationMedia
+from alert_throttle import AlertThrottle
+from notification_outbox import NotificationOutbox, STATUS_DELIVERED, STATUS_FAILED, STATUS_SUPPRESSED, STATUS_DEFERRED
+from circuit_breaker import CircuitBreaker, STATE_CLOSED
+from latency_tracer import LatencyTracer, mark
+from schedule_evaluator import CompiledSchedule
+from thumbnail_store import ThumbnailStore
+from storage_manager import get_media_root
+from collections import OrderedDict
 
 load_dotenv()
 
@@ -18,11 +37,11 @@ from vonage import Auth
 from vonage_sms import Sms
 from vonage_sms.requests import SmsMessage
 from vonage_http_client import HttpClient
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-import yagmail
 import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.image import MIMEImage
+from email.utils import make_msgid
 
 class CameraController:
     def __init__(self, camera_index=0, camera_name=None, 
@@ -30,6 +49,8 @@ class CameraController:
                  vonage_sms=None, cloudinary_enabled=False,
                  email_user=None, email_password=None, email_recipient=None,
                  available_cameras_list=None):
+        self._status_listeners = []
+        self._is_running = False
         self.camera = None
         self.is_running = False
         self.thread = None
@@ -49,6 +70,11 @@ class CameraController:
         from models import DEFAULT_SCHEDULE
         
         self.schedule = DEFAULT_SCHEDULE.copy()
+        self.compiled_schedule = CompiledSchedule.compile(self.schedule)
+        self._schedule_cache = None
+        self._last_within_schedule = None
+        self._schedule_cond = threading.Condition()
+        self._schedule_generation = 0
         self.assigned_camera_index = self.camera_index
         self.camera_name = camera_name if camera_name else 'Camera 1'
         self.blur_faces = True
@@ -73,13 +99,34 @@ class CameraController:
         }
         
         self.detection_queue = Queue()
-        self.alert_mute_until = {}
-        self.mute_duration = timedelta(minutes=5)
-        self.alert_lock = threading.Lock()
+        self.media_root = get_media_root()
+        self.alert_throttle = AlertThrottle.from_env()
+        self.latency_tracer = LatencyTracer.from_env()
+        self.image_writer = ImageWriter.from_env()
+        self.detection_writer = DetectionWriter.from_env(media_root=self.media_root)
+        self.detection_writer.start()
+        self.task_journal = TaskJournal.from_env()
+        self.clip_recorder = ClipRecorder.from_env(detection_writer=self.detection_writer,
+                                                   clips_dir=os.path.join(self.media_root, 'clips'))
+        if self.clip_recorder is not None:
+            self.clip_recorder.start()
+        self.notification_dispatcher = NotificationDispatcher.from_env()
+        self.notification_dispatcher.start()
+        self.upload_service = UploadService.from_env(cloudinary_enabled=cloudinary_enabled)
+        if self.upload_service is not None:
+            self.upload_service.start()
         
         self.anonymizer_worker = AnonymizerWorker(
             detection_queue=self.detection_queue,
             settings=self.settings,
+            image_writer=self.image_writer,
+            detection_writer=self.detection_writer,
+            task_journal=self.task_journal,
+            notification_dispatcher=self.notification_dispatcher,
+            upload_service=self.upload_service,
+            alert_throttle=self.alert_throttle,
+            latency_tracer=self.latency_tracer,
+            media_root=self.media_root,
             yolo_model=yolo_model_anonymization,
             vonage_sms=vonage_sms,
             cloudinary_enabled=cloudinary_enabled,
@@ -87,7 +134,13 @@ class CameraController:
             email_password=email_password,
             email_recipient=email_recipient
         )
+        if self.clip_recorder is not None:
+            # Klatki klipu anonimizowane są ponowną detekcją głów, nie tylko ramkami z klatki detekcji
+            self.clip_recorder.head_detector = self.anonymizer_worker.detect_head_boxes
+        self.notification_outbox = self.anonymizer_worker.notification_outbox
+        self.anonymizer_worker.recover_pending_tasks()
         self.anonymizer_worker.start()
+        self.notification_outbox.start()
         self.manual_stop_engaged = True
         self.was_within_schedule = False
         self.camera_was_manually_started = False
@@ -197,6 +250,7 @@ class CameraController:
     def update_settings(self, settings_model):
         if hasattr(settings_model, 'schedule') and settings_model.schedule:
             self.schedule = settings_model.schedule.copy()
+            self._compile_schedule()
         
         if hasattr(settings_model, 'roi_zones') and settings_model.roi_zones is not None:
             self.roi_zones = settings_model.roi_zones.copy() if isinstance(settings_model.roi_zones, list) else []
@@ -250,28 +304,43 @@ class CameraController:
         if hasattr(self, 'anonymizer_worker') and self.anonymizer_worker is not None:
             self.anonymizer_worker.update_worker_settings(self)
     
+    def _compile_schedule(self):
+        """Kompiluje harmonogram (tabela tygodniowa + wyjątki) i budzi wątki czekające na zmianę."""
+        try:
+            self.compiled_schedule = CompiledSchedule.compile(self.schedule)
+        except ValueError as e:
+            import logging
+            logging.error(f"Invalid schedule, keeping previous one: {e}")
+        self._schedule_cache = None
+        self._wake_schedule_waiters()
+
+    def _wake_schedule_waiters(self):
+        with self._schedule_cond:
+            self._schedule_generation += 1
+            self._schedule_cond.notify_all()
+
     def _is_within_schedule(self):
-        """Check if current time is within camera operation schedule (weekly)"""
+        """
+        Check if current time is within camera operation schedule (weekly)
+        
+        Wynik jest ważny do najbliższej zmiany harmonogramu, więc wywołanie
+        dla każdej klatki to jedno porównanie czasu.
+        """
+        now = time.time()
+        cache = self._schedule_cache
+        if cache is not None and now < cache[1]:
+            return cache[0]
         try:
-            if not self.schedule:
-                return False
-            
-            now = datetime.now()
-            current_day = now.strftime('%A').lower()
-            current_time = now.time()
-            today_schedule = self.schedule.get(current_day)
-            
-            if not today_schedule or not today_schedule.get('enabled', False):
-                return False
-            
-            start_time = datetime.strptime(today_schedule['start'], '%H:%M').time()
-            end_time = datetime.strptime(today_schedule['end'], '%H:%M').time()
-            
-            if end_time < start_time:
-                is_within = (current_time >= start_time) or (current_time <= end_time)
-            else:
-                is_within = start_time <= current_time <= end_time
-            
+            current = datetime.now()
+            is_within = self.compiled_schedule.is_within(current)
+            next_transition = self.compiled_schedule.next_transition(current)
+            valid_until = now + 3600
+            if next_transition is not None:
+                valid_until = min(valid_until, next_transition.timestamp())
+            self._schedule_cache = (is_within, valid_until, next_transition)
+            if self._last_within_schedule is not None and self._last_within_schedule != is_within:
+                self._notify_status()
+            self._last_within_schedule = is_within
             return is_within
         
         except Exception as e:
@@ -279,6 +348,31 @@ class CameraController:
             logging.error(f"Error checking schedule: {e}")
             return False
 
+    def _wait_for_schedule(self, max_wait=None):
+        """
+        Śpi do najbliższej zmiany harmonogramu (najwyżej max_wait sekund).
+        Budzi się wcześniej po zmianie ustawień lub ręcznym starcie/zatrzymaniu kamery.
+        """
+        self._is_within_schedule()
+        cache = self._schedule_cache
+        timeout = max(0.0, cache[1] - time.time()) if cache is not None else 1.0
+        if max_wait is not None:
+            timeout = min(timeout, max_wait)
+        with self._schedule_cond:
+            generation = self._schedule_generation
+            self._schedule_cond.wait_for(lambda: self._schedule_generation != generation, timeout=timeout)
+
+    def get_schedule_state(self):
+        """Stan harmonogramu dla API: czy kamera jest w oknie pracy i kiedy nastąpi zmiana."""
+        is_within = self._is_within_schedule()
+        cache = self._schedule_cache
+        next_transition = cache[2] if cache is not None else None
+        return {
+            'within_schedule': is_within,
+            'next_transition': next_transition.isoformat() if next_transition else None,
+            'compiled': self.compiled_schedule.describe(),
+        }
+
     def _check_schedule_start(self):
         """Thread to check when to start the camera based on schedule"""
         while not self.is_running:
@@ -289,7 +383,7 @@ class CameraController:
                     break
             else:
                 self.manual_stop_engaged = False
-            time.sleep(1)
+            self._wait_for_schedule()
 
     def start_camera(self):
         """Start the camera and detection process (STRICT selected index only)."""
@@ -350,6 +444,7 @@ class CameraController:
             fps = self.camera.get(cv2.CAP_PROP_FPS)
             
             self.is_running = True
+            self._wake_schedule_waiters()
             
         except Exception as e:
             import logging
@@ -455,6 +550,52 @@ class CameraController:
             self.schedule_check_thread.daemon = True
             self.schedule_check_thread.start()
 
+    def init_app(self, app):
+        """Przekazuje instancję Flask wątkom zapisującym do bazy (DetectionWriter, outbox)."""
+        self.detection_writer.init_app(app)
+        self.notification_outbox.init_app(app)
+
+    @property
+    def is_running(self):
+        return self._is_running
+
+    @is_running.setter
+    def is_running(self, value):
+        changed = value != self._is_running
+        self._is_running = value
+        if changed:
+            self._notify_status()
+
+    def add_status_listener(self, listener):
+        """
+        Rejestruje funkcję wywoływaną przy zmianie stanu kamery (start/stop, wejście/wyjście z harmonogramu).
+
+        Args:
+            listener: Funkcja przyjmująca słownik {'is_running', 'within_schedule', 'next_transition'}
+        """
+        self._status_listeners.append(listener)
+
+    def _notify_status(self):
+        cache = getattr(self, '_schedule_cache', None)
+        status = {
+            'is_running': self._is_running,
+            'within_schedule': cache[0] if cache is not None else None,
+            'next_transition': cache[2].isoformat() if cache is not None and cache[2] else None,
+        }
+        for listener in self._status_listeners:
+            try:
+                listener(status)
+            except Exception as e:
+                import logging
+                logging.error(f"Camera status listener failed: {e}")
+
+    def get_circuit_breakers(self):
+        """Stan bezpieczników dostawców (Cloudinary/upload, Vonage, SMTP) dla API statusu."""
+        breakers = {b.name: b.get_state() for b in self.anonymizer_worker.breakers.values()}
+        if self.upload_service is not None:
+            breakers[self.upload_service.breaker.name] = self.upload_service.breaker.get_state()
+        return breakers
+
     def set_assigned_camera(self, index):
         """Ustawia, który indeks kamery ma być monitorowany."""
         if index == self.assigned_camera_index:
@@ -491,63 +632,111 @@ class CameraController:
 
         return None
 
-    def trigger_throttled_notification(self, zone_name, frame, confidence):
-        """Sprawdza wyciszenie i wysyła powiadomienie dla danej strefy."""
-        now = datetime.now()
+    def _zone_box(self, zone_name):
+        """Zwraca ramkę strefy (x1, y1, x2, y2) znormalizowaną do 0..1 lub None."""
+        for zone in self.roi_zones:
+            coords = zone.get('coords', {})
+            if zone.get('name') == zone_name and isinstance(coords, dict):
+                x, y = coords.get('x', 0), coords.get('y', 0)
+                return (x, y, x + coords.get('w', 0), y + coords.get('h', 0))
+        return None
 
-        with self.alert_lock:
-            if zone_name in self.alert_mute_until:
-                if now < self.alert_mute_until[zone_name]:
-                    mute_until_str = self.alert_mute_until[zone_name].strftime('%H:%M:%S')
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.info(f"📱 Wykryto telefon w strefie '{zone_name}' (confidence: {confidence:.2%}), ale strefa jest wyciszona do {mute_until_str} - pomijam powiadomienia")
-                    return
-                else:
-                    self.alert_mute_until.pop(zone_name, None)
+    def trigger_throttled_notification(self, zone_name, frame, confidence, phone_box=None, trace=None):
+        """
+        Sprawdza limity strefy (AlertThrottle) i zleca obsługę detekcji.
+        
+        Decyzja nie wykonuje I/O i trwa mikrosekundy; kopia klatki powstaje tylko dla
+        dozwolonych alertów, a kodowanie i zapis odbywają się w puli ImageWriter.
+        trace to ślad opóźnień (capture, inference_*, zone_match) przekazywany dalej z zadaniem.
+        """
+        allowed, muted_until = self.alert_throttle.allow_zone(zone_name)
+        if not allowed:
+            import logging
+            logger = logging.getLogger(__name__)
+            mute_until_str = datetime.fromtimestamp(muted_until).strftime('%H:%M:%S') if muted_until else '?'
+            logger.info(f"📱 Wykryto telefon w strefie '{zone_name}' (confidence: {confidence:.2%}), ale strefa jest wyciszona do {mute_until_str} - pomijam powiadomienia")
+            return
+
+        self._handle_detection(frame.copy(), confidence, zone_name, phone_box, trace)
 
-            self._handle_detection(frame, confidence, zone_name)
-            self.alert_mute_until[zone_name] = now + self.mute_duration
+    @staticmethod
+    def _slug(value):
+        """Nazwa strefy/kamery jako fragment nazwy pliku (ASCII, małe litery, myślniki)."""
+        value = unicodedata.normalize('NFKD', str(value).replace('ł', 'l').replace('Ł', 'L'))
+        value = value.encode('ascii', 'ignore').decode('ascii').lower()
+        return re.sub(r'[^a-z0-9]+', '-', value).strip('-')[:32]
+
+    def _detection_filename(self, zone_name=None):
+        """
+        Unikalna nazwa pliku detekcji.
 
-    def _handle_detection(self, frame, confidence, zone_name=None):
+        Milisekundy, kamera, strefa i losowy sufiks - dwie detekcje w tej samej
+        sekundzie (różne strefy lub kolejne klatki) nie nadpiszą sobie obrazu
+        ani wpisu w dzienniku zadań.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        camera = self._slug(self.settings.get('camera_name', 'Camera 1')) or 'camera'
+        zone = self._slug(zone_name) if zone_name else 'frame'
+        return f'phone_{timestamp}_{camera}_{zone or "zone"}_{uuid.uuid4().hex[:8]}{self.image_writer.extension}'
+
+    def _handle_detection(self, frame, confidence, zone_name=None, phone_box=None, trace=None):
         """
         Obsługuje wykrycie telefonu:
-        1. Zapisuje ORYGINALNĄ klatkę (bez zamazanych głów!)
-        2. Dodaje do kolejki dla AnonymizerWorker z ZAMROŻONĄ konfiguracją blur
+        1. Zleca zapis ORYGINALNEJ klatki (bez zamazanych głów!) do ImageWriter
+        2. Po zapisie dodaje do kolejki dla AnonymizerWorker z ZAMROŻONĄ konfiguracją blur
         3. Worker zamaże głowy (jeśli włączone) i doda do DB
+        
+        Kodowanie i zapis odbywają się w puli wątków ImageWriter - pętla kamery nie czeka na dysk.
         """
         try:
-            os.makedirs('detections', exist_ok=True)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'phone_{timestamp}.jpg'
-            filepath = os.path.join('detections', filename)
-            
             if frame is None or frame.size == 0:
                 raise Exception("Invalid frame: None or empty")
             
-            try:
-                success = cv2.imwrite(filepath, frame)
-                if not success:
-                    raise Exception("Failed to save detection image")
-            except cv2.error as cv_err:
-                raise Exception(f"OpenCV error during imwrite: {cv_err}")
+            filename = self._detection_filename(zone_name)
+            filepath = os.path.join(self.media_root, filename)
             
             should_blur = self.settings.get('blur_faces', True)
             
             detection_data = {
                 'filepath': filepath,
+                'frame': frame,
+                'timestamp': datetime.utcnow(),
+                'created_at': time.time(),
                 'confidence': confidence,
                 'should_blur': should_blur,
-                'zone_name': zone_name
+                'zone_name': zone_name,
+                'phone_box': phone_box,
+                'zone_box': self._zone_box(zone_name) if zone_name else None,
+                'trace': trace
             }
-            self.detection_queue.put(detection_data)
+            
+            if self.clip_recorder is not None:
+                detection_data['clip_job'] = self.clip_recorder.request_clip(filename, should_blur)
+            
+            def _on_written(future):
+                try:
+                    detection_data['encoded'] = future.result()
+                except Exception as e:
+                    import logging
+                    logging.error(f"Error saving detection: {e}")
+                    if os.path.exists(filepath):
+                        os.remove(filepath)
+                    return
+                # Ta sama skala co zapisany plik (ramki głów muszą pasować do obrazu na dysku)
+                detection_data['frame'] = self.image_writer.prepare(frame)
+                try:
+                    detection_data['task_id'] = self.task_journal.record(detection_data)
+                except Exception as e:
+                    import logging
+                    logging.error(f"Task journal error for {filepath}: {e}")
+                mark(trace, 'enqueue')
+                self.detection_queue.put(detection_data)
+            
+            self.image_writer.submit(frame, filepath, callback=_on_written)
             
         except Exception as e:
             import logging
             logging.error(f"Error saving detection: {e}")
-            if 'filepath' in locals() and os.path.exists(filepath):
-                os.remove(filepath)
 
 
     def _enhance_frame_for_detection(self, frame):
@@ -618,7 +807,8 @@ class CameraController:
                         self.manual_stop_engaged = False
                 
                 if not self.is_running:
-                    time.sleep(5)
+                    # W oknie pracy ponawia otwarcie kamery co 5 s; poza nim śpi do najbliższej zmiany harmonogramu
+                    self._wait_for_schedule(5 if is_within and not self.manual_stop_engaged else None)
                     continue
                 
                 if not self.camera or not self.camera.isOpened():
@@ -636,6 +826,7 @@ class CameraController:
                     continue
                 
                 ret, frame = self.camera.read()
+                captured_at = time.time()
                 
                 frame_is_invalid = False
                 try:
@@ -678,6 +869,8 @@ class CameraController:
                 try:
                     with self.frame_lock:
                         self.last_frame = frame.copy()
+                    if self.clip_recorder is not None:
+                        self.clip_recorder.ring_buffer.push(frame)
                 except cv2.error as e:
                     opencv_error_count += 1
                     time.sleep(0.1)
@@ -715,9 +908,11 @@ class CameraController:
                         if display_frame is None or display_frame.size == 0:
                             continue
                         
+                        inference_start = time.time()
                         enhanced_frame = self._enhance_frame_for_detection(frame)
                             
                         results = self.model(enhanced_frame, verbose=False)
+                        inference_end = time.time()
                         frame_height, frame_width = frame.shape[:2]
                         
                         for result in results:
@@ -738,8 +933,15 @@ class CameraController:
                                     
                                     if matched_zone:
                                         try:
-                                            frame_copy = frame.copy()
-                                            self.trigger_throttled_notification(matched_zone, frame_copy, confidence)
+                                            trace = {
+                                                'capture': captured_at,
+                                                'inference_start': inference_start,
+                                                'inference_end': inference_end,
+                                                'zone_match': time.time(),
+                                            }
+                                            phone_box = (bx1 / frame_width, by1 / frame_height,
+                                                         bx2 / frame_width, by2 / frame_height)
+                                            self.trigger_throttled_notification(matched_zone, frame, confidence, phone_box, trace)
                                         except cv2.error as copy_err:
                                             opencv_error_count += 1
                                         except Exception:
@@ -926,10 +1128,23 @@ class CameraController:
         """Czysty shutdown - zatrzymaj kamerę i workera"""
         self.stop_camera()
         
+        if hasattr(self, 'image_writer'):
+            self.image_writer.shutdown(wait=True)
+        
         if hasattr(self, 'anonymizer_worker'):
             self.detection_queue.put(None)
             self.anonymizer_worker.stop()
             self.anonymizer_worker.join(timeout=5)
+        
+        if getattr(self, 'clip_recorder', None) is not None:
+            self.clip_recorder.stop()
+        
+        if hasattr(self, 'notification_dispatcher'):
+            self.notification_dispatcher.stop()
+        
+        if hasattr(self, 'detection_writer'):
+            self.detection_writer.stop()
+            self.detection_writer.join(timeout=5)
 
     @staticmethod
     def _open_capture_static(index):
@@ -1202,16 +1417,40 @@ class AnonymizerWorker(threading.Thread):
     
     Używa modelu Roboflow head-detection do wykrywania głów, zamazuje całą głowę.
     Działa asynchronicznie - nie blokuje głównej pętli kamery.
-    Obsługuje również powiadomienia SMS przez Vonage i upload do Cloudinary.
+    Obsługuje również powiadomienia SMS przez Vonage i upload obrazów (UploadService).
     """
     
-    def __init__(self, detection_queue, settings, 
+    def __init__(self, detection_queue, settings, image_writer=None, detection_writer=None,
+                 task_journal=None, notification_dispatcher=None, upload_service=None, notification_media=None,
+                 alert_throttle=None, latency_tracer=None, thumbnails=None, media_root=None,
                  yolo_model=None, vonage_sms=None, cloudinary_enabled=False,
                  email_user=None, email_password=None, email_recipient=None,
                  blur_kernel_size=99, blur_sigma=30):
         super().__init__(daemon=True)
         self.detection_queue = detection_queue
         self.settings = settings
+        self.image_writer = image_writer if image_writer is not None else ImageWriter.from_env()
+        self.media_root = media_root or get_media_root()
+        if detection_writer is None:
+            detection_writer = DetectionWriter.from_env(media_root=self.media_root)
+            detection_writer.start()
+        self.detection_writer = detection_writer
+        self.task_journal = task_journal
+        if notification_dispatcher is None:
+            notification_dispatcher = NotificationDispatcher.from_env()
+            notification_dispatcher.start()
+        self.notification_dispatcher = notification_dispatcher
+        if upload_service is None:
+            upload_service = UploadService.from_env(cloudinary_enabled=cloudinary_enabled)
+            if upload_service is not None:
+                upload_service.start()
+        self.upload_service = upload_service
+        self.notification_media = notification_media if notification_media is not None else NotificationMedia.from_env()
+        self.alert_throttle = alert_throttle if alert_throttle is not None else AlertThrottle.from_env()
+        self.latency_tracer = latency_tracer if latency_tracer is not None else LatencyTracer.from_env()
+        self.thumbnails = (thumbnails if thumbnails is not None
+                           else ThumbnailStore.from_env(os.path.join(self.media_root, 'thumbs')))
+        self.detection_writer.add_commit_listener(self.latency_tracer.observe_committed)
         self.blur_kernel_size = blur_kernel_size
         self.blur_sigma = blur_sigma
         self.is_running = True
@@ -1233,6 +1472,26 @@ class AnonymizerWorker(threading.Thread):
         self.email_user = email_user
         self.email_password = email_password
         self.email_recipient = email_recipient
+        self.smtp_pool = None
+        if all([email_user, email_password, email_recipient]):
+            self.smtp_pool = SMTPPool.from_env(email_user, email_password)
+        
+        self.alert_digest = AlertDigest.from_env(on_flush=self._send_digest)
+        
+        self._media_cache = OrderedDict()
+        self._media_cache_lock = threading.Lock()
+        self.media_cache_size = int(os.getenv('OUTBOX_MEDIA_CACHE_SIZE', '100'))
+        self.notification_outbox = NotificationOutbox.from_env(deliver=self._deliver_outbox)
+        self.detection_writer.add_commit_listener(self.notification_outbox.wake)
+        
+        # Bezpieczniki dostawców: przy awarii wysyłki są odkładane bez czekania na timeouty,
+        # a po zamknięciu obwodu zaległe wiersze outboxu kanału są ponawiane od razu.
+        self.breakers = {
+            'sms': CircuitBreaker.from_env('vonage'),
+            'email': CircuitBreaker.from_env('smtp'),
+        }
+        for channel, breaker in self.breakers.items():
+            breaker.add_listener(lambda name, old, new, channel=channel: self._on_breaker_change(channel, new))
         
         self.email_enabled = False
         self.sms_enabled = False
@@ -1258,6 +1517,42 @@ class AnonymizerWorker(threading.Thread):
                 self.settings['camera_name'] = controller_instance.camera_name
         
     
+    def recover_pending_tasks(self):
+        """
+        Wznawia niedokończone zadania z dziennika (TaskJournal) po restarcie.
+        Każde zadanie trafia do kolejki z etapem, do którego doszło - wykonane etapy są pomijane.
+        
+        Returns:
+            Liczba wznowionych zadań
+        """
+        if self.task_journal is None:
+            return 0
+        
+        recovered = 0
+        try:
+            self.task_journal.purge_completed()
+            # Zadania bez obrazu na dysku TaskJournal.pending() usuwa sam
+            for task_data in self.task_journal.pending():
+                self.detection_queue.put(task_data)
+                recovered += 1
+        except Exception as e:
+            import logging
+            logging.error(f"Error recovering pending detection tasks: {e}")
+        
+        if recovered:
+            print(f"♻️  Wznowiono {recovered} niedokończonych zadań detekcji")
+        return recovered
+    
+    def _journal(self, method, *args):
+        """Aktualizuje dziennik zadań; błędy dziennika nie przerywają przetwarzania."""
+        if self.task_journal is None or args[0] is None:
+            return
+        try:
+            getattr(self.task_journal, method)(*args)
+        except Exception as e:
+            import logging
+            logging.error(f"Task journal error ({method}): {e}")
+    
     def run(self):
         """Główna pętla workera - przetwarza zadania z kolejki"""
         
@@ -1277,19 +1572,29 @@ class AnonymizerWorker(threading.Thread):
                 filepath = task_data.get('filepath')
                 confidence = task_data.get('confidence', 0.0)
                 zone_name = task_data.get('zone_name')
+                task_id = task_data.get('task_id')
+                stage = task_data.get('stage', 0)
+                clip_job = task_data.get('clip_job')
 
                 should_blur = task_data.get('should_blur', True)
                 
                 print(f"🔄 Przetwarzanie: {filepath} (blur: {should_blur}, zone: {zone_name})")
                 
-
-                if should_blur:
-                    success = self._anonymize_faces(filepath)
+                image = task_data.get('frame')
+                head_boxes = []
+                anonymization_done = True
+
+                if stage >= STAGE_ANONYMIZED:
+                    print(f"⏭️  Anonimizacja wykonana przed restartem: {filepath}")
+                elif should_blur:
+                    anonymized, head_boxes = self._anonymize_faces(filepath, image)
                     
-                    if success:
+                    if anonymized is not None:
+                        image = anonymized
                         print(f"✅ Zanonimizowano: {filepath}")
                         self.tasks_processed += 1
                     else:
+                        anonymization_done = False
                         import logging
                         logging.error(f"Anonymization error: {filepath}")
                 else:
@@ -1297,34 +1602,59 @@ class AnonymizerWorker(threading.Thread):
                     print(f"⏭️  Pomijam anonimizację (blur wyłączony): {filepath}")
                     self.tasks_processed += 1
                 
-
-
-
-                self._save_to_database(task_data)
+                if clip_job is not None:
+                    clip_job.set_head_boxes(self._normalize_boxes(head_boxes, image) if anonymization_done else None)
+                
+                artifact = self._build_artifact(filepath, image, encode=len(head_boxes) > 0,
+                                                data=task_data.pop('encoded', None))
+                mark(task_data.get('trace'), 'anonymized')
+                if artifact is not None:
+                    # Miniatury z obrazu w pamięci, przed zapisem do bazy (galeria ma je od pierwszego odczytu)
+                    self.thumbnails.generate(filepath, artifact.data, image)
+                if artifact is not None and anonymization_done and stage < STAGE_ANONYMIZED:
+                    self._journal('mark_anonymized', task_id)
                 
 
 
+
                 with self.settings_lock:
                     email_on = self.email_enabled
                     sms_on = self.sms_enabled
                 
-                if not email_on and not sms_on:
+                channels = []
+                if task_data.get('notified'):
+                    print(f"⏭️  Powiadomienia wysłane przed restartem: {filepath}")
+                elif not email_on and not sms_on:
                     print(f"📵 Powiadomienia (Email/SMS) wyłączone - pomijam wysyłkę")
                 else:
-                    notification_types = []
                     if sms_on:
-                        notification_types.append("SMS")
+                        channels.append('sms')
                     if email_on:
-                        notification_types.append("Email")
+                        channels.append('email')
                     
-                    print(f"📲 Powiadomienia włączone ({', '.join(notification_types)}) - uruchamiam wysyłkę w tle")
-
-                    notification_thread = threading.Thread(
-                        target=self._handle_cloud_notification,
-                        args=(filepath, confidence, zone_name),
-                        daemon=True
+                    print(f"📲 Powiadomienia włączone ({', '.join(c.upper() for c in channels)}) - zapisuję w outboxie")
+                    
+                    media = self.notification_media.build(
+                        artifact, image, task_data.get('phone_box'), task_data.get('zone_box')
                     )
-                    notification_thread.start()
+                    self._remember_media(os.path.basename(filepath), artifact, media, zone_name)
+                    if self.upload_service is not None and media:
+                        # Upload rusza od razu, równolegle z commitem; outbox dostanie gotowy link (deduplikacja)
+                        self.upload_service.submit(media[0])
+                
+                if stage < STAGE_STORED:
+                    def _on_stored(future, task_id=task_id, clip_job=clip_job):
+                        detection_id = future.result() if future.exception() is None else None
+                        if detection_id is not None:
+                            self._journal('mark_stored', task_id, detection_id)
+                            # Wiersze outboxu zapisano w tej samej transakcji - doręczeniem zarządza outbox
+                            self._journal('mark_notified', task_id)
+                        if clip_job is not None:
+                            clip_job.set_detection_id(detection_id)
+                    
+                    self._save_to_database(task_data, callback=_on_stored, notifications=channels)
+                else:
+                    self._journal('mark_notified', task_id)
                 
                 self.detection_queue.task_done()
                 
@@ -1337,45 +1667,44 @@ class AnonymizerWorker(threading.Thread):
                     pass
         
     
-    def _upload_to_cloudinary(self, filepath):
+    @staticmethod
+    def _normalize_boxes(boxes, image):
+        """Przelicza ramki głów (piksele) na współrzędne 0..1, niezależne od rozdzielczości klipu."""
+        if not boxes or image is None:
+            return []
+        img_h, img_w = image.shape[:2]
+        return [(x1 / img_w, y1 / img_h, x2 / img_w, y2 / img_h) for x1, y1, x2, y2 in boxes]
+    
+    def _build_artifact(self, filepath, image, encode, data=None):
         """
-        Wysyła plik na Cloudinary i zwraca publiczny link.
+        Tworzy DetectionArtifact współdzielony przez dysk, upload i e-mail.
+        
+        Jeśli obraz został zmieniony (zamazane głowy), koduje go raz i nadpisuje plik.
+        W przeciwnym razie używa bajtów zwróconych przez ImageWriter (bez ponownego
+        kodowania i odczytu z dysku). Plik czytany jest tylko dla zadań odtworzonych
+        z dziennika po restarcie, dla których bajtów w pamięci już nie ma.
         
         Args:
-            filepath: Ścieżka do pliku
-            
+            data: Bajty zapisane przez ImageWriter (Future z submit) lub None
+        
         Returns:
-            secure_url (str) lub None jeśli błąd
+            DetectionArtifact lub None jeśli błąd
         """
+        filename = os.path.basename(filepath)
         try:
-            if not self.cloudinary_enabled:
-                import logging
-                logging.error("Cloudinary not initialized")
-                return None
-            
-            filename = os.path.basename(filepath)
-            
-            print(f"☁️  Wysyłanie {filename} na Cloudinary...")
-            
-            response = cloudinary.uploader.upload(
-                filepath,
-                folder="phone_detections",
-                public_id=os.path.splitext(filename)[0],
-                resource_type="image",
-                overwrite=True
-            )
-            
-            secure_url = response.get('secure_url')
-            public_id = response.get('public_id')
-            
-            print(f"✅ Plik wysłany na Cloudinary: {public_id}")
-            print(f"🔗 Link (publiczny): {secure_url}")
-            
-            return secure_url
-            
+            if encode and image is not None:
+                artifact = DetectionArtifact.from_frame(image, filename, self.image_writer)
+                artifact.write_to(filepath, self.image_writer)
+            elif data is not None:
+                artifact = DetectionArtifact.from_encoded(filename, data, self.image_writer.mimetype, frame=image)
+            else:
+                with open(filepath, 'rb') as f:
+                    data = f.read()
+                artifact = DetectionArtifact.from_encoded(filename, data, self.image_writer.mimetype, frame=image)
+            return artifact
         except Exception as e:
             import logging
-            logging.error(f"Error uploading to Cloudinary: {e}")
+            logging.error(f"Error building detection artifact for {filepath}: {e}")
             return None
     
     def _send_sms_notification(self, public_link, confidence, zone_name=None):
@@ -1383,7 +1712,7 @@ class AnonymizerWorker(threading.Thread):
         Wysyła powiadomienie SMS przez Vonage (Nexmo).
         
         Args:
-            public_link: Link do pliku na Google Drive (lub None jeśli upload się nie powiódł)
+            public_link: Link do obrazu (lub None jeśli upload się nie powiódł lub nie zdążył przed terminem)
             confidence: Pewność detekcji
             zone_name: Nazwa strefy (np. "ławka 1") lub None
             
@@ -1391,17 +1720,6 @@ class AnonymizerWorker(threading.Thread):
             True jeśli sukces, False w przeciwnym razie
         """
         try:
-            if self.vonage_sms is None:
-                import logging
-                logging.error("Vonage client not initialized")
-                return False
-            
-            if not self.vonage_to_number:
-                import logging
-                logging.error("Missing destination number (VONAGE_TO_NUMBER) - cannot send SMS")
-                return False
-            
-
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             location = zone_name or self.settings.get('camera_name', 'Camera 1')
             
@@ -1420,10 +1738,35 @@ class AnonymizerWorker(threading.Thread):
                     f"Time: {timestamp}\n"
                     f"Location: {location}\n"
                     f"Confidence: {confidence:.2%}\n"
-                    f"(Image upload failed)\n"
+                    f"(Image link unavailable)\n"
                     f"---"
             )
 
+            return self._send_sms_text(message_body)
+            
+        except Exception as e:
+            import logging
+            logging.error(f"Error sending SMS: {e}")
+            return False
+    
+    def _send_sms_text(self, message_body):
+        """
+        Wysyła gotową treść SMS przez Vonage.
+        
+        Returns:
+            True jeśli sukces, False w przeciwnym razie
+        """
+        try:
+            if self.vonage_sms is None:
+                import logging
+                logging.error("Vonage client not initialized")
+                return False
+            
+            if not self.vonage_to_number:
+                import logging
+                logging.error("Missing destination number (VONAGE_TO_NUMBER) - cannot send SMS")
+                return False
+            
             to_number = str(self.vonage_to_number).replace('+', '')
             
             print(f"📱 Wysyłanie SMS na +{to_number}...")
@@ -1456,14 +1799,49 @@ class AnonymizerWorker(threading.Thread):
             logging.error(f"Error sending SMS: {e}")
             return False
     
-    def _send_email_notification(self, public_link, filepath, confidence, location):
+    def _build_email_message(self, media, public_link, confidence, location):
+        """Buduje wiadomość HTML z obrazami osadzonymi jeden raz (Content-ID), bez osobnych załączników."""
+        message = MIMEMultipart('related')
+        message['Subject'] = f"Wykryto Telefon! ({location})"
+        message['From'] = self.email_user
+        message['To'] = self.email_recipient
+        
+        body_parts = [
+            "<b>Wykryto Telefon!</b>",
+            "<hr>",
+            f"<b>Lokalizacja:</b> {location}<br>",
+            f"<b>Pewność detekcji:</b> {(confidence * 100):.1f}%<br>",
+            "<br>",
+            "Zanonimizowany obraz:<br>" if media else "(Obraz detekcji niedostępny)<br>",
+        ]
+        
+        image_parts = []
+        for item in media:
+            image_cid = make_msgid(domain='phone-detection')[1:-1]
+            body_parts.append(f'<img src="cid:{image_cid}" alt="{item.filename}"><br>')
+            image_part = MIMEImage(item.data, _subtype=item.subtype)
+            image_part.add_header('Content-ID', f'<{image_cid}>')
+            image_part.add_header('Content-Disposition', 'inline', filename=item.filename)
+            image_parts.append(image_part)
+        
+        if public_link:
+            body_parts.append(f'<br><a href="{public_link}">Link do obrazu w chmurze</a>')
+        
+        message.attach(MIMEText("\n".join(body_parts), 'html', 'utf-8'))
+        for image_part in image_parts:
+            message.attach(image_part)
+        
+        return message
+    
+    def _send_email_notification(self, public_link, media, confidence, location):
         """
-        Wysyła powiadomienie e-mail przez Yagmail z osadzonym obrazem.
-        Tworzy nowe, świeże połączenie SMTP przy każdej wysyłce.
+        Wysyła powiadomienie e-mail z osadzonymi obrazami.
+        Obrazy pochodzą z pamięci (DetectionArtifact / NotificationMedia) - plik nie jest ponownie czytany z dysku.
+        Wiadomość idzie przez utrzymywaną sesję z SMTPPool (bez nowego TLS/AUTH przy każdym alercie).
         
         Args:
-            public_link: Link do pliku na Cloudinary
-            filepath: Lokalna ścieżka do pliku (dla osadzenia i załącznika)
+            public_link: Link do obrazu (lub None)
+            media: Lista DetectionArtifact do osadzenia (pełny obraz, podgląd i/lub wycinek); pusta = e-mail bez obrazu
             confidence: Pewność detekcji
             location: Nazwa kamery/lokalizacji
             
@@ -1471,37 +1849,37 @@ class AnonymizerWorker(threading.Thread):
             True jeśli sukces, False w przeciwnym razie
         """
 
-        if not all([self.email_user, self.email_password, self.email_recipient]):
+        if self.smtp_pool is None:
             print("⚠️ Brak danych Email. Pomijam wysyłkę.")
             return False
         
+        if not media:
+            # Bez obrazu (np. plik usunięty przed doręczeniem z outboxu) - sama treść zamiast ponawiania do wyczerpania prób
+            import logging
+            logging.warning("Detection image unavailable - sending text-only email")
+        
         try:
-            subject = f"Wykryto Telefon! ({location})"
-            
-            body_content = [
-                "<b>Wykryto Telefon!</b>",
-                "<hr>",
-                f"<b>Lokalizacja:</b> {location}",
-                 f"<b>Pewność detekcji:</b> {(confidence * 100):.1f}%",
-                "<br>",
-                "Zanonimizowany obraz (osadzony poniżej i w załączniku):",
-                yagmail.inline(filepath)
-            ]
-            
-
-            if public_link and public_link != "(Upload do Cloudinary nie powiódł się)":
-                body_content.append(f'<br><a href="{public_link}">Link do obrazu w chmurze</a>')
-            
-
-
-            with yagmail.SMTP(self.email_user, self.email_password) as yag_client:
-                yag_client.send(
-                    to=self.email_recipient,
-                    subject=subject,
-                    contents=body_content,
-                    attachments=filepath
-                )
-
+            message = self._build_email_message(media, public_link, confidence, location)
+        except Exception as e:
+            import logging
+            logging.error(f"Error building email message: {e}")
+            return False
+        
+        return self._send_email_message(message)
+    
+    def _send_email_message(self, message):
+        """
+        Wysyła gotową wiadomość e-mail przez SMTPPool.
+        
+        Returns:
+            True jeśli sukces, False w przeciwnym razie
+        """
+        if self.smtp_pool is None:
+            print("⚠️ Brak danych Email. Pomijam wysyłkę.")
+            return False
+        
+        try:
+            self.smtp_pool.send(message)
             
             print(f"✅ Pomyślnie wysłano e-mail (z osadzonym obrazem) do {self.email_recipient}")
             return True
@@ -1513,7 +1891,7 @@ class AnonymizerWorker(threading.Thread):
                 return True
             else:
                 import logging
-                logging.error(f"Critical email error (Yagmail SMTPDataError): {e}")
+                logging.error(f"Critical email error (SMTPDataError): {e}")
                 import traceback
                 traceback.print_exc()
                 return False
@@ -1521,195 +1899,487 @@ class AnonymizerWorker(threading.Thread):
         except Exception as e:
 
             import logging
-            logging.error(f"Critical email error (Yagmail): {e}")
+            logging.error(f"Critical email error: {e}")
             import traceback
             traceback.print_exc()
             return False
     
-    def _handle_cloud_notification(self, filepath, confidence, zone_name=None):
+    def _remember_media(self, image_name, artifact, media, zone_name):
+        """Zachowuje obrazy powiadomień w pamięci do czasu doręczenia przez outbox (ograniczony cache LRU)."""
+        with self._media_cache_lock:
+            self._media_cache[image_name] = {'artifact': artifact, 'media': media, 'zone_name': zone_name}
+            self._media_cache.move_to_end(image_name)
+            while len(self._media_cache) > self.media_cache_size:
+                self._media_cache.popitem(last=False)
+    
+    def _media_for(self, row):
         """
-        Orkiestrator powiadomień - upload na Cloudinary i wysyłka SMS/Email.
+        Zwraca obrazy dla wiersza outboxu: z cache, a po restarcie - odtworzone raz z pliku na dysku.
+        """
+        image_name = row.get('image_path')
+        with self._media_cache_lock:
+            context = self._media_cache.get(image_name)
+        if context is not None:
+            return context
+        
+        artifact = None
+        if image_name:
+            filepath = os.path.join(self.media_root, image_name)
+            try:
+                with open(filepath, 'rb') as f:
+                    data = f.read()
+                mimetype = 'image/webp' if filepath.lower().endswith('.webp') else 'image/jpeg'
+                artifact = DetectionArtifact.from_encoded(image_name, data, mimetype)
+                artifact.ensure_preview()
+            except Exception as e:
+                import logging
+                logging.error(f"Outbox: detection image unavailable ({filepath}): {e}")
+        media = self.notification_media.build(artifact) if artifact is not None else []
+        self._remember_media(image_name, artifact, media, row.get('location'))
+        return {'artifact': artifact, 'media': media, 'zone_name': row.get('location')}
+    
+    @staticmethod
+    def _utc_to_epoch(value):
+        if value is None:
+            return time.time()
+        return value.replace(tzinfo=timezone.utc).timestamp()
+    
+    def _deliver_outbox(self, rows):
+        """
+        Doręcza partię wierszy outboxu (wywoływane przez NotificationOutbox).
+        Wiersze jednej detekcji (sms, email) wysyłane są razem, z jednym uploadem obrazu.
+        """
+        groups = OrderedDict()
+        for row in rows:
+            groups.setdefault(row['detection_id'], []).append(row)
+        
+        for detection_rows in groups.values():
+            first = detection_rows[0]
+            context = self._media_for(first)
+            created_at = self._utc_to_epoch(first.get('detected_at'))
+            
+            if self.alert_digest is not None:
+                self.alert_digest.add({
+                    'artifact': context['artifact'],
+                    'confidence': first.get('confidence') or 0.0,
+                    'location': first.get('location') or self.settings.get('camera_name', 'Camera 1'),
+                    'rows': detection_rows,
+                    'created_at': created_at,
+                    'time': datetime.fromtimestamp(created_at),
+                })
+                print(f"🗂️  Detekcja dodana do digestu ({first.get('location')})")
+                continue
+            
+            self._dispatch_notifications(
+                context['artifact'], first.get('confidence') or 0.0, context['zone_name'], detection_rows,
+                media=context['media'],
+                created_at=created_at,
+                priority=PRIORITY_LOW if first['attempts'] > 1 else PRIORITY_HIGH
+            )
+    
+    def _dispatch_notifications(self, artifact, confidence, zone_name, rows,
+                                media=None, created_at=None, priority=PRIORITY_HIGH):
+        """
+        Orkiestrator powiadomień - przekazuje upload obrazu i wysyłkę SMS/Email
+        do NotificationDispatcher (stała pula wątków, ograniczone kolejki per kanał).
         
         Args:
-            filepath: Ścieżka do pliku
+            artifact: DetectionArtifact z pełnym obrazem lub None
             confidence: Pewność detekcji
             zone_name: Nazwa strefy (np. "ławka 1") lub None
+            rows: Wiersze outboxu tej detekcji (jeden na kanał)
+            media: Obrazy do powiadomień z NotificationMedia (pierwszy idzie na upload); domyślnie [artifact]
+            created_at: Czas detekcji (time.time()) - do pomiaru opóźnienia end-to-end
+            priority: Priorytet zadań (PRIORITY_HIGH dla nowych detekcji)
         """
+        created_at = created_at if created_at is not None else time.time()
+        location = zone_name or self.settings.get('camera_name', 'Camera 1')
+        if media is None:
+            media = [artifact] if artifact is not None else []
+        
+        rows_by_channel = self._allowed_rows(rows)
+        senders = []
+        if 'sms' in rows_by_channel:
+            senders.append(('sms', lambda link: self._send_sms_notification(link, confidence, zone_name),
+                            priority, rows_by_channel['sms']))
+        if 'email' in rows_by_channel:
+            senders.append(('email', lambda link: self._send_email_notification(link, media, confidence, location),
+                            max(priority, PRIORITY_NORMAL), rows_by_channel['email']))
+        
+        primary = media[0] if media else None
+        print(f"🚀 Rozpoczynam wysyłkę powiadomienia dla: {primary.filename if primary is not None else None}")
+        self._fan_out(primary, senders, created_at, priority)
+    
+    def _allowed_rows(self, rows):
+        """
+        Stosuje limity kanałów (AlertThrottle) - jedna wiadomość na kanał.
+        Wiersze kanałów ponad limitem oznaczane są w outboxie jako suppressed.
+        
+        Returns:
+            Słownik kanał -> lista wierszy do doręczenia
+        """
+        rows_by_channel = OrderedDict()
+        for row in rows:
+            rows_by_channel.setdefault(row['channel'], []).append(row)
+        
+        for channel in list(rows_by_channel):
+            if not self.alert_throttle.allow_channel(channel):
+                print(f"🚦 Limit kanału {channel} na godzinę osiągnięty - pomijam")
+                for row in rows_by_channel.pop(channel):
+                    self.notification_outbox.complete(row, STATUS_SUPPRESSED, 'rate limited')
+        return rows_by_channel
+    
+    def _on_breaker_change(self, channel, new_state):
+        """Po powrocie dostawcy odtwarza zaległe powiadomienia kanału z outboxu."""
+        if new_state != STATE_CLOSED:
+            return
         try:
-            print(f"🚀 Rozpoczynam wysyłkę powiadomienia dla: {filepath}")
-            
-
-            public_link = self._upload_to_cloudinary(filepath)
-            
-
-            with self.settings_lock:
-                email_on = self.email_enabled
-                sms_on = self.sms_enabled
-            
-            if public_link:
-                print(f"✅ Plik wysłany na Cloudinary")
+            self.notification_outbox.replay(channel)
+        except Exception as e:
+            import logging
+            logging.error(f"Outbox replay error ({channel}): {e}")
+    
+    def _guarded_sender(self, channel, fn, state):
+        """
+        Opakowuje funkcję wysyłki bezpiecznikiem kanału.
+        
+        Gdy obwód nie przepuszcza wywołania, ustawia state['deferred'] i zwraca False
+        bez kontaktu z dostawcą; w przeciwnym razie zapisuje sukces/błąd w bezpieczniku.
+        """
+        breaker = self.breakers.get(channel)
+        if breaker is None:
+            return fn
+        
+        def _send(public_link):
+            if not breaker.allow():
+                state['deferred'] = True
+                return False
+            try:
+                result = fn(public_link)
+            except Exception as e:
+                breaker.record_failure(e)
+                raise
+            if result is False:
+                breaker.record_failure(f"{channel} send failed")
+            else:
+                breaker.record_success()
+            return result
+        return _send
+    
+    def _defer_rows(self, channel, rows):
+        """Odkłada wiersze outboxu do czasu próby bezpiecznika (bez zużycia próby)."""
+        breaker = self.breakers.get(channel)
+        retry_at = breaker.retry_at() if breaker is not None else None
+        for row in rows:
+            self.notification_outbox.complete(row, STATUS_DEFERRED, retry_at)
+    
+    def _fan_out(self, artifact, senders, created_at, priority):
+        """
+        Upload obrazu (UploadService), a po nim wysyłka przez kanały SMS/Email.
+        
+        SMS i Email trafiają do kolejek po uploadzie (potrzebują linku) lub po
+        upływie UPLOAD_LINK_DEADLINE - wtedy bez linku.
+        Wynik każdego kanału zapisywany jest w outboxie (delivered / failed).
+        Kanały z otwartym bezpiecznikiem są od razu odkładane (deferred).
+        Znaczniki upload/send_start/sent trafiają do row['marks'] (Notification.trace)
+        i do LatencyTracer.
+        
+        Args:
+            senders: Lista (kanał, funkcja(public_link), priorytet, wiersze outboxu)
+        """
+        if not senders:
+            return
+        
+        def _send_alerts(public_link, uploaded_at=None):
+            for channel, fn, channel_priority, rows in senders:
+                breaker = self.breakers.get(channel)
+                if breaker is not None and breaker.is_open():
+                    print(f"🔌 Obwód {channel} otwarty - odkładam {len(rows)} powiadomień")
+                    self._defer_rows(channel, rows)
+                    continue
                 
-
-                if sms_on:
-                    self._send_sms_notification(public_link, confidence, zone_name)
+                state = {'deferred': False}
+                marks = {'upload': uploaded_at} if uploaded_at is not None else {}
                 
-                if email_on:
-                    location = zone_name or self.settings.get('camera_name', 'Camera 1')
-                    self._send_email_notification(
-                        public_link,
-                        filepath,
-                        confidence,
-                        location
-                    )
-            else:
-                if sms_on:
-                    self._send_sms_notification(None, confidence, zone_name)
+                def _timed_send(link, send=self._guarded_sender(channel, fn, state), marks=marks):
+                    marks['send_start'] = time.time()
+                    result = send(link)
+                    marks['sent'] = time.time()
+                    return result
                 
-                if email_on:
-                    location = zone_name or self.settings.get('camera_name', 'Camera 1')
-
-                    self._send_email_notification(
-                        "(Upload do Cloudinary nie powiódł się)",
-                        filepath,
-                        confidence,
-                        location
-                    )
+                def _on_channel_done(result, channel=channel, rows=rows, state=state, marks=marks):
+                    if state['deferred']:
+                        self._defer_rows(channel, rows)
+                        return
+                    status = STATUS_DELIVERED if result is not None else STATUS_FAILED
+                    for row in rows:
+                        row_marks = row.setdefault('marks', {})
+                        row_marks.update(marks)
+                        self.notification_outbox.complete(row, status, None if result is not None else 'send failed')
+                        if status == STATUS_DELIVERED:
+                            self.latency_tracer.observe_delivery(channel, row.get('trace'), row_marks)
                 
-        except Exception as e:
-            import logging
-            logging.error(f"Error in _handle_cloud_notification: {e}")
+                accepted = self.notification_dispatcher.submit(
+                    channel, _timed_send, public_link,
+                    priority=channel_priority,
+                    created_at=created_at,
+                    on_done=_on_channel_done
+                )
+                if not accepted:
+                    for row in rows:
+                        self.notification_outbox.complete(row, STATUS_FAILED, f"{channel} queue full")
+        
+        if artifact is None or self.upload_service is None:
+            _send_alerts(None)
+            return
+        
+        # SMS/Email czekają na link najwyżej link_deadline sekund; upload trwa dalej w tle.
+        release_lock = threading.Lock()
+        released = {'done': False}
+        
+        def _release(public_link):
+            with release_lock:
+                if released['done']:
+                    return
+                released['done'] = True
+            deadline_timer.cancel()
+            if public_link is None:
+                print(f"⏱️  Brak linku do obrazu (upload nieudany lub przekroczony termin) - wysyłam bez linku")
+            _send_alerts(public_link, time.time() if public_link is not None else None)
+        
+        deadline_timer = threading.Timer(self.upload_service.link_deadline, _release, args=(None,))
+        deadline_timer.daemon = True
+        deadline_timer.start()
+        self.upload_service.submit(artifact).add_done_callback(lambda future: _release(future.result()))
     
-    def _anonymize_faces(self, image_path):
+    def _build_digest_sms(self, events, public_link):
+        """Buduje jeden SMS podsumowujący wszystkie strefy z okna digestu."""
+        zone_counts = {}
+        for event in events:
+            zone_counts[event['location']] = zone_counts.get(event['location'], 0) + 1
+        zones = sorted(zone_counts.items(), key=lambda item: -item[1])
+        zone_summary = ", ".join(f"{name} x{count}" for name, count in zones[:5])
+        if len(zones) > 5:
+            zone_summary += f", +{len(zones) - 5} more"
+        
+        first = min(event['time'] for event in events)
+        last = max(event['time'] for event in events)
+        lines = [
+            "Phone Detection Digest!",
+            f"Time: {first.strftime('%H:%M:%S')} - {last.strftime('%H:%M:%S')}",
+            f"Detections: {len(events)} in {len(zones)} zone(s)",
+            f"Zones: {zone_summary}",
+            f"Max confidence: {max(event['confidence'] for event in events):.2%}",
+            f"Image: {public_link}" if public_link else "(Image upload failed)",
+            "---",
+        ]
+        return "\n".join(lines)
+    
+    def _build_digest_email(self, events, sheet, public_link):
+        """Buduje wiadomość HTML z tabelą detekcji i arkuszem miniatur osadzonym jeden raz."""
+        message = MIMEMultipart('related')
+        message['Subject'] = f"Wykryto Telefon! ({len(events)} detekcji)"
+        message['From'] = self.email_user
+        message['To'] = self.email_recipient
+        
+        rows = "\n".join(
+            f"<tr><td>{event['time'].strftime('%Y-%m-%d %H:%M:%S')}</td>"
+            f"<td>{event['location']}</td><td>{(event['confidence'] * 100):.1f}%</td></tr>"
+            for event in sorted(events, key=lambda e: e['time'])
+        )
+        body_parts = [
+            f"<b>Wykryto Telefon! ({len(events)} detekcji)</b>",
+            "<hr>",
+            "<table><tr><th>Czas</th><th>Lokalizacja</th><th>Pewność</th></tr>",
+            rows,
+            "</table>",
+        ]
+        
+        image_part = None
+        if sheet is not None:
+            image_cid = make_msgid(domain='phone-detection')[1:-1]
+            body_parts += ["<br>", "Zanonimizowane obrazy:<br>", f'<img src="cid:{image_cid}" alt="{sheet.filename}">']
+            image_part = MIMEImage(sheet.data, _subtype=sheet.subtype)
+            image_part.add_header('Content-ID', f'<{image_cid}>')
+            image_part.add_header('Content-Disposition', 'inline', filename=sheet.filename)
+        
+        if public_link:
+            body_parts.append(f'<br><a href="{public_link}">Link do obrazu w chmurze</a>')
+        
+        message.attach(MIMEText("\n".join(body_parts), 'html', 'utf-8'))
+        if image_part is not None:
+            message.attach(image_part)
+        return message
+    
+    def _send_digest(self, events):
+        """
+        Wysyła jeden SMS i jeden e-mail dla wszystkich detekcji z okna digestu
+        (wywoływane przez AlertDigest po zamknięciu okna).
+        
+        Arkusz miniatur budowany jest w jednym przebiegu z podglądów w pamięci
+        i wysyłany przez UploadService jako jeden obraz. Wynik zapisywany jest
+        we wszystkich wierszach outboxu objętych digestem.
+        """
+        rows_by_channel = self._allowed_rows([row for event in events for row in event['rows']])
+        if not rows_by_channel:
+            return
+        
+        sheet = None
+        data = build_contact_sheet(events)
+        if data is not None:
+            sheet = DetectionArtifact.from_encoded(
+                f"digest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg", data, 'image/jpeg'
+            )
+        
+        senders = []
+        if 'sms' in rows_by_channel:
+            senders.append(('sms', lambda link: self._send_sms_text(self._build_digest_sms(events, link)),
+                            PRIORITY_HIGH, rows_by_channel['sms']))
+        if 'email' in rows_by_channel:
+            senders.append(('email', lambda link: self._send_email_message(self._build_digest_email(events, sheet, link)),
+                            PRIORITY_NORMAL, rows_by_channel['email']))
+        
+        print(f"🗂️  Wysyłam digest: {len(events)} detekcji")
+        self._fan_out(sheet, senders, min(event['created_at'] for event in events), PRIORITY_HIGH)
+    
+    def detect_head_boxes(self, image_path, image_size):
+        """
+        Wykrywa głowy modelem Roboflow (pewność >= 40%).
+
+        Używane przy anonimizacji zdjęcia detekcji i przez ClipRecorder
+        do ponownej detekcji na klatkach klipu.
+
+        Args:
+            image_path: Ścieżka do pliku obrazu (model czyta plik)
+            image_size: (szerokość, wysokość) obrazu w pikselach
+
+        Returns:
+            Lista ramek (x1, y1, x2, y2) w pikselach lub None, jeśli model jest niedostępny
+        """
+        if self.model is None:
+            return None
+
+        img_w, img_h = image_size
+        prediction = self.model.predict(image_path, confidence=40, overlap=30)
+        boxes = []
+        for det in prediction.json().get('predictions', []):
+            if det.get('confidence', 0) < 0.4:
+                continue
+            center_x, center_y = int(det['x']), int(det['y'])
+            width, height = int(det['width']), int(det['height'])
+            x1, y1 = max(0, center_x - width // 2), max(0, center_y - height // 2)
+            x2, y2 = min(img_w, center_x + width // 2), min(img_h, center_y + height // 2)
+            if x2 <= x1 or y2 <= y1:
+                print(f"⚠️  Nieprawidłowy ROI głowy: ({x1},{y1})-({x2},{y2}), pomijam")
+                continue
+            boxes.append((x1, y1, x2, y2))
+        return boxes
+
+    def _anonymize_faces(self, image_path, image=None):
         """
         Anonimizuje wykryte głowy używając modelu Roboflow head-detection.
         
         Strategia:
         - Wykrywa głowy za pomocą modelu Roboflow
         - Dla każdej wykrytej głowy zamazuje cały bounding box
-        - Jeśli brak głów - zapisuje oryginał bez zmian
+        - Jeśli brak głów - zwraca oryginał bez zmian
+        
+        Zapis na dysk odbywa się później, raz, przez DetectionArtifact.
         
         Args:
-            image_path: Ścieżka do obrazu
+            image_path: Ścieżka do obrazu (oryginał zapisany przez ImageWriter)
+            image: Opcjonalnie klatka w pamięci (pomija ponowne czytanie z dysku)
             
         Returns:
-            True jeśli sukces
+            (obraz, lista zamazanych ramek głów (x1, y1, x2, y2)) lub (None, []) jeśli błąd
         """
         try:
 
-            if self.model is None:
-                return True
-            
-
-            image = cv2.imread(image_path)
+            if image is None:
+                image = cv2.imread(image_path)
             if image is None:
                 import logging
                 logging.error(f"Cannot load: {image_path}")
-                return False
-            
-
-            img_h, img_w = image.shape[:2]
-            
-
-            prediction = self.model.predict(image_path, confidence=40, overlap=30)
-            results = prediction.json()
-            
-            heads_found = 0
-            
-
-            for det in results.get('predictions', []):
-                confidence = det.get('confidence', 0)
-                
-
-                if confidence >= 0.4:
-                    heads_found += 1
-                    
+                return None, []
 
-                    center_x = int(det['x'])
-                    center_y = int(det['y'])
-                    width = int(det['width'])
-                    height = int(det['height'])
-                    
-
-                    x1 = center_x - width // 2
-                    y1 = center_y - height // 2
-                    x2 = center_x + width // 2
-                    y2 = center_y + height // 2
-                    
-
-                    x1, y1 = max(0, x1), max(0, y1)
-                    x2, y2 = min(img_w, x2), min(img_h, y2)
-                    
-
-                    if x2 <= x1 or y2 <= y1:
-                        print(f"⚠️  Nieprawidłowy ROI głowy: ({x1},{y1})-({x2},{y2}), pomijam")
-                        continue
-                    
+            if self.model is None:
+                return image, []
 
-                    roi = image[y1:y2, x1:x2]
-                    
+            img_h, img_w = image.shape[:2]
+            head_boxes = []
+            for x1, y1, x2, y2 in self.detect_head_boxes(image_path, (img_w, img_h)):
+                roi = image[y1:y2, x1:x2]
+                if roi.size > 0:
+                    image[y1:y2, x1:x2] = cv2.GaussianBlur(roi, (99, 99), 30)
+                    head_boxes.append((x1, y1, x2, y2))
+                    self.persons_anonymized += 1
+                    print(f"  ✓ Zanonimizowano głowę #{len(head_boxes)}")
+                else:
+                    print(f"⚠️  Pusty ROI dla głowy, pomijam")
 
-                    if roi.size > 0:
-                        blur = cv2.GaussianBlur(roi, (99, 99), 30)
-                        image[y1:y2, x1:x2] = blur
-                        self.persons_anonymized += 1
-                        print(f"  ✓ Zanonimizowano głowę #{heads_found} (conf: {confidence:.2f})")
-                    else:
-                        print(f"⚠️  Pusty ROI dla głowy, pomijam")
-            
-            if heads_found == 0:
+            if not head_boxes:
                 print(f"ℹ️  Brak głów na obrazie - zapisuję oryginał bez zmian")
             else:
-                print(f"👤 Zanonimizowano {heads_found} głów")
-            
+                print(f"👤 Zanonimizowano {len(head_boxes)} głów")
 
-            success = cv2.imwrite(image_path, image)
-            
-            if not success:
-                import logging
-                logging.error(f"Failed to save: {image_path}")
-                return False
-            
-            return True
+            return image, head_boxes
             
         except Exception as e:
             import logging
             logging.error(f"Anonymization error: {e}")
             import traceback
             traceback.print_exc()
-            return False
+            return None, []
     
-    def _save_to_database(self, detection_data):
-        """Zapisuje wykrycie do bazy danych (tylko zanonimizowany obraz)"""
+    def _save_to_database(self, detection_data, callback=None, notifications=None):
+        """
+        Zleca zapis wykrycia do bazy danych (tylko zanonimizowany obraz).
+        
+        Zapis jest grupowany przez DetectionWriter - kilka detekcji trafia do bazy
+        jednym INSERT i jednym commitem. Worker nie czeka na commit.
+        
+        Args:
+            detection_data: Dane zadania z kolejki
+            callback: Opcjonalna funkcja wywoływana z Future (wynik: id detekcji) po commicie
+            notifications: Kanały powiadomień - wiersze outboxu powstają w tej samej transakcji
+            
+        Returns:
+            concurrent.futures.Future z id detekcji lub None jeśli błąd
+        """
         try:
-            from app import app
             filepath = detection_data.get('filepath')
             confidence = detection_data.get('confidence', 0.0)
             zone_name = detection_data.get('zone_name')
             filename = os.path.basename(filepath)
+            location = zone_name or self.settings.get('camera_name', 'Camera 1')
             
-            with app.app_context():
-                admin_user = User.query.filter_by(username='admin').first()
-                if admin_user:
-                    location = zone_name or self.settings.get('camera_name', 'Camera 1')
-                    detection = Detection(
-                        location=location,
-                        confidence=confidence,
-                        image_path=filename,
-                        status='Pending',
-                        user_id=admin_user.id
-                    )
-                    db.session.add(detection)
-                    db.session.commit()
-                else:
-                    import logging
-                    logging.error("Admin user not found")
+            return self.detection_writer.submit(
+                location=location,
+                confidence=confidence,
+                image_path=filename,
+                status='Pending',
+                timestamp=detection_data.get('timestamp'),
+                callback=callback,
+                dedupe=detection_data.get('recovered', False),
+                notifications=notifications,
+                trace=detection_data.get('trace'),
+                camera=self.settings.get('camera_name', 'Camera 1')
+            )
         except Exception as e:
             import logging
             logging.error(f"Database save error: {e}")
+            return None
     
     def stop(self):
         """Zatrzymuje workera"""
         self.is_running = False
+        if self.alert_digest is not None:
+            self.alert_digest.flush()
+        self.notification_outbox.stop()
+        if self.upload_service is not None:
+            self.upload_service.stop()
+        if self.smtp_pool is not None:
+            self.smtp_pool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik dla zewnętrznego dostawcy (Cloudinary, Vonage, SMTP).
+
+    closed: wywołania przechodzą; failure_threshold kolejnych błędów otwiera obwód.
+    open: wywołania są od razu odrzucane (bez czekania na timeout sieci)
+          przez reset_timeout sekund.
+    half_open: przepuszczane jest jedno wywołanie próbne; sukces zamyka obwód,
+               błąd otwiera go ponownie.
+
+    Słuchacze (add_listener) dostają zmiany stanu - np. do odtworzenia
+    zaległych wysyłek po powrocie dostawcy.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._listeners = []
+
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error = None
+
+    @classmethod
+    def from_env(cls, name):
+        return cls(
+            name,
+            failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+        )
+
+    def add_listener(self, listener):
+        """listener(name, old_state, new_state) - wywoływany poza blokadą."""
+        self._listeners.append(listener)
+
+    def _transition(self, new_state):
+        old_state, self._state = self._state, new_state
+        return (old_state, new_state) if old_state != new_state else None
+
+    def _notify(self, change):
+        if change is None:
+            return
+        old_state, new_state = change
+        if new_state == STATE_OPEN:
+            logger.warning(f"Circuit '{self.name}' opened after {self._failures} failures - fast-failing for {self.reset_timeout:.0f}s")
+        elif new_state == STATE_CLOSED:
+            logger.info(f"Circuit '{self.name}' closed - provider recovered")
+        for listener in self._listeners:
+            try:
+                listener(self.name, old_state, new_state)
+            except Exception as e:
+                logger.error(f"Circuit '{self.name}' listener failed: {e}")
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def is_open(self):
+        """True, jeśli wywołanie zostałoby teraz odrzucone (bez zmiany stanu)."""
+        with self._lock:
+            if self._state == STATE_OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self._state == STATE_HALF_OPEN and self._probe_in_flight
+
+    def retry_at(self):
+        """Czas (time.time()), od którego możliwe jest wywołanie próbne, lub None gdy obwód zamknięty."""
+        with self._lock:
+            if self._state != STATE_OPEN:
+                return None
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            return time.time() + max(0.0, remaining)
+
+    def allow(self):
+        """Decyduje, czy wywołać dostawcę. W stanie half_open przepuszcza jedno wywołanie próbne."""
+        change = None
+        with self._lock:
+            if self._state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                change = self._transition(STATE_HALF_OPEN)
+            if self._state == STATE_HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    allowed = False
+                else:
+                    self._probe_in_flight = True
+                    allowed = True
+            else:
+                allowed = True
+        self._notify(change)
+        return allowed
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self._failures = 0
+            self._probe_in_flight = False
+            change = self._transition(STATE_CLOSED)
+        self._notify(change)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.total_failures += 1
+            self._failures += 1
+            self.last_error = str(error)[:200] if error else None
+            change = None
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._probe_in_flight = False
+                self._opened_at = time.monotonic()
+                if self._state != STATE_OPEN:
+                    self.times_opened += 1
+                change = self._transition(STATE_OPEN)
+        self._notify(change)
+
+    def get_state(self):
+        retry_at = self.retry_at()
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_s': self.reset_timeout,
+                'retry_at': datetime.fromtimestamp(retry_at).isoformat() if retry_at else None,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'successes': self.total_successes,
+                'failures': self.total_failures,
+                'last_error': self.last_error,
+            }
@@ -0,0 +1,422 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from queue import Queue, Empty
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class FrameRingBuffer:
+    """
+    Bufor cykliczny ostatnich klatek kamery przechowywanych jako pakiety JPEG.
+
+    Klatki są próbkowane do fps klipu i zmniejszane do max_dimension, a pamięć
+    ograniczona jest zarówno czasem (max_seconds), jak i liczbą bajtów (max_bytes).
+    """
+
+    def __init__(self, max_seconds=6.0, fps=10, max_dimension=640, max_bytes=16 * 1024 * 1024, jpeg_quality=80):
+        self.max_seconds = max_seconds
+        self.fps = fps
+        self.max_dimension = max_dimension
+        self.max_bytes = max_bytes
+        self.jpeg_quality = jpeg_quality
+
+        self._packets = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._last_push = 0.0
+        self.frames_pushed = 0
+        self.frames_evicted = 0
+
+    def _downscale(self, frame):
+        h, w = frame.shape[:2]
+        longest = max(h, w)
+        if not self.max_dimension or longest <= self.max_dimension:
+            return frame
+        scale = self.max_dimension / float(longest)
+        return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    def push(self, frame, timestamp=None):
+        """Dodaje klatkę (jeśli minął interwał 1/fps). Wywoływane z pętli kamery."""
+        now = timestamp if timestamp is not None else time.time()
+        if now - self._last_push < 1.0 / self.fps:
+            return False
+        self._last_push = now
+
+        success, buffer = cv2.imencode('.jpg', self._downscale(frame), [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not success:
+            return False
+        packet = buffer.tobytes()
+
+        with self._lock:
+            self._packets.append((now, packet))
+            self._bytes += len(packet)
+            self.frames_pushed += 1
+            while self._packets and (
+                self._bytes > self.max_bytes or now - self._packets[0][0] > self.max_seconds
+            ):
+                _, old = self._packets.popleft()
+                self._bytes -= len(old)
+                self.frames_evicted += 1
+        return True
+
+    def snapshot(self, since=None, until=None):
+        """Zwraca listę (timestamp, jpeg_bytes) z przedziału (since, until]."""
+        with self._lock:
+            return [
+                (ts, packet) for ts, packet in self._packets
+                if (since is None or ts > since) and (until is None or ts <= until)
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._packets.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            span = self._packets[-1][0] - self._packets[0][0] if len(self._packets) > 1 else 0.0
+            return {
+                'frames': len(self._packets),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'seconds_buffered': round(span, 2),
+                'frames_pushed': self.frames_pushed,
+                'frames_evicted': self.frames_evicted,
+            }
+
+
+class ClipJob:
+    """
+    Zlecenie zapisu klipu dla jednej detekcji.
+
+    AnonymizerWorker uzupełnia je o ramki głów (set_head_boxes) oraz o id
+    detekcji (set_detection_id), gdy tylko są znane. Klatki po zdarzeniu
+    (set_post_packets) zbiera timer rekordera w chwili event_time + post_seconds.
+    """
+
+    def __init__(self, event_time, clip_path, pre_packets, should_blur):
+        self.event_time = event_time
+        self.clip_path = clip_path
+        self.pre_packets = pre_packets
+        self.post_packets = None
+        self.should_blur = should_blur
+        self.head_boxes = None
+        self.detection_id = None
+        self._boxes_ready = threading.Event()
+        self._id_ready = threading.Event()
+        self._post_ready = threading.Event()
+        self._timer = None
+
+    def set_head_boxes(self, boxes):
+        """
+        Args:
+            boxes: Lista ramek (x1, y1, x2, y2) znormalizowanych do 0..1 lub None jeśli anonimizacja się nie powiodła
+        """
+        self.head_boxes = boxes
+        self._boxes_ready.set()
+
+    def set_detection_id(self, detection_id):
+        self.detection_id = detection_id
+        self._id_ready.set()
+
+    def set_post_packets(self, packets):
+        self.post_packets = packets
+        self._post_ready.set()
+
+    def wait_post_packets(self, timeout):
+        return self._post_ready.wait(timeout)
+
+    def wait_head_boxes(self, timeout):
+        return self._boxes_ready.wait(timeout)
+
+    def wait_detection_id(self, timeout):
+        return self._id_ready.wait(timeout)
+
+
+class ClipRecorder(threading.Thread):
+    """
+    Wątek zapisujący krótkie klipy pre/post-event z FrameRingBuffer przez cv2.VideoWriter.
+
+    Anonimizacja klipu: ramki głów z klatki detekcji obowiązują tylko dla
+    klatek odległych od niej o najwyżej max_box_age sekund. Co redetect_interval
+    sekund klipu head_detector (AnonymizerWorker.detect_head_boxes) wykrywa
+    głowy ponownie na klatce z bufora. Każda klatka dostaje ramki z najbliższej
+    w czasie detekcji; jeśli żadna nie jest dość świeża (lub detekcja się nie
+    powiodła), cała klatka jest rozmywana. Gdy zamazywanie jest włączone,
+    a ramki z klatki detekcji nie są dostępne, klip nie jest zapisywany.
+    Liczba ponownych detekcji na klip ograniczona jest do max_redetections
+    (przy dłuższym klipie odstęp między nimi rośnie).
+
+    Klatki po zdarzeniu pobierane są z bufora przez osobny timer każdego
+    zlecenia dokładnie w chwili event_time + post_seconds, niezależnie od
+    wolnego kodowania i anonimizacji w wątku rekordera - zlecenie czekające
+    w kolejce za innymi nie traci klatek usuniętych już z bufora.
+    """
+
+    def __init__(self, ring_buffer, detection_writer=None, clips_dir=os.path.join('detections', 'clips'),
+                 pre_seconds=3.0, post_seconds=2.0, box_margin=0.5, wait_timeout=60.0,
+                 head_detector=None, redetect_interval=0.5, max_box_age=0.4, max_redetections=10):
+        super().__init__(daemon=True, name='clip-recorder')
+        self.ring_buffer = ring_buffer
+        self.detection_writer = detection_writer
+        self.clips_dir = clips_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.box_margin = box_margin
+        self.wait_timeout = wait_timeout
+        self.head_detector = head_detector
+        self.redetect_interval = redetect_interval
+        self.max_box_age = max_box_age
+        self.max_redetections = max_redetections
+        self.is_running = True
+
+        self._jobs = Queue()
+        self._stats_lock = threading.Lock()
+        self.clips_written = 0
+        self.clips_skipped = 0
+        self.bytes_written = 0
+        self.last_encode_ms = 0.0
+        self.redetections = 0
+        self.redetect_failures = 0
+        self.frames_fully_blurred = 0
+
+    @classmethod
+    def from_env(cls, detection_writer=None, clips_dir=os.path.join('detections', 'clips')):
+        """Tworzy rekorder (z buforem) lub zwraca None, jeśli CLIP_RECORDING_ENABLED jest wyłączone."""
+        if not _env_bool('CLIP_RECORDING_ENABLED'):
+            return None
+        pre_seconds = float(os.getenv('CLIP_PRE_SECONDS', '3'))
+        post_seconds = float(os.getenv('CLIP_POST_SECONDS', '2'))
+        ring_buffer = FrameRingBuffer(
+            max_seconds=max(pre_seconds, post_seconds) + 1.0,
+            fps=int(os.getenv('CLIP_FPS', '10')),
+            max_dimension=int(os.getenv('CLIP_MAX_DIMENSION', '640')),
+            max_bytes=int(os.getenv('CLIP_BUFFER_MAX_MB', '16')) * 1024 * 1024
+        )
+        return cls(ring_buffer, detection_writer=detection_writer, clips_dir=clips_dir,
+                   pre_seconds=pre_seconds, post_seconds=post_seconds,
+                   redetect_interval=float(os.getenv('CLIP_REDETECT_INTERVAL', '0.5')),
+                   max_box_age=float(os.getenv('CLIP_MAX_BOX_AGE', '0.4')),
+                   max_redetections=int(os.getenv('CLIP_MAX_REDETECTIONS', '10')))
+
+    def request_clip(self, image_filename, should_blur, event_time=None):
+        """
+        Zleca zapis klipu dla detekcji. Wywoływane z pętli kamery - tylko kopiuje referencje pakietów.
+
+        Returns:
+            ClipJob (ścieżka klipu względem katalogu detections w clip_job.clip_path)
+        """
+        event_time = event_time if event_time is not None else time.time()
+        stem = os.path.splitext(os.path.basename(image_filename))[0]
+        clip_path = os.path.join(os.path.basename(self.clips_dir), f'{stem}.mp4')
+        pre_packets = self.ring_buffer.snapshot(since=event_time - self.pre_seconds, until=event_time)
+        job = ClipJob(event_time, clip_path, pre_packets, should_blur)
+        delay = max(0.0, event_time + self.post_seconds - time.time())
+        job._timer = threading.Timer(delay, self._collect_post, args=(job,))
+        job._timer.daemon = True
+        job._timer.start()
+        self._jobs.put(job)
+        return job
+
+    def _collect_post(self, job):
+        """Pobiera z bufora klatki (event_time, event_time + post_seconds] (wywoływane przez timer zlecenia)."""
+        job.set_post_packets(self.ring_buffer.snapshot(since=job.event_time, until=job.event_time + self.post_seconds))
+
+    def _blur_boxes(self, frame, boxes):
+        h, w = frame.shape[:2]
+        for x1, y1, x2, y2 in boxes:
+            bw, bh = (x2 - x1) * self.box_margin, (y2 - y1) * self.box_margin
+            px1 = max(0, int((x1 - bw) * w))
+            py1 = max(0, int((y1 - bh) * h))
+            px2 = min(w, int((x2 + bw) * w))
+            py2 = min(h, int((y2 + bh) * h))
+            if px2 <= px1 or py2 <= py1:
+                continue
+            roi = frame[py1:py2, px1:px2]
+            frame[py1:py2, px1:px2] = cv2.GaussianBlur(roi, (51, 51), 30)
+        return frame
+
+    @staticmethod
+    def _blur_frame(frame):
+        """Rozmywa całą klatkę (pikselizacja), gdy nie ma aktualnych ramek głów."""
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, w // 32), max(1, h // 32)), interpolation=cv2.INTER_AREA)
+        return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    def _detect(self, packet, frame):
+        """
+        Ponowna detekcja głów na klatce klipu.
+
+        Returns:
+            Ramki znormalizowane do 0..1 lub None, jeśli detekcja się nie powiodła
+        """
+        h, w = frame.shape[:2]
+        os.makedirs(self.clips_dir, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix='.jpg', dir=self.clips_dir)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(packet)
+            boxes = self.head_detector(path, (w, h))
+        except Exception as e:
+            logger.warning(f"Head re-detection failed: {e}")
+            boxes = None
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._stats_lock:
+            self.redetections += 1
+            if boxes is None:
+                self.redetect_failures += 1
+        if boxes is None:
+            return None
+        return [(x1 / w, y1 / h, x2 / w, y2 / h) for x1, y1, x2, y2 in boxes]
+
+    def _anchors(self, job, packets):
+        """
+        Detekcje głów w czasie klipu: [(timestamp, ramki lub None)].
+
+        Pierwsza to klatka detekcji (ramki z AnonymizerWorker), kolejne - ponowne
+        detekcje co redetect_interval sekund (jeśli jest head_detector), najwyżej
+        max_redetections na klip.
+        """
+        anchors = [(job.event_time, job.head_boxes)]
+        if self.head_detector is None or not packets or self.max_redetections <= 0:
+            return anchors
+        span = packets[-1][0] - packets[0][0]
+        interval = max(self.redetect_interval, span / self.max_redetections)
+        last = None
+        for ts, packet in packets:
+            if len(anchors) > self.max_redetections:
+                break
+            if last is not None and ts - last < interval:
+                continue
+            if abs(ts - job.event_time) < interval / 2:
+                # Blisko klatki detekcji - wystarczą jej ramki
+                continue
+            frame = cv2.imdecode(np.frombuffer(packet, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            last = ts
+            anchors.append((ts, self._detect(packet, frame)))
+        return anchors
+
+    def _anonymize(self, frame, ts, anchors):
+        """Zamazuje głowy ramkami najbliższej w czasie detekcji lub całą klatkę, gdy ramki są nieaktualne."""
+        anchor_ts, boxes = min(anchors, key=lambda anchor: abs(anchor[0] - ts))
+        if boxes is None or abs(anchor_ts - ts) > self.max_box_age:
+            with self._stats_lock:
+                self.frames_fully_blurred += 1
+            return self._blur_frame(frame)
+        return self._blur_boxes(frame, boxes)
+
+    def _write_clip(self, job, packets):
+        output_path = os.path.join(os.path.dirname(self.clips_dir), job.clip_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = f'{os.path.splitext(output_path)[0]}.tmp.mp4'
+
+        anchors = self._anchors(job, packets) if job.should_blur else None
+        writer = None
+        try:
+            for ts, packet in packets:
+                frame = cv2.imdecode(np.frombuffer(packet, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                if anchors is not None:
+                    frame = self._anonymize(frame, ts, anchors)
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), self.ring_buffer.fps, (w, h))
+                    if not writer.isOpened():
+                        raise RuntimeError(f"Cannot open VideoWriter for {tmp_path}")
+                writer.write(frame)
+        finally:
+            if writer is not None:
+                writer.release()
+
+        if writer is None:
+            raise RuntimeError("No decodable frames for clip")
+        os.replace(tmp_path, output_path)
+        return os.path.getsize(output_path)
+
+    def _process(self, job):
+        if not job.wait_post_packets(self.post_seconds + self.wait_timeout):
+            logger.warning(f"Clip {job.clip_path} skipped: post-event frames not collected")
+            with self._stats_lock:
+                self.clips_skipped += 1
+            return
+        packets = job.pre_packets + job.post_packets
+        job.pre_packets = job.post_packets = None
+        if not packets:
+            logger.warning(f"Clip {job.clip_path} skipped: ring buffer is empty")
+            with self._stats_lock:
+                self.clips_skipped += 1
+            return
+
+        if job.should_blur:
+            if not job.wait_head_boxes(self.wait_timeout) or job.head_boxes is None:
+                logger.warning(f"Clip {job.clip_path} skipped: head boxes unavailable for anonymization")
+                with self._stats_lock:
+                    self.clips_skipped += 1
+                return
+
+        start = time.perf_counter()
+        size = self._write_clip(job, packets)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.clips_written += 1
+            self.bytes_written += size
+            self.last_encode_ms = round(elapsed * 1000, 2)
+        print(f"🎞️  Zapisano klip {job.clip_path} ({len(packets)} klatek, {size} B)")
+
+        if self.detection_writer is not None and job.wait_detection_id(self.wait_timeout) and job.detection_id:
+            self.detection_writer.set_clip_path(job.detection_id, job.clip_path)
+
+    def run(self):
+        while self.is_running:
+            try:
+                job = self._jobs.get(timeout=1)
+            except Empty:
+                continue
+            if job is None:
+                break
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.error(f"Error writing clip {job.clip_path}: {e}")
+                with self._stats_lock:
+                    self.clips_skipped += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = {
+                'clips_written': self.clips_written,
+                'clips_skipped': self.clips_skipped,
+                'bytes_written': self.bytes_written,
+                'last_encode_ms': self.last_encode_ms,
+                'redetections': self.redetections,
+                'redetect_failures': self.redetect_failures,
+                'frames_fully_blurred': self.frames_fully_blurred,
+                'pending_jobs': self._jobs.qsize(),
+            }
+        stats['buffer'] = self.ring_buffer.get_stats()
+        return stats
+
+    def stop(self):
+        self.is_running = False
+        self._jobs.put(None)
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from models import db, Detection
+
+
+def day_range_utc(day):
+    """
+    Zakres [początek, koniec) dnia kalendarzowego (czas lokalny) w UTC.
+
+    Detection.timestamp zapisywany jest w UTC, więc dzień to ograniczony zakres
+    timestampów - zapytanie może użyć indeksu zamiast liczyć date() dla każdego wiersza.
+    """
+    midnight = datetime.combine(day, datetime.min.time())
+    start = datetime.utcfromtimestamp(midnight.timestamp())
+    end = datetime.utcfromtimestamp((midnight + timedelta(days=1)).timestamp())
+    return start, end
+
+
+def today_range_utc(now=None):
+    """Zakres [początek, koniec) dzisiejszego dnia (czas lokalny) w UTC."""
+    return day_range_utc((now or datetime.now()).date())
+
+
+def day_ranges_utc(days, now=None):
+    """Ostatnie days dni (łącznie z dzisiejszym): lista (data lokalna, początek UTC, koniec UTC)."""
+    today = (now or datetime.now()).date()
+    return [
+        (day, *day_range_utc(day))
+        for day in (today - timedelta(days=offset) for offset in range(days - 1, -1, -1))
+    ]
+
+
+def totals_query(today_start, today_end):
+    """
+    COUNT wszystkich detekcji, COUNT z zakresu "dziś" i maksymalne id - jedno zapytanie.
+
+    Osobne podzapytania: COUNT bez WHERE może użyć zoptymalizowanego liczenia,
+    a "dziś" to przeszukanie zakresu indeksu timestamp.
+    """
+    return select(
+        select(func.count()).select_from(Detection).scalar_subquery(),
+        select(func.count()).select_from(Detection).where(
+            Detection.timestamp >= today_start, Detection.timestamp < today_end
+        ).scalar_subquery(),
+        select(func.max(Detection.id)).scalar_subquery()
+    )
+
+
+def recent_query(limit):
+    """Ostatnie detekcje (tylko kolumny, bez obiektów ORM) - odczyt z końca indeksu timestamp."""
+    return (
+        select(Detection.id, Detection.timestamp, Detection.location, Detection.confidence,
+               Detection.image_path, Detection.status)
+        .order_by(Detection.timestamp.desc(), Detection.id.desc())
+        .limit(limit)
+    )
+
+
+def per_day_query(days):
+    """Liczba detekcji na dzień: jeden skan zakresu indeksu, każdy dzień to półotwarty zakres [początek, koniec)."""
+    return select(*[
+        func.count(Detection.id).filter(Detection.timestamp >= start, Detection.timestamp < end)
+        for _, start, end in days
+    ]).where(Detection.timestamp >= days[0][1], Detection.timestamp < days[-1][2])
+
+
+def detections_per_day(days=7):
+    """
+    Liczba detekcji w ostatnich days dniach (czas lokalny), łącznie z dniami bez detekcji.
+
+    Returns:
+        Lista {'name': 'YYYY-MM-DD', 'count': n}
+    """
+    ranges = day_ranges_utc(days)
+    counts = db.session.execute(per_day_query(ranges)).one()
+    return [{'name': str(day), 'count': int(count)} for (day, _, _), count in zip(ranges, counts)]
+
+
+def detection_item(record):
+    """Rekord detekcji (dict lub mapping) -> słownik JSON jak w recent_detections."""
+    return {
+        'id': record['id'],
+        'timestamp': record['timestamp'].isoformat(),
+        'location': record['location'],
+        'confidence': record['confidence'],
+        'image_path': os.path.basename(record['image_path']) if record['image_path'] else None,
+        'status': record['status'],
+    }
+
+
+class DashboardStats:
+    """
+    Cache statystyk dashboardu (liczba wszystkich detekcji, dzisiejszych i ostatnie detekcje).
+
+    Stan ładowany jest agregatami SQL (COUNT, zakres timestampów dla "dziś"),
+    a potem aktualizowany przyrostowo przez słuchacza commitów DetectionWriter.
+    Usunięcie detekcji (invalidate), zmiana dnia lub upływ ttl wymusza ponowne
+    załadowanie z bazy. Commity w trakcie ładowania trafiają do każdego
+    trwającego odświeżenia; wynik odświeżenia sprzed invalidate lub starszego
+    niż już zapisane nie nadpisuje cache.
+    """
+
+    def __init__(self, ttl=300.0, recent_limit=5):
+        self.ttl = ttl
+        self.recent_limit = recent_limit
+
+        self._lock = threading.Lock()
+        self._state = None
+        self._refreshing = {}
+        self._refresh_seq = 0
+        self._stored_seq = 0
+        self._generation = 0
+
+        self.loads = 0
+        self.hits = 0
+        self.incremental_updates = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(ttl=float(os.getenv('DASHBOARD_STATS_TTL', '300')))
+
+    def invalidate(self):
+        """Unieważnia cache (np. po usunięciu detekcji)."""
+        with self._lock:
+            self._state = None
+            self._generation += 1
+
+    def on_commit(self, committed):
+        """Słuchacz commitów DetectionWriter - dolicza nowe detekcje bez zapytania do bazy."""
+        if not committed:
+            return
+        with self._lock:
+            for pending in self._refreshing.values():
+                pending.extend(committed)
+            if self._state is not None:
+                self._apply(self._state, committed)
+
+    def _apply(self, state, committed):
+        new = [record for record in committed if record['id'] > state['max_id']]
+        if not new:
+            return
+        today_start, today_end = state['today']
+        state['total'] += len(new)
+        state['today_count'] += sum(1 for record in new if today_start <= record['timestamp'] < today_end)
+        state['max_id'] = max(record['id'] for record in new)
+        recent = state['recent'] + [detection_item(record) for record in new]
+        recent.sort(key=lambda item: (item['timestamp'], item['id']), reverse=True)
+        state['recent'] = recent[:self.recent_limit]
+        self.incremental_updates += len(new)
+
+    def _load(self):
+        today_start, today_end = today_range_utc()
+        total, today_count, max_id = db.session.execute(totals_query(today_start, today_end)).one()
+        rows = db.session.execute(recent_query(self.recent_limit)).mappings().all()
+        return {
+            'total': total,
+            'today_count': today_count,
+            'today': (today_start, today_end),
+            'max_id': max_id or 0,
+            'recent': [detection_item(row) for row in rows],
+            'loaded_at': time.monotonic(),
+        }
+
+    def get(self):
+        """
+        Zwraca statystyki (wymaga kontekstu aplikacji przy ładowaniu z bazy).
+
+        Returns:
+            {'total_detections', 'today_detections', 'recent_detections'}
+        """
+        with self._lock:
+            state = self._state
+            fresh = (
+                state is not None
+                and time.monotonic() - state['loaded_at'] < self.ttl
+                and datetime.utcnow() < state['today'][1]
+            )
+            if fresh:
+                self.hits += 1
+                return self._snapshot(state)
+            self._refresh_seq += 1
+            seq = self._refresh_seq
+            self._refreshing[seq] = []
+            generation = self._generation
+
+        try:
+            state = self._load()
+        except Exception:
+            with self._lock:
+                self._refreshing.pop(seq, None)
+            raise
+
+        with self._lock:
+            self._apply(state, self._refreshing.pop(seq))
+            if generation == self._generation and seq > self._stored_seq:
+                self._state = state
+                self._stored_seq = seq
+            self.loads += 1
+            return self._snapshot(state)
+
+    def peek(self):
+        """Statystyki z cache bez odczytu z bazy (None, jeśli cache jest pusty lub nieaktualny)."""
+        with self._lock:
+            state = self._state
+            if state is None or self._refreshing or datetime.utcnow() >= state['today'][1]:
+                return None
+            return self._snapshot(state)
+
+    @staticmethod
+    def _snapshot(state):
+        return {
+            'total_detections': state['total'],
+            'today_detections': state['today_count'],
+            'recent_detections': list(state['recent']),
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'cached': self._state is not None,
+                'loads': self.loads,
+                'hits': self.hits,
+                'incremental_updates': self.incremental_updates,
+                'ttl_s': self.ttl,
+            }
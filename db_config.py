@@ -0,0 +1,182 @@
+"""
+Konfiguracja połączenia z bazą danych (SQLite lub PostgreSQL).
+
+SQLite: każde nowe połączenie dostaje PRAGMA journal_mode=WAL (czytelnicy nie
+blokują zapisu i odwrotnie), busy_timeout (zapis czeka na blokadę zamiast
+od razu zgłaszać "database is locked") i synchronous=NORMAL (w trybie WAL
+bezpieczne przy awarii procesu, bez fsync przy każdym commicie).
+
+PostgreSQL: pula połączeń o stałym rozmiarze z pre-ping (zerwane połączenia
+wymieniane są przed użyciem), recyklingiem i limitem czasu zapytania
+(statement_timeout ustawiany przy połączeniu). Wymaga sterownika, np.
+pip install psycopg2-binary.
+"""
+import logging
+import os
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def normalize_uri(uri):
+    """postgres:// (np. z Heroku/Render) -> postgresql:// wymagane przez SQLAlchemy 2."""
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+class DatabaseConfig:
+    """
+    Opcje silnika SQLAlchemy i ustawienia połączeń dla Flask-SQLAlchemy.
+
+    Użycie zamiast ręcznego SQLALCHEMY_DATABASE_URI + db.init_app(app):
+        DatabaseConfig.from_env().init_app(app, db)
+    """
+
+    def __init__(self, uri='sqlite:///admin.db', busy_timeout_ms=5000, synchronous='NORMAL', wal=True,
+                 pool_size=10, max_overflow=10, pool_timeout=30, pool_recycle=1800, statement_timeout_ms=30000):
+        self.uri = normalize_uri(uri)
+        self.url = make_url(self.uri)
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.synchronous = synchronous.strip().upper()
+        if self.synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid SQLite synchronous mode: {synchronous!r} (allowed: {', '.join(SYNCHRONOUS_MODES)})")
+        self.wal = wal
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.statement_timeout_ms = statement_timeout_ms
+
+        self._lock = threading.Lock()
+        self._engine = None
+        self.connections = 0
+        self.journal_mode = None
+
+    @classmethod
+    def from_env(cls, uri=None):
+        return cls(
+            uri=uri or os.getenv('DATABASE_URI', 'sqlite:///admin.db'),
+            busy_timeout_ms=int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000')),
+            synchronous=os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL'),
+            wal=_env_bool('DB_SQLITE_WAL', True),
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            statement_timeout_ms=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+        )
+
+    @property
+    def dialect(self):
+        return self.url.get_backend_name()
+
+    def is_memory(self):
+        database = self.url.database
+        return self.dialect == 'sqlite' and (
+            not database or database == ':memory:' or self.url.query.get('mode') == 'memory'
+        )
+
+    def engine_options(self):
+        """
+        Opcje dla create_engine / SQLALCHEMY_ENGINE_OPTIONS.
+
+        Returns:
+            Słownik opcji silnika (pula i connect_args zależne od bazy)
+        """
+        if self.dialect == 'sqlite':
+            # Domyślna pula SQLite (QueuePool dla pliku, StaticPool dla :memory:) - pragmy w on_connect
+            return {}
+
+        options = {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            'pool_pre_ping': True,
+        }
+        if self.dialect == 'postgresql':
+            connect_args = {'connect_timeout': 10, 'application_name': 'phone-detector'}
+            if self.statement_timeout_ms:
+                connect_args['options'] = f'-c statement_timeout={int(self.statement_timeout_ms)}'
+            options['connect_args'] = connect_args
+        return options
+
+    def on_connect(self, dbapi_connection, connection_record):
+        """Nowe połączenie DB-API (zdarzenie 'connect' silnika) - dla SQLite ustawia pragmy."""
+        journal_mode = None
+        if self.dialect == 'sqlite':
+            cursor = dbapi_connection.cursor()
+            try:
+                if self.wal and not self.is_memory():
+                    cursor.execute('PRAGMA journal_mode=WAL')
+                else:
+                    cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+                cursor.execute(f'PRAGMA synchronous={self.synchronous}')
+            finally:
+                cursor.close()
+        with self._lock:
+            if journal_mode is not None:
+                if self.wal and journal_mode != 'wal' and not self.is_memory() and self.journal_mode != journal_mode:
+                    logger.warning(f"SQLite journal_mode is {journal_mode!r}, WAL not enabled")
+                self.journal_mode = journal_mode
+            self.connections += 1
+
+    def attach(self, engine):
+        """Rejestruje obsługę nowych połączeń na silniku (pragmy SQLite, licznik połączeń)."""
+        event.listen(engine, 'connect', self.on_connect)
+        self._engine = engine
+        return engine
+
+    def init_app(self, app, db):
+        """
+        Ustawia URI i opcje silnika w konfiguracji aplikacji i inicjalizuje db.
+
+        Args:
+            app: Aplikacja Flask
+            db: Instancja Flask-SQLAlchemy
+        """
+        app.config['SQLALCHEMY_DATABASE_URI'] = self.uri
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = self.engine_options()
+        app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+        db.init_app(app)
+        # Flask-SQLAlchemy tworzy silnik w init_app, ale połączenia dopiero przy pierwszym zapytaniu
+        with app.app_context():
+            self.attach(db.engine)
+
+    def get_stats(self):
+        engine = self._engine
+        with self._lock:
+            stats = {
+                'dialect': self.dialect,
+                'url': self.url.render_as_string(hide_password=True),
+                'connections': self.connections,
+                'pool': engine.pool.status() if engine is not None else None,
+            }
+            if self.dialect == 'sqlite':
+                stats.update({
+                    'journal_mode': self.journal_mode,
+                    'synchronous': self.synchronous,
+                    'busy_timeout_ms': self.busy_timeout_ms,
+                })
+            else:
+                stats.update({
+                    'pool_size': self.pool_size,
+                    'max_overflow': self.max_overflow,
+                    'statement_timeout_ms': self.statement_timeout_ms,
+                })
+            return stats
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+
+import cv2
+import numpy as np
+
+
+class DetectionArtifact:
+    """
+    Zakodowany obraz detekcji tworzony raz i przekazywany do wszystkich ujść
+    (dysk, Cloudinary, SMTP, API).
+
+    Przechowuje bajty obrazu, zmniejszony podgląd JPEG oraz skrót SHA-256
+    treści, dzięki czemu żadne ujście nie musi ponownie czytać pliku z dysku
+    ani kodować klatki.
+    """
+
+    def __init__(self, filename, data, mimetype, preview=None, width=None, height=None):
+        self.filename = filename
+        self.data = data
+        self.mimetype = mimetype
+        self.preview = preview
+        self.width = width
+        self.height = height
+        self.sha256 = hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def _encode_preview(frame, max_dimension, quality):
+        h, w = frame.shape[:2]
+        longest = max(h, w)
+        if longest > max_dimension:
+            scale = max_dimension / float(longest)
+            frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if success else None
+
+    @classmethod
+    def from_frame(cls, frame, filename, image_writer, preview_max_dimension=480, preview_quality=70):
+        """
+        Koduje klatkę jeden raz (format i jakość z ImageWriter) i buduje podgląd.
+
+        Args:
+            frame: numpy array (BGR image)
+            filename: Nazwa pliku w katalogu detections
+            image_writer: Instancja ImageWriter określająca format zapisu
+        """
+        data = image_writer.encode(frame)
+        preview = cls._encode_preview(frame, preview_max_dimension, preview_quality)
+        h, w = frame.shape[:2]
+        return cls(filename, data, image_writer.mimetype, preview=preview, width=w, height=h)
+
+    @classmethod
+    def from_encoded(cls, filename, data, mimetype, frame=None, preview_max_dimension=480, preview_quality=70):
+        """Buduje artefakt z już zakodowanych bajtów (bez ponownego kodowania obrazu)."""
+        preview = None
+        width = height = None
+        if frame is not None:
+            preview = cls._encode_preview(frame, preview_max_dimension, preview_quality)
+            height, width = frame.shape[:2]
+        return cls(filename, data, mimetype, preview=preview, width=width, height=height)
+
+    def ensure_preview(self, preview_max_dimension=480, preview_quality=70):
+        """
+        Podgląd artefaktu; jeśli go brak (artefakt odtworzony z pliku po restarcie),
+        dekoduje zapisane bajty i tworzy go raz.
+
+        Returns:
+            Bajty JPEG podglądu lub None, jeśli obrazu nie da się zdekodować
+        """
+        if self.preview is None:
+            frame = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return None
+            self.height, self.width = frame.shape[:2]
+            self.preview = self._encode_preview(frame, preview_max_dimension, preview_quality)
+        return self.preview
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def subtype(self):
+        return self.mimetype.split('/', 1)[-1]
+
+    @property
+    def stem(self):
+        return os.path.splitext(self.filename)[0]
+
+    def as_file(self):
+        """Zwraca obiekt plikopodobny (BytesIO z atrybutem name) dla bibliotek wymagających pliku."""
+        buffer = io.BytesIO(self.data)
+        buffer.name = self.filename
+        return buffer
+
+    def write_to(self, filepath, image_writer=None):
+        """Zapisuje bajty artefaktu na dysk (przez ImageWriter, aby liczyć statystyki zapisu)."""
+        if image_writer is not None:
+            return image_writer.write_bytes(self.data, filepath)
+        tmp_path = f'{filepath}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.data)
+        os.replace(tmp_path, filepath)
+        return len(self.data)
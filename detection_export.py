@@ -0,0 +1,239 @@
+"""
+Strumieniowy eksport detekcji (NDJSON, CSV, ZIP z obrazami).
+
+Wiersze czytane są partiami po indeksie (timestamp, id) - każda partia to
+osobne krótkie zapytanie, więc eksport milionów detekcji nie trzyma
+transakcji odczytu przez cały czas i zużywa stałą ilość pamięci. Formaty
+zwracają generatory fragmentów bajtów (odpowiedź HTTP lub plik).
+ZIP budowany jest w locie: pliki JPEG dopisywane są bez kompresji
+(są już skompresowane) i bez bufora całego archiwum.
+
+Eksport z linii poleceń:
+    python detection_export.py --format csv [--from 2026-01-01] [--to 2026-02-01] [--location "ławka 1"] [-o plik]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+
+from models import Detection
+from detection_query import parse_fields, parse_filters, serialize_row
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'zip': ('application/zip', 'zip'),
+}
+
+COPY_CHUNK = 64 * 1024
+
+
+def iter_detections(session, where=(), columns=None, chunk=1000):
+    """
+    Detekcje od najstarszych, partiami po chunk wierszy (keyset po (timestamp, id)).
+
+    Args:
+        session: Sesja SQLAlchemy
+        where: Warunki filtrowania (parse_filters)
+        columns: Kolumny do pobrania (parse_fields); id i timestamp dokładane do klucza
+        chunk: Rozmiar partii
+
+    Yields:
+        Listy słowników w formacie /api/detections (tylko żądane kolumny)
+    """
+    columns = list(columns or parse_fields(None))
+    keys = [column.key for column in columns]
+    selected = list(columns)
+    for key_column in (Detection.id, Detection.timestamp):
+        if not any(column is key_column for column in selected):
+            selected.append(key_column)
+    statement = select(*selected).where(*where).order_by(Detection.timestamp, Detection.id).limit(chunk)
+
+    position = None
+    while True:
+        page = statement if position is None else statement.where(
+            tuple_(Detection.timestamp, Detection.id) > tuple_(*position)
+        )
+        rows = session.execute(page).mappings().all()
+        # Koniec transakcji między partiami - eksport nie blokuje zapisu detekcji
+        session.commit()
+        if not rows:
+            return
+        position = (rows[-1]['timestamp'], rows[-1]['id'])
+        yield [serialize_row({key: row[key] for key in keys}) for row in rows]
+        if len(rows) < chunk:
+            return
+
+
+def ndjson_stream(batches):
+    """Fragmenty NDJSON (jeden obiekt JSON na linię, fragment na partię)."""
+    for batch in batches:
+        yield ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in batch).encode('utf-8')
+
+
+def csv_stream(batches, fieldnames):
+    """Fragmenty CSV z nagłówkiem (UTF-8 z BOM, żeby Excel poprawnie pokazał polskie znaki)."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _StreamSink(io.RawIOBase):
+    """Nieprzeszukiwalny strumień dla zipfile - zebrane bajty odbiera generator (drain)."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(session, where, columns, images_dir, chunk=1000):
+    """
+    Archiwum ZIP w locie: images/<plik> dla każdej detekcji z obrazem oraz detections.ndjson.
+
+    Obrazy czytane są kawałkami po COPY_CHUNK bajtów, a gotowe fragmenty
+    archiwum oddawane od razu - pamięć nie zależy od liczby ani rozmiaru plików.
+    Brakujące pliki (np. usunięte przez retencję) są pomijane.
+    """
+    sink = _StreamSink()
+    archive = zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True)
+    image_columns = [Detection.timestamp, Detection.image_path]
+    written = set()
+    for batch in iter_detections(session, where, image_columns, chunk):
+        for item in batch:
+            if not item.get('image_path') or item['image_path'] in written:
+                continue
+            written.add(item['image_path'])
+            path = os.path.join(images_dir, item['image_path'])
+            try:
+                size = os.path.getsize(path)
+                source = open(path, 'rb')
+            except OSError:
+                continue
+            info = zipfile.ZipInfo(f"images/{item['image_path']}",
+                                   date_time=datetime.fromisoformat(item['timestamp']).timetuple()[:6])
+            info.file_size = size
+            with source, archive.open(info, mode='w') as target:
+                while True:
+                    data = source.read(COPY_CHUNK)
+                    if not data:
+                        break
+                    target.write(data)
+                    yield sink.drain()
+            yield sink.drain()
+
+    info = zipfile.ZipInfo('detections.ndjson', date_time=datetime.now().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    with archive.open(info, mode='w', force_zip64=True) as target:
+        for data in ndjson_stream(iter_detections(session, where, columns, chunk)):
+            target.write(data)
+            yield sink.drain()
+    archive.close()
+    yield sink.drain()
+
+
+def export_stream(session, export_format, args, images_dir='detections', chunk=1000):
+    """
+    Generator eksportu dla parametrów zapytania.
+
+    Args:
+        session: Sesja SQLAlchemy
+        export_format: 'ndjson', 'csv' lub 'zip'
+        args: Parametry (from, to, location, min_confidence, status, fields) jak w /api/detections
+        images_dir: Katalog obrazów detekcji (dla zip)
+
+    Returns:
+        Generator fragmentów bajtów
+
+    Raises:
+        ValueError: Jeśli format lub parametr jest niepoprawny
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format: {export_format!r} (allowed: {', '.join(EXPORT_FORMATS)})")
+    where = parse_filters(args)
+    columns = parse_fields(args.get('fields'))
+    if export_format == 'zip':
+        return zip_stream(session, where, columns, images_dir, chunk)
+    batches = iter_detections(session, where, columns, chunk)
+    if export_format == 'csv':
+        return csv_stream(batches, [column.key for column in columns])
+    return ndjson_stream(batches)
+
+
+def export_filename(export_format):
+    return f"detections-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{EXPORT_FORMATS[export_format][1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Eksport detekcji (NDJSON, CSV, ZIP z obrazami)')
+    parser.add_argument('--format', default='ndjson', choices=list(EXPORT_FORMATS))
+    parser.add_argument('--from', dest='from_', help='początek zakresu (ISO, czas lokalny)')
+    parser.add_argument('--to', help='koniec zakresu (ISO; sama data obejmuje cały dzień)')
+    parser.add_argument('--location', help='strefy, po przecinku')
+    parser.add_argument('--status', help='statusy, po przecinku')
+    parser.add_argument('--min-confidence', dest='min_confidence')
+    parser.add_argument('--fields', help='kolumny, po przecinku')
+    parser.add_argument('--images-dir', help='katalog obrazów (domyślnie DETECTION_MEDIA_ROOT)')
+    parser.add_argument('-o', '--output', help='plik wynikowy (domyślnie stdout)')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from flask import Flask
+    from db_config import DatabaseConfig
+    from models import db
+    from storage_manager import get_media_root
+
+    load_dotenv()
+    args.images_dir = args.images_dir or get_media_root()
+    app = Flask(__name__)
+    DatabaseConfig.from_env().init_app(app, db)
+
+    filters = {key: value for key, value in (
+        ('from', args.from_), ('to', args.to), ('location', args.location), ('status', args.status),
+        ('min_confidence', args.min_confidence), ('fields', args.fields),
+    ) if value}
+    with app.app_context():
+        try:
+            stream = export_stream(db.session, args.format, filters, args.images_dir)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        written = 0
+        try:
+            for data in stream:
+                output.write(data)
+                written += len(data)
+        finally:
+            if args.output:
+                output.close()
+    if args.output:
+        print(f"✅ Zapisano {written / 1024 ** 2:.1f} MB do {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
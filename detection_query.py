@@ -0,0 +1,270 @@
+import base64
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func, select, tuple_
+
+from models import Detection
+
+# Kolumny zwracane przez /api/detections (kolejność = kolejność w odpowiedzi)
+DETECTION_COLUMNS = {
+    'id': Detection.id,
+    'timestamp': Detection.timestamp,
+    'location': Detection.location,
+    'confidence': Detection.confidence,
+    'image_path': Detection.image_path,
+    'clip_path': Detection.clip_path,
+    'status': Detection.status,
+}
+
+# Limit liczenia przy include_total z filtrami (COUNT przerywany po tylu wierszach)
+TOTAL_COUNT_CAP = 10000
+
+DIRECTION_NEXT = 'next'
+DIRECTION_PREV = 'prev'
+
+
+def encode_cursor(timestamp, detection_id, direction):
+    """Nieprzezroczysty kursor: pozycja (timestamp, id) i kierunek przewijania."""
+    payload = json.dumps({'t': timestamp.isoformat(), 'i': detection_id, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Dekoduje kursor z encode_cursor.
+
+    Returns:
+        (timestamp, id, kierunek)
+
+    Raises:
+        ValueError: Jeśli kursor jest niepoprawny
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        direction = payload['d']
+        if direction not in (DIRECTION_NEXT, DIRECTION_PREV):
+            raise ValueError(direction)
+        return datetime.fromisoformat(payload['t']), int(payload['i']), direction
+    except (ValueError, KeyError, TypeError, UnicodeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def parse_bound(value, name, end=False):
+    """
+    Granica zakresu dat -> naiwny datetime UTC (jak Detection.timestamp).
+
+    Data bez godziny jako koniec zakresu obejmuje cały dzień (koniec to następna północ);
+    czas bez strefy traktowany jest jako lokalny.
+    """
+    try:
+        if len(value) == 10:
+            moment = datetime.combine(date.fromisoformat(value), datetime.min.time())
+            if end:
+                moment += timedelta(days=1)
+        else:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' date: {value!r}")
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_filters(args):
+    """
+    Filtry listy detekcji z parametrów zapytania.
+
+    Args:
+        args: Parametry (request.args): from, to (ISO; zakres półotwarty [from, to)),
+              location (lista po przecinku), min_confidence, status (lista po przecinku)
+
+    Returns:
+        Lista warunków SQLAlchemy (zgodnych z indeksami timestamp, (location, timestamp), status)
+
+    Raises:
+        ValueError: Jeśli parametr jest niepoprawny
+    """
+    where = []
+    if args.get('from'):
+        where.append(Detection.timestamp >= parse_bound(args['from'], 'from'))
+    if args.get('to'):
+        where.append(Detection.timestamp < parse_bound(args['to'], 'to', end=True))
+
+    locations = _split(args.get('location'))
+    if len(locations) == 1:
+        where.append(Detection.location == locations[0])
+    elif locations:
+        where.append(Detection.location.in_(locations))
+
+    if args.get('min_confidence'):
+        try:
+            min_confidence = float(args['min_confidence'])
+        except ValueError:
+            raise ValueError(f"Invalid 'min_confidence': {args['min_confidence']!r}")
+        where.append(Detection.confidence >= min_confidence)
+
+    statuses = _split(args.get('status'))
+    if len(statuses) == 1:
+        where.append(Detection.status == statuses[0])
+    elif statuses:
+        where.append(Detection.status.in_(statuses))
+    return where
+
+
+def parse_fields(value):
+    """
+    Projekcja kolumn (fields=id,timestamp,...). Brak parametru = wszystkie kolumny.
+
+    Raises:
+        ValueError: Jeśli pole nie istnieje
+    """
+    names = _split(value)
+    if not names:
+        return list(DETECTION_COLUMNS.values())
+    unknown = [name for name in names if name not in DETECTION_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(DETECTION_COLUMNS)})")
+    return [DETECTION_COLUMNS[name] for name in DETECTION_COLUMNS if name in names]
+
+
+def count_capped(session, where, cap=TOTAL_COUNT_CAP):
+    """
+    Liczba detekcji spełniających filtry, najwyżej cap (liczenie kończy się po cap wierszach).
+
+    Returns:
+        (liczba, czy_obcięta)
+    """
+    limited = select(Detection.id).where(*where).limit(cap + 1).subquery()
+    count = session.execute(select(func.count()).select_from(limited)).scalar_one()
+    return min(count, cap), count > cap
+
+
+def estimate_total(session, where, cached_total, cap=TOTAL_COUNT_CAP):
+    """
+    Liczba detekcji dla include_total.
+
+    Bez filtrów - wartość z cache (cached_total(), np. DashboardStats), bez COUNT(*)
+    przy każdej stronie; z filtrami - count_capped po indeksie.
+
+    Returns:
+        {'total_approx': liczba[, 'total_capped': czy_obcięta]}
+    """
+    if where:
+        total, capped = count_capped(session, where, cap)
+        return {'total_approx': total, 'total_capped': capped}
+    return {'total_approx': cached_total()}
+
+
+def serialize_row(row):
+    """Wiersz zapytania (mapping) -> słownik JSON w formacie /api/detections."""
+    item = dict(row)
+    if item.get('timestamp') is not None:
+        item['timestamp'] = item['timestamp'].isoformat()
+    if item.get('image_path'):
+        item['image_path'] = os.path.basename(item['image_path'])
+    return item
+
+
+def parse_page(args, max_per_page=100):
+    """
+    Numer i rozmiar strony (page, per_page) dla stronicowania z OFFSET.
+
+    Returns:
+        (page, per_page) - per_page obcięte do max_per_page
+
+    Raises:
+        ValueError: Jeśli parametr nie jest dodatnią liczbą całkowitą
+    """
+    values = []
+    for name, default in (('page', 1), ('per_page', 20)):
+        value = args.get(name)
+        try:
+            number = int(value) if value not in (None, '') else default
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise ValueError(f"Invalid '{name}': {value!r}")
+        values.append(number)
+    return values[0], min(values[1], max_per_page)
+
+
+def offset_page(session, columns, page, per_page, where=()):
+    """
+    Strona detekcji od najnowszych (stronicowanie z OFFSET, dla klientów bez kursora).
+
+    Pobiera tylko żądane kolumny (bez ładowania całych obiektów Detection).
+
+    Args:
+        session: Sesja Flask-SQLAlchemy (db.session - zapytanie z paginate())
+        columns: Kolumny do pobrania (parse_fields)
+        page: Numer strony (od 1)
+        per_page: Liczba detekcji na stronę
+        where: Warunki filtrowania (parse_filters)
+
+    Returns:
+        (wiersze jako mappingi, obiekt Pagination)
+    """
+    pagination = session.query(*columns).filter(*where).order_by(
+        Detection.timestamp.desc(), Detection.id.desc()
+    ).paginate(page=page, per_page=per_page, error_out=False)
+    return [row._mapping for row in pagination.items], pagination
+
+
+def keyset_page(session, columns, limit, cursor=None, where=()):
+    """
+    Strona detekcji od najnowszych, stronicowana po (timestamp, id) bez OFFSET.
+
+    Każda strona to przeszukanie indeksu timestamp od pozycji kursora, więc
+    strona sprzed miesięcy kosztuje tyle samo co pierwsza.
+
+    Args:
+        session: Sesja SQLAlchemy
+        columns: Kolumny do pobrania (id i timestamp są dokładane, jeśli ich brak)
+        limit: Liczba detekcji na stronę
+        cursor: Kursor z poprzedniej odpowiedzi (next_cursor / prev_cursor) lub None dla pierwszej strony
+        where: Dodatkowe warunki filtrowania
+
+    Returns:
+        (wiersze, next_cursor, prev_cursor) - wiersze jako mappingi, kursory None, gdy brak strony
+    """
+    selected = list(columns)
+    for key_column in (Detection.id, Detection.timestamp):
+        if not any(column is key_column for column in selected):
+            selected.append(key_column)
+    position = tuple_(Detection.timestamp, Detection.id)
+    statement = select(*selected).where(*where)
+
+    direction = DIRECTION_NEXT
+    if cursor:
+        timestamp, detection_id, direction = decode_cursor(cursor)
+        if direction == DIRECTION_NEXT:
+            statement = statement.where(position < tuple_(timestamp, detection_id))
+        else:
+            statement = statement.where(position > tuple_(timestamp, detection_id))
+
+    if direction == DIRECTION_NEXT:
+        statement = statement.order_by(Detection.timestamp.desc(), Detection.id.desc())
+    else:
+        statement = statement.order_by(Detection.timestamp.asc(), Detection.id.asc())
+
+    rows = session.execute(statement.limit(limit + 1)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == DIRECTION_PREV:
+        rows.reverse()
+
+    if not rows:
+        return [], None, None
+    first, last = rows[0], rows[-1]
+    has_older = has_more if direction == DIRECTION_NEXT else True
+    has_newer = bool(cursor) if direction == DIRECTION_NEXT else has_more
+    next_cursor = encode_cursor(last['timestamp'], last['id'], DIRECTION_NEXT) if has_older else None
+    prev_cursor = encode_cursor(first['timestamp'], first['id'], DIRECTION_PREV) if has_newer else None
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,337 @@
+"""
+Godzinowe agregaty detekcji (DetectionRollup).
+
+Wiersz na (kamera, strefa, godzina UTC): liczba detekcji, suma i maksimum
+pewności. DetectionWriter dolicza nowe detekcje w tej samej transakcji co
+INSERT, usuwanie detekcji odejmuje je z agregatów, a rebuild przelicza
+zakres od nowa z tabeli detection (backfill, naprawa po ręcznych zmianach).
+Zapytania o dowolny zakres (godzina, dzień, tydzień, miesiąc) czytają tylko
+agregaty - najwyżej 24 wiersze na strefę i dzień zamiast wszystkich detekcji.
+
+Przebudowa z linii poleceń:
+    python detection_rollup.py --rebuild [--from 2026-01-01] [--to 2026-02-01]
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, case, delete, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Detection, DetectionRollup
+from detection_query import parse_bound
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+# Limit punktów serii zwracanych przez query_series (np. granularity=hour dla kilku lat)
+MAX_BUCKETS = 5000
+
+_UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def hour_start(moment):
+    """Początek godziny (naiwny datetime UTC)."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_key(record):
+    """Klucz agregatu (kamera, strefa, godzina) dla rekordu detekcji."""
+    return record.get('camera') or '', record.get('location') or '', hour_start(record['timestamp'])
+
+
+def aggregate(records):
+    """
+    Grupuje detekcje po kluczu agregatu.
+
+    Args:
+        records: Rekordy (dict lub mapping) z kluczami camera, location, timestamp, confidence
+
+    Returns:
+        {(kamera, strefa, godzina): [liczba, suma pewności, maksimum pewności]}
+    """
+    totals = {}
+    for record in records:
+        confidence = record.get('confidence')
+        entry = totals.setdefault(rollup_key(record), [0, 0.0, None])
+        entry[0] += 1
+        if confidence is not None:
+            entry[1] += confidence
+            entry[2] = confidence if entry[2] is None else max(entry[2], confidence)
+    return totals
+
+
+def _rows(totals):
+    return [
+        {'camera': camera, 'zone': zone, 'hour': hour, 'count': count,
+         'confidence_sum': confidence_sum, 'confidence_max': confidence_max}
+        for (camera, zone, hour), (count, confidence_sum, confidence_max) in totals.items()
+    ]
+
+
+def apply_increments(session, totals):
+    """
+    Dolicza zagregowane detekcje do tabeli agregatów (w bieżącej transakcji sesji).
+
+    SQLite i PostgreSQL: jeden INSERT ... ON CONFLICT DO UPDATE; inne bazy:
+    odczyt istniejących kluczy i osobne INSERT/UPDATE.
+
+    Args:
+        session: Sesja SQLAlchemy
+        totals: Wynik aggregate()
+    """
+    rows = _rows(totals)
+    if not rows:
+        return
+    dialect_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(DetectionRollup).values(rows)
+        excluded = statement.excluded
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['camera', 'zone', 'hour'],
+            set_={
+                'count': DetectionRollup.count + excluded.count,
+                'confidence_sum': DetectionRollup.confidence_sum + excluded.confidence_sum,
+                'confidence_max': case(
+                    (or_(DetectionRollup.confidence_max.is_(None),
+                         excluded.confidence_max > DetectionRollup.confidence_max), excluded.confidence_max),
+                    else_=DetectionRollup.confidence_max
+                ),
+            }
+        ))
+        return
+
+    for row in rows:
+        existing = session.execute(select(DetectionRollup).where(
+            DetectionRollup.camera == row['camera'], DetectionRollup.zone == row['zone'],
+            DetectionRollup.hour == row['hour']
+        )).scalar_one_or_none()
+        if existing is None:
+            session.execute(insert(DetectionRollup), [row])
+            continue
+        existing.count += row['count']
+        existing.confidence_sum += row['confidence_sum']
+        if row['confidence_max'] is not None and (existing.confidence_max is None or row['confidence_max'] > existing.confidence_max):
+            existing.confidence_max = row['confidence_max']
+    session.flush()
+
+
+def subtract_detections(session, where):
+    """
+    Odejmuje z agregatów detekcje, które zaraz zostaną usunięte (ta sama transakcja co DELETE).
+
+    Maksimum pewności nie jest przeliczane (pozostaje górnym ograniczeniem do
+    najbliższego rebuild); agregaty z liczbą 0 są usuwane.
+
+    Args:
+        session: Sesja SQLAlchemy
+        where: Warunek wybierający usuwane detekcje (np. Detection.id.in_(ids))
+
+    Returns:
+        Liczba odjętych detekcji
+    """
+    records = session.execute(
+        select(Detection.camera, Detection.location, Detection.timestamp, Detection.confidence).where(where)
+    ).mappings().all()
+    totals = aggregate(records)
+    if not totals:
+        return 0
+    connection = session.connection()
+    connection.execute(
+        update(DetectionRollup)
+        .where(DetectionRollup.camera == bindparam('k_camera'), DetectionRollup.zone == bindparam('k_zone'),
+               DetectionRollup.hour == bindparam('k_hour'))
+        .values(count=DetectionRollup.count - bindparam('n'),
+                confidence_sum=DetectionRollup.confidence_sum - bindparam('s')),
+        [{'k_camera': camera, 'k_zone': zone, 'k_hour': hour, 'n': count, 's': confidence_sum}
+         for (camera, zone, hour), (count, confidence_sum, _) in totals.items()]
+    )
+    connection.execute(delete(DetectionRollup).where(DetectionRollup.count <= 0))
+    return len(records)
+
+
+def rebuild(session, start=None, end=None, chunk=10000):
+    """
+    Przelicza agregaty z tabeli detection dla zakresu [start, end) (pełne godziny UTC).
+
+    Args:
+        session: Sesja SQLAlchemy (commit po przebudowie)
+        start: Początek zakresu (naiwny UTC) lub None - od pierwszej detekcji
+        end: Koniec zakresu (naiwny UTC) lub None - do ostatniej detekcji
+        chunk: Liczba detekcji czytanych naraz
+
+    Returns:
+        {'detections': przeliczone detekcje, 'rollups': zapisane wiersze agregatów}
+    """
+    detection_where, rollup_where = [], []
+    if start is not None:
+        start = hour_start(start)
+        detection_where.append(Detection.timestamp >= start)
+        rollup_where.append(DetectionRollup.hour >= start)
+    if end is not None:
+        if end != hour_start(end):
+            end = hour_start(end) + timedelta(hours=1)
+        detection_where.append(Detection.timestamp < end)
+        rollup_where.append(DetectionRollup.hour < end)
+
+    try:
+        session.execute(delete(DetectionRollup).where(*rollup_where))
+        result = session.execute(
+            select(Detection.camera, Detection.location, Detection.timestamp, Detection.confidence)
+            .where(*detection_where)
+            .execution_options(yield_per=chunk)
+        ).mappings()
+        totals = {}
+        detections = 0
+        for partition in result.partitions():
+            detections += len(partition)
+            for key, (count, confidence_sum, confidence_max) in aggregate(partition).items():
+                entry = totals.setdefault(key, [0, 0.0, None])
+                entry[0] += count
+                entry[1] += confidence_sum
+                if confidence_max is not None:
+                    entry[2] = confidence_max if entry[2] is None else max(entry[2], confidence_max)
+
+        rows = _rows(totals)
+        for offset in range(0, len(rows), chunk):
+            session.execute(insert(DetectionRollup), rows[offset:offset + chunk])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return {'detections': detections, 'rollups': len(rows)}
+
+
+def _to_local(moment):
+    return moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def _bucket_start(local, granularity):
+    if granularity == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    midnight = datetime.combine(local.date(), datetime.min.time())
+    if granularity == 'day':
+        return midnight
+    if granularity == 'week':
+        return midnight - timedelta(days=midnight.weekday())
+    return midnight.replace(day=1)
+
+
+def _next_bucket(bucket, granularity):
+    if granularity == 'hour':
+        return bucket + timedelta(hours=1)
+    if granularity == 'day':
+        return bucket + timedelta(days=1)
+    if granularity == 'week':
+        return bucket + timedelta(days=7)
+    return bucket.replace(year=bucket.year + bucket.month // 12, month=bucket.month % 12 + 1)
+
+
+def _label(bucket, granularity):
+    if granularity == 'hour':
+        return bucket.strftime('%Y-%m-%dT%H:00')
+    if granularity == 'month':
+        return bucket.strftime('%Y-%m')
+    return bucket.date().isoformat()
+
+
+def query_series(session, start, end, granularity='day', camera=None, zones=None, group_by_zone=False):
+    """
+    Seria liczby detekcji dla zakresu [start, end) z agregatów godzinowych.
+
+    Kubełki day/week/month liczone są w czasie lokalnym (tydzień od poniedziałku);
+    granice zakresu zaokrąglane są do pełnych godzin. Kubełki bez detekcji
+    mają count 0.
+
+    Args:
+        session: Sesja SQLAlchemy
+        start: Początek zakresu (naiwny UTC)
+        end: Koniec zakresu (naiwny UTC)
+        granularity: 'hour', 'day', 'week' lub 'month'
+        camera: Nazwa kamery lub None (wszystkie)
+        zones: Lista stref (lokalizacji) lub None (wszystkie)
+        group_by_zone: Jeśli True, każdy kubełek zawiera też liczby per strefa
+
+    Returns:
+        Lista {'bucket', 'count', 'avg_confidence', 'max_confidence'[, 'zones']}
+
+    Raises:
+        ValueError: Jeśli granularność lub zakres są niepoprawne
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity!r} (allowed: {', '.join(GRANULARITIES)})")
+    if end <= start:
+        raise ValueError("'to' must be after 'from'")
+
+    buckets = {}
+    bucket = _bucket_start(_to_local(start), granularity)
+    local_end = _to_local(end)
+    while bucket < local_end:
+        buckets[bucket] = {'count': 0, 'sum': 0.0, 'max': None, 'zones': {}}
+        if len(buckets) > MAX_BUCKETS:
+            raise ValueError(f"Range too large for granularity '{granularity}' (max {MAX_BUCKETS} buckets)")
+        bucket = _next_bucket(bucket, granularity)
+
+    statement = select(
+        DetectionRollup.zone, DetectionRollup.hour, DetectionRollup.count,
+        DetectionRollup.confidence_sum, DetectionRollup.confidence_max
+    ).where(DetectionRollup.hour >= hour_start(start), DetectionRollup.hour < end)
+    if camera is not None:
+        statement = statement.where(DetectionRollup.camera == camera)
+    if zones:
+        statement = statement.where(DetectionRollup.zone.in_(zones))
+
+    for row in session.execute(statement):
+        entry = buckets.get(_bucket_start(_to_local(row.hour), granularity))
+        if entry is None:
+            continue
+        entry['count'] += row.count
+        entry['sum'] += row.confidence_sum
+        if row.confidence_max is not None:
+            entry['max'] = row.confidence_max if entry['max'] is None else max(entry['max'], row.confidence_max)
+        entry['zones'][row.zone] = entry['zones'].get(row.zone, 0) + row.count
+
+    series = []
+    for bucket, entry in buckets.items():
+        item = {
+            'bucket': _label(bucket, granularity),
+            'count': entry['count'],
+            'avg_confidence': round(entry['sum'] / entry['count'], 4) if entry['count'] else None,
+            'max_confidence': entry['max'],
+        }
+        if group_by_zone:
+            item['zones'] = entry['zones']
+        series.append(item)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Godzinowe agregaty detekcji')
+    parser.add_argument('--rebuild', action='store_true', help='przelicz agregaty z tabeli detection')
+    parser.add_argument('--from', dest='start', help='początek zakresu (ISO, czas lokalny)')
+    parser.add_argument('--to', dest='end', help='koniec zakresu (ISO, czas lokalny)')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from dotenv import load_dotenv
+    from flask import Flask
+    from db_config import DatabaseConfig
+
+    load_dotenv()
+    app = Flask(__name__)
+    DatabaseConfig.from_env().init_app(app, db)
+
+    start = parse_bound(args.start, 'from') if args.start else None
+    end = parse_bound(args.end, 'to', end=True) if args.end else None
+    with app.app_context():
+        result = rebuild(db.session, start, end)
+    print(f"✅ Przeliczono {result['detections']:,} detekcji -> {result['rollups']:,} agregatów godzinowych")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
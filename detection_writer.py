@@ -0,0 +1,289 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from queue import Queue, Empty
+
+from sqlalchemy import insert, select, update
+
+from models import db, Detection, Notification, StoredFile, User
+from detection_rollup import aggregate, apply_increments
+from storage_manager import KIND_CLIP, KIND_IMAGE, get_media_root, index_row
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionWriter(threading.Thread):
+    """
+    Grupowy zapis detekcji do bazy danych.
+
+    Zbiera detekcje przez krótkie okno czasowe (lub do max_batch wierszy)
+    i zapisuje je jednym wielowierszowym INSERT oraz jednym commitem.
+    Id właściciela (użytkownik admin) jest cache'owane, więc pojedyncza
+    detekcja nie wymaga już osobnego zapytania o użytkownika.
+
+    Wiersze outboxu powiadomień (Notification) zapisywane są w tej samej
+    transakcji co detekcje, razem z przyrostem godzinowych agregatów
+    (DetectionRollup) i wierszami indeksu plików (StoredFile); po commicie wywoływani są słuchacze
+    (add_commit_listener), np. NotificationOutbox.
+    """
+
+    def __init__(self, flush_interval=0.5, max_batch=50, owner_username='admin', media_root='detections'):
+        super().__init__(daemon=True, name='detection-writer')
+        self.media_root = media_root
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.owner_username = owner_username
+        self.is_running = True
+
+        self._queue = Queue()
+        self._app = None
+        self._owner_id = None
+        self._commit_listeners = []
+
+        self._stats_lock = threading.Lock()
+        self.batches_committed = 0
+        self.rows_committed = 0
+        self.failures = 0
+        self.last_batch_size = 0
+        self.total_commit_time = 0.0
+
+    @classmethod
+    def from_env(cls, media_root=None):
+        return cls(
+            flush_interval=float(os.getenv('DB_WRITER_FLUSH_INTERVAL', '0.5')),
+            max_batch=int(os.getenv('DB_WRITER_MAX_BATCH', '50')),
+            media_root=media_root or get_media_root()
+        )
+
+    def submit(self, location, confidence, image_path, status='Pending', timestamp=None, callback=None, dedupe=False,
+               notifications=None, trace=None, camera=None):
+        """
+        Dodaje detekcję do najbliższej grupy zapisu.
+
+        Args:
+            callback: Opcjonalna funkcja wywoływana z obiektem Future po commicie
+            dedupe: Jeśli True i detekcja z tym image_path już istnieje, zwraca jej id
+                    zamiast wstawiać nowy wiersz (ponawianie zadań po restarcie)
+            notifications: Kanały (np. ['sms', 'email']), dla których w tej samej transakcji
+                           powstają wiersze outboxu Notification
+            trace: Ślad opóźnień (LatencyTracer) - zapisywany w Detection.trace z dopisanym db_commit
+            camera: Nazwa kamery (klucz agregatów DetectionRollup razem ze strefą i godziną)
+
+        Returns:
+            concurrent.futures.Future z id zapisanej detekcji
+        """
+        record = {
+            'timestamp': timestamp or datetime.utcnow(),
+            'location': location,
+            'camera': camera,
+            'confidence': confidence,
+            'image_path': image_path,
+            'status': status,
+            'trace': trace,
+        }
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        self._queue.put((record, future, dedupe, notifications or []))
+        return future
+
+    def add_commit_listener(self, listener):
+        """
+        Rejestruje funkcję wywoływaną po każdym commicie grupy.
+
+        Args:
+            listener: Funkcja przyjmująca listę zapisanych rekordów (dict z kluczem id)
+        """
+        self._commit_listeners.append(listener)
+
+    def init_app(self, app):
+        """Ustawia instancję Flask (bez tego _get_app importuje moduł app)."""
+        self._app = app
+
+    def _get_app(self):
+        if self._app is None:
+            from app import app
+            self._app = app
+        return self._app
+
+    def _get_owner_id(self):
+        if self._owner_id is None:
+            owner = User.query.filter_by(username=self.owner_username).first()
+            if owner:
+                self._owner_id = owner.id
+        return self._owner_id
+
+    def invalidate_owner(self):
+        """Czyści cache id właściciela (np. po zmianie użytkowników)."""
+        self._owner_id = None
+
+    def set_clip_path(self, detection_id, clip_path):
+        """Dołącza ścieżkę klipu wideo do zapisanej detekcji."""
+        try:
+            app = self._get_app()
+            with app.app_context():
+                try:
+                    db.session.execute(
+                        update(Detection).where(Detection.id == detection_id).values(clip_path=clip_path)
+                    )
+                    file_row = index_row(self.media_root, clip_path, KIND_CLIP, detection_id)
+                    if file_row is not None:
+                        db.session.execute(insert(StoredFile), [file_row])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+            return True
+        except Exception as e:
+            logger.error(f"Error linking clip {clip_path} to detection {detection_id}: {e}")
+            return False
+
+    def _collect_batch(self, first):
+        batch = [first]
+        stop = False
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        futures = [future for _, future, _, _ in batch]
+        try:
+            app = self._get_app()
+            with app.app_context():
+                owner_id = self._get_owner_id()
+                if owner_id is None:
+                    raise RuntimeError(f"Owner user '{self.owner_username}' not found")
+
+                try:
+                    existing = {}
+                    dedupe_paths = [record['image_path'] for record, _, dedupe, _ in batch if dedupe]
+                    if dedupe_paths:
+                        existing = dict(db.session.execute(
+                            select(Detection.image_path, Detection.id).where(Detection.image_path.in_(dedupe_paths))
+                        ).all())
+
+                    new_items = [
+                        (record, channels) for record, _, dedupe, channels in batch
+                        if not (dedupe and record['image_path'] in existing)
+                    ]
+                    to_insert = [record for record, _ in new_items]
+                    commit_at = time.time()
+                    for record in to_insert:
+                        if record['trace'] is not None:
+                            record['trace']['db_commit'] = commit_at
+                    inserted_ids = db.session.scalars(
+                        insert(Detection).returning(Detection.id, sort_by_parameter_order=True),
+                        [dict(record, user_id=owner_id) for record in to_insert]
+                    ).all() if to_insert else []
+
+                    outbox_rows = [
+                        {'detection_id': detection_id, 'channel': channel, 'status': 'pending',
+                         'attempts': 0, 'created_at': record['timestamp']}
+                        for (record, channels), detection_id in zip(new_items, inserted_ids)
+                        for channel in channels
+                    ]
+                    if outbox_rows:
+                        db.session.execute(insert(Notification), outbox_rows)
+                    apply_increments(db.session, aggregate(to_insert))
+                    file_rows = [
+                        index_row(self.media_root, record['image_path'], KIND_IMAGE, detection_id, record['timestamp'])
+                        for record, detection_id in zip(to_insert, inserted_ids) if record['image_path']
+                    ]
+                    file_rows = [row for row in file_rows if row is not None]
+                    if file_rows:
+                        db.session.execute(insert(StoredFile), file_rows)
+                    db.session.commit()
+
+                    inserted = iter(inserted_ids)
+                    ids = [
+                        existing[record['image_path']] if dedupe and record['image_path'] in existing else next(inserted)
+                        for record, _, dedupe, _ in batch
+                    ]
+                except Exception:
+                    db.session.rollback()
+                    self.invalidate_owner()
+                    raise
+        except Exception as e:
+            logger.error(f"Database save error ({len(batch)} detections): {e}")
+            with self._stats_lock:
+                self.failures += len(batch)
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.batches_committed += 1
+            self.rows_committed += len(to_insert)
+            self.last_batch_size = len(to_insert)
+            self.total_commit_time += elapsed
+        for future, detection_id in zip(futures, ids):
+            future.set_result(detection_id)
+
+        committed = [
+            dict(record, id=detection_id, notifications=channels)
+            for (record, channels), detection_id in zip(new_items, inserted_ids)
+        ]
+        for listener in self._commit_listeners:
+            try:
+                listener(committed)
+            except Exception as e:
+                logger.error(f"Detection commit listener failed: {e}")
+
+    def run(self):
+        while self.is_running:
+            try:
+                first = self._queue.get(timeout=1)
+            except Empty:
+                continue
+            if first is None:
+                break
+
+            batch, stop = self._collect_batch(first)
+            self._flush(batch)
+            if stop:
+                break
+
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                pending.append(item)
+        if pending:
+            self._flush(pending)
+
+    def get_stats(self):
+        with self._stats_lock:
+            avg_commit = self.total_commit_time / self.batches_committed if self.batches_committed else 0.0
+            return {
+                'queued': self._queue.qsize(),
+                'batches_committed': self.batches_committed,
+                'rows_committed': self.rows_committed,
+                'failures': self.failures,
+                'last_batch_size': self.last_batch_size,
+                'avg_rows_per_batch': round(self.rows_committed / self.batches_committed, 2) if self.batches_committed else 0.0,
+                'avg_commit_ms': round(avg_commit * 1000, 2),
+            }
+
+    def stop(self):
+        """Zatrzymuje writer po zapisaniu oczekujących detekcji."""
+        self.is_running = False
+        self._queue.put(None)
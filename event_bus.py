@@ -0,0 +1,184 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class EventBus:
+    """
+    Magistrala zdarzeń w procesie dla Server-Sent Events (GET /api/events).
+
+    Zdarzenia (nowa detekcja, zmiana stanu kamery, zmiana statystyk, usunięcie)
+    trafiają do bufora ostatnich history zdarzeń z rosnącymi numerami. Klient
+    SSE po ponownym połączeniu wysyła Last-Event-ID i dostaje tylko zdarzenia,
+    które go ominęły; jeśli wypadły już z bufora (lub serwer został
+    zrestartowany), dostaje zdarzenie reset i pobiera stan od nowa.
+    Id zdarzenia ma postać "<epoka>-<numer>", gdzie epoka to chwila startu magistrali.
+    """
+
+    def __init__(self, history=1000, keepalive=15.0, max_clients=20, retry_ms=3000):
+        self.history = history
+        self.keepalive = keepalive
+        self.max_clients = max_clients
+        self.retry_ms = retry_ms
+
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._epoch = str(int(time.time()))
+        self._seq = 0
+        self._clients = 0
+        self._closed = False
+
+        self.published = 0
+        self.resumed = 0
+        self.resets = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            history=int(os.getenv('EVENT_BUS_HISTORY', '1000')),
+            keepalive=float(os.getenv('EVENT_STREAM_KEEPALIVE', '15')),
+            max_clients=int(os.getenv('EVENT_STREAM_MAX_CLIENTS', '20'))
+        )
+
+    def publish(self, event, data):
+        """
+        Publikuje zdarzenie do wszystkich podłączonych klientów.
+
+        Args:
+            event: Typ zdarzenia (pole "event" w SSE), np. 'detection', 'status', 'stats'
+            data: Dane zdarzenia (serializowane do JSON)
+
+        Returns:
+            Id zdarzenia
+        """
+        payload = json.dumps(data, default=str, separators=(',', ':'))
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event, payload))
+            self.published += 1
+            self._cond.notify_all()
+            return f"{self._epoch}-{self._seq}"
+
+    def _resume_position(self, last_event_id):
+        """Numer ostatniego zdarzenia znanego klientowi lub None, jeśli klient musi pobrać stan od nowa."""
+        if not last_event_id:
+            return self._seq
+        epoch, _, seq = last_event_id.partition('-')
+        try:
+            seq = int(seq)
+        except ValueError:
+            return None
+        oldest = self._events[0][0] if self._events else self._seq + 1
+        if epoch != self._epoch or seq > self._seq or seq < oldest - 1:
+            return None
+        return seq
+
+    def _format(self, seq, event, payload):
+        return f"id: {self._epoch}-{seq}\nevent: {event}\ndata: {payload}\n\n"
+
+    def stream(self, last_event_id=None):
+        """
+        Strumień SSE dla jednego klienta (pozycja ustalana w chwili wywołania).
+
+        Sprawdzenie limitu max_clients i zajęcie miejsca odbywają się pod jedną
+        blokadą, więc równoczesne połączenia nie przekroczą limitu. Miejsce
+        zwalnia zamknięcie generatora.
+
+        Args:
+            last_event_id: Nagłówek Last-Event-ID (lub parametr) z poprzedniego połączenia
+
+        Returns:
+            Generator fragmentów text/event-stream (zdarzenia i komentarze keepalive)
+            lub None, jeśli osiągnięto max_clients
+        """
+        with self._cond:
+            if self._clients >= self.max_clients:
+                return None
+            self._clients += 1
+            position = self._resume_position(last_event_id)
+            reset = position is None
+            if reset:
+                position = self._seq
+                self.resets += 1
+            elif last_event_id:
+                self.resumed += 1
+        return _ClientStream(self, self._stream(position, reset))
+
+    def _release(self):
+        with self._cond:
+            self._clients -= 1
+
+    def _stream(self, position, reset):
+        yield f"retry: {self.retry_ms}\n\n"
+        if reset:
+            yield self._format(position, 'reset', '{}')
+
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq > position or self._closed, timeout=self.keepalive)
+                if self._closed:
+                    return
+                oldest = self._events[0][0] if self._events else self._seq + 1
+                if position < oldest - 1:
+                    # Klient nie nadążał i część zdarzeń wypadła z bufora
+                    pending = None
+                    position = self._seq
+                    self.resets += 1
+                else:
+                    pending = list(itertools.islice(self._events, position - oldest + 1, None))
+            if pending is None:
+                yield self._format(position, 'reset', '{}')
+            elif not pending:
+                yield ": keepalive\n\n"
+            else:
+                yield ''.join(self._format(*item) for item in pending)
+                position = pending[-1][0]
+
+    def close(self):
+        """Kończy wszystkie strumienie (zamknięcie aplikacji)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'clients': self._clients,
+                'published': self.published,
+                'buffered': len(self._events),
+                'last_event_id': f"{self._epoch}-{self._seq}",
+                'resumed': self.resumed,
+                'resets': self.resets,
+            }
+
+
+class _ClientStream:
+    """
+    Strumień jednego klienta SSE. close() (wywoływane przez serwer WSGI po
+    rozłączeniu) zwalnia miejsce w limicie max_clients dokładnie raz - także
+    wtedy, gdy generator nie zdążył wystartować.
+    """
+
+    def __init__(self, bus, generator):
+        self._bus = bus
+        self._generator = generator
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._generator)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        self._generator.close()
+        if not self._released:
+            self._released = True
+            self._bus._release()
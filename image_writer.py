@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = {
+    'jpeg': '.jpg',
+    'webp': '.webp',
+}
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class ImageWriter:
+    """
+    Asynchroniczny zapis obrazów detekcji.
+
+    Kodowanie i zapis na dysk odbywają się w małej puli wątków, dzięki czemu
+    pętla kamery nie czeka na wolną kartę SD. Obsługuje JPEG (jakość,
+    progressive, optimize) oraz WebP, opcjonalne zmniejszenie do maksymalnego
+    wymiaru i zbiera statystyki czasu zapisu oraz zapisanych bajtów.
+    """
+
+    def __init__(self, image_format='jpeg', quality=90, progressive=False,
+                 optimize=False, max_dimension=None, max_workers=2):
+        image_format = (image_format or 'jpeg').lower()
+        if image_format == 'jpg':
+            image_format = 'jpeg'
+        if image_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        self.image_format = image_format
+        self.quality = max(1, min(100, int(quality)))
+        self.progressive = bool(progressive)
+        self.optimize = bool(optimize)
+        self.max_dimension = int(max_dimension) if max_dimension else None
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-writer')
+        self._stats_lock = threading.Lock()
+        self.writes = 0
+        self.failures = 0
+        self.pending = 0
+        self.bytes_written = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """Tworzy writer na podstawie zmiennych środowiskowych (DETECTION_IMAGE_*)."""
+        max_dimension = os.getenv('DETECTION_IMAGE_MAX_DIMENSION')
+        return cls(
+            image_format=os.getenv('DETECTION_IMAGE_FORMAT', 'jpeg'),
+            quality=int(os.getenv('DETECTION_IMAGE_QUALITY', '90')),
+            progressive=_env_bool('DETECTION_IMAGE_PROGRESSIVE'),
+            optimize=_env_bool('DETECTION_IMAGE_OPTIMIZE'),
+            max_dimension=int(max_dimension) if max_dimension else None,
+            max_workers=int(os.getenv('IMAGE_WRITER_WORKERS', '2'))
+        )
+
+    @property
+    def extension(self):
+        return SUPPORTED_FORMATS[self.image_format]
+
+    @property
+    def mimetype(self):
+        return f'image/{self.image_format}'
+
+    def _encode_params(self):
+        if self.image_format == 'webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        return [
+            cv2.IMWRITE_JPEG_QUALITY, self.quality,
+            cv2.IMWRITE_JPEG_PROGRESSIVE, int(self.progressive),
+            cv2.IMWRITE_JPEG_OPTIMIZE, int(self.optimize),
+        ]
+
+    def prepare(self, frame):
+        """Zmniejsza klatkę do max_dimension (jeśli ustawione), zachowując proporcje."""
+        if not self.max_dimension:
+            return frame
+        h, w = frame.shape[:2]
+        longest = max(h, w)
+        if longest <= self.max_dimension:
+            return frame
+        scale = self.max_dimension / float(longest)
+        new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        return cv2.resize(frame, new_size, interpolation=cv2.INTER_AREA)
+
+    def encode(self, frame):
+        """Koduje klatkę do bajtów w skonfigurowanym formacie."""
+        if frame is None or frame.size == 0:
+            raise ValueError("Invalid frame: None or empty")
+        success, buffer = cv2.imencode(self.extension, self.prepare(frame), self._encode_params())
+        if not success:
+            raise RuntimeError(f"Failed to encode image as {self.image_format}")
+        return buffer.tobytes()
+
+    def write(self, frame, filepath):
+        """
+        Synchronicznie koduje i zapisuje klatkę (zapis atomowy przez plik tymczasowy).
+
+        Returns:
+            Liczba zapisanych bajtów
+        """
+        return len(self._encode_and_write(frame, filepath))
+
+    def _encode_and_write(self, frame, filepath):
+        start = time.perf_counter()
+        try:
+            data = self.encode(frame)
+        except Exception:
+            with self._stats_lock:
+                self.failures += 1
+            raise
+        self.write_bytes(data, filepath, started_at=start)
+        return data
+
+    def write_bytes(self, data, filepath, started_at=None):
+        """
+        Zapisuje już zakodowane bajty obrazu (zapis atomowy przez plik tymczasowy).
+
+        Returns:
+            Liczba zapisanych bajtów
+        """
+        start = started_at if started_at is not None else time.perf_counter()
+        try:
+            directory = os.path.dirname(filepath)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f'{filepath}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, filepath)
+        except Exception:
+            with self._stats_lock:
+                self.failures += 1
+            raise
+
+        latency = time.perf_counter() - start
+        with self._stats_lock:
+            self.writes += 1
+            self.bytes_written += len(data)
+            self.total_latency += latency
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+        return len(data)
+
+    def _write_pending(self, frame, filepath):
+        try:
+            return self._encode_and_write(frame, filepath)
+        finally:
+            with self._stats_lock:
+                self.pending -= 1
+
+    def submit(self, frame, filepath, callback=None):
+        """
+        Zleca zapis klatki w tle.
+
+        Args:
+            frame: numpy array (BGR image) - nie może być później modyfikowany
+            filepath: Docelowa ścieżka pliku
+            callback: Opcjonalna funkcja wywoływana z obiektem Future po zakończeniu
+
+        Returns:
+            concurrent.futures.Future z zakodowanymi bajtami obrazu (tymi samymi, które trafiły na dysk)
+        """
+        with self._stats_lock:
+            self.pending += 1
+        future = self._executor.submit(self._write_pending, frame, filepath)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def get_stats(self):
+        with self._stats_lock:
+            avg_latency = self.total_latency / self.writes if self.writes else 0.0
+            return {
+                'format': self.image_format,
+                'quality': self.quality,
+                'max_dimension': self.max_dimension,
+                'writes': self.writes,
+                'failures': self.failures,
+                'pending': self.pending,
+                'bytes_written': self.bytes_written,
+                'avg_bytes': int(self.bytes_written / self.writes) if self.writes else 0,
+                'avg_latency_ms': round(avg_latency * 1000, 2),
+                'last_latency_ms': round(self.last_latency * 1000, 2),
+                'max_latency_ms': round(self.max_latency * 1000, 2),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Znaczniki czasu (time.time()) w kolejności przepływu detekcji.
+# Detection.trace: capture ... db_commit; Notification.trace: claimed ... sent.
+PIPELINE_MARKS = ('capture', 'inference_start', 'inference_end', 'zone_match', 'enqueue', 'anonymized', 'db_commit')
+DELIVERY_MARKS = ('claimed', 'upload', 'send_start', 'sent')
+
+PIPELINE_STAGES = (
+    ('frame_wait', 'capture', 'inference_start'),
+    ('inference', 'inference_start', 'inference_end'),
+    ('zone_match', 'inference_end', 'zone_match'),
+    ('enqueue', 'zone_match', 'enqueue'),
+    ('anonymization', 'enqueue', 'anonymized'),
+    ('db_commit', 'anonymized', 'db_commit'),
+    ('capture_to_commit', 'capture', 'db_commit'),
+)
+DELIVERY_STAGES = (
+    ('outbox_claim', 'db_commit', 'claimed'),
+    ('upload', 'claimed', 'upload'),
+)
+
+HISTOGRAM_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+def mark(trace, name, at=None):
+    """Zapisuje znacznik czasu w śladzie (trace może być None - wtedy nic nie robi)."""
+    if trace is not None:
+        trace[name] = at if at is not None else time.time()
+    return trace
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class _StageHistogram:
+    """Okno ostatnich próbek (percentyle) + skumulowany histogram kubełkowy od startu."""
+
+    __slots__ = ('samples', 'buckets', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms):
+        self.samples.append(duration_ms)
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def snapshot(self):
+        samples = list(self.samples)
+        histogram = {f'le_{bound}ms': count for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.buckets)}
+        histogram['inf'] = self.buckets[-1]
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0.0,
+            'p50_ms': round(_percentile(samples, 50), 1),
+            'p95_ms': round(_percentile(samples, 95), 1),
+            'p99_ms': round(_percentile(samples, 99), 1),
+            'max_ms': round(self.max_ms, 1),
+            'histogram': histogram,
+        }
+
+
+class LatencyTracer:
+    """
+    Agregator śladów opóźnień od przechwycenia klatki do doręczenia alertu.
+
+    Etapy potoku (capture → db_commit) rejestrowane są po commicie detekcji
+    (słuchacz DetectionWriter), a etapy doręczenia (claim outboxu, upload,
+    wysyłka oraz alert end-to-end per kanał) po doręczeniu powiadomienia.
+    Percentyle liczone są z okna ostatnich samples próbek na etap.
+    """
+
+    def __init__(self, samples=1000, slo_alert_p95=10.0):
+        self.samples = samples
+        self.slo_alert_p95 = slo_alert_p95
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.traces_committed = 0
+        self.deliveries_traced = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            samples=int(os.getenv('LATENCY_TRACE_SAMPLES', '1000')),
+            slo_alert_p95=float(os.getenv('LATENCY_SLO_ALERT_P95', '10'))
+        )
+
+    def _add(self, stage, start, end):
+        if start is None or end is None or end < start:
+            return
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            histogram = _StageHistogram(self.samples)
+            self._stages[stage] = histogram
+        histogram.add((end - start) * 1000.0)
+
+    def observe_committed(self, committed):
+        """Słuchacz commitów DetectionWriter - rejestruje etapy potoku zapisanych detekcji."""
+        with self._lock:
+            for record in committed:
+                trace = record.get('trace')
+                if not trace:
+                    continue
+                self.traces_committed += 1
+                for stage, start, end in PIPELINE_STAGES:
+                    self._add(stage, trace.get(start), trace.get(end))
+
+    def observe_delivery(self, channel, trace, marks):
+        """
+        Rejestruje doręczone powiadomienie.
+
+        Args:
+            channel: Kanał ('sms', 'email')
+            trace: Ślad detekcji (Detection.trace) lub None
+            marks: Znaczniki doręczenia (claimed, upload, send_start, sent)
+        """
+        trace = trace or {}
+        merged = dict(trace, **marks)
+        with self._lock:
+            self.deliveries_traced += 1
+            for stage, start, end in DELIVERY_STAGES:
+                self._add(stage, merged.get(start), merged.get(end))
+            self._add(f'send_{channel}', marks.get('send_start'), marks.get('sent'))
+            self._add(f'alert_{channel}', trace.get('capture'), marks.get('sent'))
+
+    @staticmethod
+    def timeline(trace, notifications=None):
+        """
+        Oś czasu jednej detekcji dla API.
+
+        Args:
+            trace: Detection.trace
+            notifications: Lista (kanał, Notification.trace)
+
+        Returns:
+            Lista {'mark', 'channel', 'at', 'offset_ms'} posortowana po czasie
+        """
+        events = [(name, None, at) for name, at in (trace or {}).items()]
+        for channel, marks in notifications or []:
+            events.extend((name, channel, at) for name, at in (marks or {}).items())
+        events = [event for event in events if isinstance(event[2], (int, float))]
+        events.sort(key=lambda event: event[2])
+        origin = (trace or {}).get('capture') or (events[0][2] if events else None)
+        return [{
+            'mark': name,
+            'channel': channel,
+            'at': datetime.fromtimestamp(at).isoformat(),
+            'offset_ms': round((at - origin) * 1000.0, 1),
+        } for name, channel, at in events]
+
+    def get_stats(self):
+        with self._lock:
+            stages = {stage: histogram.snapshot() for stage, histogram in self._stages.items()}
+            stats = {
+                'window_samples': self.samples,
+                'traces_committed': self.traces_committed,
+                'deliveries_traced': self.deliveries_traced,
+                'stages': stages,
+            }
+        slo = {}
+        for stage, snapshot in stages.items():
+            if stage.startswith('alert_') and snapshot['count']:
+                p95_s = snapshot['p95_ms'] / 1000.0
+                slo[stage] = {'target_p95_s': self.slo_alert_p95, 'p95_s': round(p95_s, 3), 'met': p95_s <= self.slo_alert_p95}
+        stats['slo'] = slo
+        return stats
@@ -0,0 +1,24 @@
+"""Add clip_path field to Detection
+
+Revision ID: add_clip_path
+Revises: add_config_field
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_clip_path'
+down_revision = 'add_config_field'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Path of the pre/post-event clip, relative to the detections folder
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('clip_path', sa.String(length=200), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.drop_column('clip_path')
@@ -0,0 +1,28 @@
+"""Add indexes on detection timestamp, location and status
+
+Revision ID: add_detection_indexes
+Revises: add_latency_trace
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_detection_indexes'
+down_revision = 'add_latency_trace'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Range scans on timestamp (dashboard, time series, pagination) and per-zone/status filters
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.create_index('ix_detection_timestamp', ['timestamp'], unique=False)
+        batch_op.create_index('ix_detection_location_timestamp', ['location', 'timestamp'], unique=False)
+        batch_op.create_index('ix_detection_status', ['status'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.drop_index('ix_detection_status')
+        batch_op.drop_index('ix_detection_location_timestamp')
+        batch_op.drop_index('ix_detection_timestamp')
@@ -0,0 +1,54 @@
+"""Add camera to Detection and hourly detection rollup table
+
+Revision ID: add_detection_rollup
+Revises: add_detection_indexes
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_detection_rollup'
+down_revision = 'add_detection_indexes'
+branch_labels = None
+depends_on = None
+
+HOUR_EXPRESSIONS = {
+    # Same text format SQLAlchemy uses for DateTime in SQLite
+    'sqlite': "strftime('%Y-%m-%d %H:00:00.000000', timestamp)",
+    'postgresql': "date_trunc('hour', timestamp)",
+}
+
+def upgrade():
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('camera', sa.String(length=100), nullable=True))
+
+    op.create_table('detection_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('camera', sa.String(length=100), nullable=False),
+        sa.Column('zone', sa.String(length=100), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('confidence_sum', sa.Float(), nullable=False),
+        sa.Column('confidence_max', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('camera', 'zone', 'hour', name='uq_detection_rollup_key')
+    )
+    op.create_index('ix_detection_rollup_hour', 'detection_rollup', ['hour'], unique=False)
+
+    # Backfill from existing detections (other databases: python detection_rollup.py --rebuild)
+    hour = HOUR_EXPRESSIONS.get(op.get_bind().dialect.name)
+    if hour:
+        op.execute(
+            "INSERT INTO detection_rollup (camera, zone, hour, count, confidence_sum, confidence_max) "
+            f"SELECT COALESCE(camera, ''), COALESCE(location, ''), {hour}, COUNT(*), "
+            "COALESCE(SUM(confidence), 0), MAX(confidence) "
+            f"FROM detection GROUP BY COALESCE(camera, ''), COALESCE(location, ''), {hour}"
+        )
+
+def downgrade():
+    op.drop_index('ix_detection_rollup_hour', table_name='detection_rollup')
+    op.drop_table('detection_rollup')
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.drop_column('camera')
@@ -0,0 +1,28 @@
+"""Add latency trace to Detection and Notification
+
+Revision ID: add_latency_trace
+Revises: add_notification_outbox
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_latency_trace'
+down_revision = 'add_notification_outbox'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Pipeline timestamps (capture ... db_commit) and per-channel delivery timestamps (claimed ... sent)
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trace', sa.JSON(), nullable=True))
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trace', sa.JSON(), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_column('trace')
+    with op.batch_alter_table('detection', schema=None) as batch_op:
+        batch_op.drop_column('trace')
@@ -0,0 +1,43 @@
+"""Add notification outbox table
+
+Revision ID: add_notification_outbox
+Revises: add_clip_path
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_notification_outbox'
+down_revision = 'add_clip_path'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # One row per detection and channel, written in the same transaction as the detection
+    op.create_table('notification',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('detection_id', sa.Integer(), nullable=False),
+        sa.Column('channel', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('last_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('delivered_at', sa.DateTime(), nullable=True),
+        sa.Column('latency_ms', sa.Float(), nullable=True),
+        sa.Column('last_error', sa.String(length=500), nullable=True),
+        sa.ForeignKeyConstraint(['detection_id'], ['detection.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('detection_id', 'channel', name='uq_notification_detection_channel')
+    )
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_detection_id'), ['detection_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_notification_status'), ['status'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_status'))
+        batch_op.drop_index(batch_op.f('ix_notification_detection_id'))
+    op.drop_table('notification')
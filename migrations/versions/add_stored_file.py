@@ -0,0 +1,37 @@
+"""Add stored_file index of detection media files
+
+Revision ID: add_stored_file
+Revises: add_detection_rollup
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_stored_file'
+down_revision = 'add_detection_rollup'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Existing files are indexed once with: python storage_manager.py --reindex
+    op.create_table('stored_file',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(length=300), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('bytes', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('detection_id', sa.Integer(), nullable=True),
+        sa.Column('recompressed', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stored_file_path', 'stored_file', ['path'], unique=False)
+    op.create_index('ix_stored_file_created_at', 'stored_file', ['created_at'], unique=False)
+    op.create_index('ix_stored_file_detection_id', 'stored_file', ['detection_id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_stored_file_detection_id', table_name='stored_file')
+    op.drop_index('ix_stored_file_created_at', table_name='stored_file')
+    op.drop_index('ix_stored_file_path', table_name='stored_file')
+    op.drop_table('stored_file')
@@ -31,13 +31,61 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Detection(db.Model):
+    # timestamp w UTC; zapytania filtrują półotwartymi zakresami [od, do), żeby korzystać z indeksów
+    __table_args__ = (db.Index('ix_detection_location_timestamp', 'location', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     location = db.Column(db.String(100))
+    camera = db.Column(db.String(100), nullable=True)
     confidence = db.Column(db.Float)
     image_path = db.Column(db.String(200))
-    status = db.Column(db.String(20))
+    clip_path = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(20), index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    trace = db.Column(db.JSON, nullable=True)
+
+class Notification(db.Model):
+    """Outbox powiadomień - wiersz na kanał, zapisywany w tej samej transakcji co Detection."""
+    __table_args__ = (db.UniqueConstraint('detection_id', 'channel', name='uq_notification_detection_channel'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    detection_id = db.Column(db.Integer, db.ForeignKey('detection.id', ondelete='CASCADE'), nullable=False, index=True)
+    channel = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_attempt_at = db.Column(db.DateTime, nullable=True)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    latency_ms = db.Column(db.Float, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    trace = db.Column(db.JSON, nullable=True)
+
+class DetectionRollup(db.Model):
+    """Godzinowy agregat detekcji (kamera, strefa, godzina UTC) utrzymywany przez DetectionWriter."""
+    __table_args__ = (
+        db.UniqueConstraint('camera', 'zone', 'hour', name='uq_detection_rollup_key'),
+        db.Index('ix_detection_rollup_hour', 'hour'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    camera = db.Column(db.String(100), nullable=False, default='')
+    zone = db.Column(db.String(100), nullable=False, default='')
+    hour = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+    confidence_max = db.Column(db.Float, nullable=True)
+
+class StoredFile(db.Model):
+    """Indeks plików mediów detekcji (ścieżka względem katalogu detections) - podstawa retencji i GC."""
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(300), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)
+    bytes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    detection_id = db.Column(db.Integer, nullable=True, index=True)
+    recompressed = db.Column(db.Boolean, nullable=False, default=False)
 
 class Settings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('sms', 'email')
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+
+class _Job:
+    __slots__ = ('channel', 'fn', 'args', 'kwargs', 'priority', 'created_at', 'enqueued_at', 'on_done')
+
+    def __init__(self, channel, fn, args, kwargs, priority, created_at, on_done):
+        self.channel = channel
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.created_at = created_at
+        self.enqueued_at = time.time()
+        self.on_done = on_done
+
+
+class NotificationDispatcher:
+    """
+    Dyspozytor powiadomień ze stałą pulą wątków.
+
+    Każdy kanał (sms, email) ma własną ograniczoną kolejkę priorytetową
+    i limit równoległych zadań, więc wolna bramka SMS lub SMTP nie mnoży
+    wątków ani połączeń. Wolny wątek bierze zadanie o najniższym priorytecie
+    spośród kanałów poniżej limitu. Zbiera metryki: zadania w toku, głębokość
+    kolejek oraz opóźnienie end-to-end (od detekcji do doręczenia).
+
+    Nie ma kanału dla uploadu do chmury: obrazy wysyła UploadService z własną
+    pulą, ponawianiem, deduplikacją po SHA-256 i bezpiecznikiem, a zadania SMS
+    i e-mail dostają gotowy link (lub brak linku po terminie).
+    """
+
+    def __init__(self, workers=4, channel_limits=None, queue_size=100, latency_window=500):
+        self.workers = workers
+        self.channel_limits = {'sms': 1, 'email': 1}
+        if channel_limits:
+            self.channel_limits.update(channel_limits)
+        self.queue_size = queue_size
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._queues = {channel: [] for channel in CHANNELS}
+        self._in_flight = {channel: 0 for channel in CHANNELS}
+        self._completed = {channel: 0 for channel in CHANNELS}
+        self._failed = {channel: 0 for channel in CHANNELS}
+        self._dropped = {channel: 0 for channel in CHANNELS}
+        self._latencies = {channel: deque(maxlen=latency_window) for channel in CHANNELS}
+        self._threads = []
+        self.is_running = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv('NOTIFY_WORKERS', '4')),
+            channel_limits={
+                'sms': int(os.getenv('NOTIFY_SMS_CONCURRENCY', '1')),
+                'email': int(os.getenv('NOTIFY_EMAIL_CONCURRENCY', '1')),
+            },
+            queue_size=int(os.getenv('NOTIFY_QUEUE_SIZE', '100'))
+        )
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'notify-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, channel, fn, *args, priority=PRIORITY_NORMAL, created_at=None, on_done=None, **kwargs):
+        """
+        Dodaje zadanie do kolejki kanału.
+
+        Args:
+            channel: 'sms' lub 'email'
+            fn: Funkcja wysyłająca (wywoływana z *args, **kwargs)
+            priority: Niższa wartość = wcześniejsze wykonanie
+            created_at: Czas zdarzenia (time.time()) - początek pomiaru opóźnienia end-to-end
+            on_done: Opcjonalna funkcja wywoływana z wynikiem fn (lub None przy błędzie)
+
+        Returns:
+            True jeśli przyjęto, False jeśli kolejka kanału jest pełna
+        """
+        if channel not in self._queues:
+            raise ValueError(f"Unknown notification channel: {channel}")
+        job = _Job(channel, fn, args, kwargs, priority,
+                   created_at if created_at is not None else time.time(), on_done)
+        with self._cond:
+            queue = self._queues[channel]
+            if len(queue) >= self.queue_size:
+                self._dropped[channel] += 1
+                logger.error(f"Notification queue '{channel}' is full ({self.queue_size}) - dropping job")
+                return False
+            heapq.heappush(queue, (priority, next(self._seq), job))
+            self._cond.notify()
+        return True
+
+    def _next_job(self):
+        best = None
+        for channel, queue in self._queues.items():
+            if not queue or self._in_flight[channel] >= self.channel_limits[channel]:
+                continue
+            if best is None or queue[0][:2] < self._queues[best][0][:2]:
+                best = channel
+        if best is None:
+            return None
+        _, _, job = heapq.heappop(self._queues[best])
+        self._in_flight[best] += 1
+        return job
+
+    def _worker_loop(self):
+        while self.is_running:
+            with self._cond:
+                job = self._next_job()
+                while job is None and self.is_running:
+                    self._cond.wait(timeout=1)
+                    job = self._next_job()
+            if job is None:
+                break
+
+            result = None
+            failed = False
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+                failed = result is False
+            except Exception as e:
+                failed = True
+                logger.error(f"Notification job on channel '{job.channel}' failed: {e}")
+
+            latency = time.time() - job.created_at
+            with self._cond:
+                self._in_flight[job.channel] -= 1
+                if failed:
+                    self._failed[job.channel] += 1
+                else:
+                    self._completed[job.channel] += 1
+                    self._latencies[job.channel].append(latency)
+                self._cond.notify_all()
+
+            if job.on_done is not None:
+                try:
+                    job.on_done(None if failed else result)
+                except Exception as e:
+                    logger.error(f"Notification callback on channel '{job.channel}' failed: {e}")
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def get_stats(self):
+        with self._cond:
+            channels = {}
+            for channel in CHANNELS:
+                latencies = list(self._latencies[channel])
+                channels[channel] = {
+                    'queue_depth': len(self._queues[channel]),
+                    'in_flight': self._in_flight[channel],
+                    'concurrency_limit': self.channel_limits[channel],
+                    'completed': self._completed[channel],
+                    'failed': self._failed[channel],
+                    'dropped': self._dropped[channel],
+                    'latency_avg_s': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                    'latency_p95_s': round(self._percentile(latencies, 95), 3),
+                }
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': sum(self._in_flight.values()),
+                'queue_depth': sum(len(q) for q in self._queues.values()),
+                'channels': channels,
+            }
+
+    def stop(self):
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
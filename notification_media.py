@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from detection_artifact import DetectionArtifact
+
+logger = logging.getLogger(__name__)
+
+MEDIA_MODES = ('full', 'preview', 'crop', 'both')
+
+
+class NotificationMedia:
+    """
+    Obrazy wysyłane w powiadomieniach (upload + e-mail), generowane raz z klatki w pamięci.
+
+    Tryby:
+    - full: pełna klatka (jak dotąd),
+    - preview: zmniejszony podgląd,
+    - crop: wycinek wokół ramki telefonu i strefy,
+    - both: wycinek + podgląd.
+
+    Pełna rozdzielczość zostaje tylko w pliku lokalnym (do przeglądu).
+    """
+
+    def __init__(self, mode='full', preview_max_dimension=640, crop_margin=0.25, crop_min_size=256, quality=75):
+        if mode not in MEDIA_MODES:
+            raise ValueError(f"Unsupported notification media mode: {mode}")
+        self.mode = mode
+        self.preview_max_dimension = preview_max_dimension
+        self.crop_margin = crop_margin
+        self.crop_min_size = crop_min_size
+        self.quality = quality
+
+        self._stats_lock = threading.Lock()
+        self.full_bytes = 0
+        self.media_bytes = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.getenv('NOTIFY_MEDIA_MODE', 'full').strip().lower(),
+            preview_max_dimension=int(os.getenv('NOTIFY_MEDIA_PREVIEW_MAX_DIMENSION', '640')),
+            crop_margin=float(os.getenv('NOTIFY_MEDIA_CROP_MARGIN', '0.25')),
+            quality=int(os.getenv('NOTIFY_MEDIA_QUALITY', '75'))
+        )
+
+    def _encode(self, image, filename):
+        success, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not success:
+            raise RuntimeError(f"Cannot encode notification media {filename}")
+        h, w = image.shape[:2]
+        return DetectionArtifact(filename, buffer.tobytes(), 'image/jpeg', width=w, height=h)
+
+    def _preview(self, image, stem):
+        h, w = image.shape[:2]
+        longest = max(h, w)
+        if longest > self.preview_max_dimension:
+            scale = self.preview_max_dimension / float(longest)
+            image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        return self._encode(image, f'{stem}_preview.jpg')
+
+    def _crop_region(self, width, height, phone_box, zone_box):
+        boxes = [box for box in (phone_box, zone_box) if box]
+        if not boxes:
+            return None
+        x1 = min(box[0] for box in boxes) * width
+        y1 = min(box[1] for box in boxes) * height
+        x2 = max(box[2] for box in boxes) * width
+        y2 = max(box[3] for box in boxes) * height
+
+        margin_x = max((x2 - x1) * self.crop_margin, (self.crop_min_size - (x2 - x1)) / 2.0, 0)
+        margin_y = max((y2 - y1) * self.crop_margin, (self.crop_min_size - (y2 - y1)) / 2.0, 0)
+        x1, x2 = max(0, int(x1 - margin_x)), min(width, int(x2 + margin_x))
+        y1, y2 = max(0, int(y1 - margin_y)), min(height, int(y2 + margin_y))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+
+    def _crop(self, image, stem, phone_box, zone_box):
+        h, w = image.shape[:2]
+        region = self._crop_region(w, h, phone_box, zone_box)
+        if region is None:
+            return None
+        x1, y1, x2, y2 = region
+        crop = image[y1:y2, x1:x2]
+        if max(crop.shape[:2]) > self.preview_max_dimension * 2:
+            scale = self.preview_max_dimension * 2 / float(max(crop.shape[:2]))
+            crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+                              interpolation=cv2.INTER_AREA)
+        return self._encode(crop, f'{stem}_crop.jpg')
+
+    def build(self, artifact, image=None, phone_box=None, zone_box=None):
+        """
+        Buduje obrazy do powiadomień.
+
+        Args:
+            artifact: DetectionArtifact z pełnym (zanonimizowanym) obrazem
+            image: Zanonimizowana klatka w pamięci (jeśli None - dekodowana raz z artifact.data)
+            phone_box: Ramka telefonu (x1, y1, x2, y2) znormalizowana do 0..1 lub None
+            zone_box: Ramka strefy (x1, y1, x2, y2) znormalizowana do 0..1 lub None
+
+        Returns:
+            Lista DetectionArtifact (pierwszy element trafia na upload i do SMS)
+        """
+        if artifact is None or self.mode == 'full':
+            return [artifact] if artifact is not None else []
+
+        try:
+            if image is None:
+                image = cv2.imdecode(np.frombuffer(artifact.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    raise RuntimeError("cannot decode detection image")
+
+            media = []
+            if self.mode in ('crop', 'both'):
+                crop = self._crop(image, artifact.stem, phone_box, zone_box)
+                if crop is not None:
+                    media.append(crop)
+            if self.mode == 'preview' or self.mode == 'both' or not media:
+                media.append(self._preview(image, artifact.stem))
+        except Exception as e:
+            logger.error(f"Error building notification media for {artifact.filename}: {e} - using full image")
+            return [artifact]
+
+        with self._stats_lock:
+            self.full_bytes += artifact.size
+            self.media_bytes += sum(item.size for item in media)
+        return media
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'mode': self.mode,
+                'full_bytes': self.full_bytes,
+                'media_bytes': self.media_bytes,
+                'bytes_saved': max(0, self.full_bytes - self.media_bytes),
+            }
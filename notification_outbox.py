@@ -0,0 +1,298 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from models import db, Detection, Notification
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_DELIVERED = 'delivered'
+STATUS_FAILED = 'failed'
+STATUS_SUPPRESSED = 'suppressed'
+STATUS_DEFERRED = 'deferred'
+
+
+class NotificationOutbox(threading.Thread):
+    """
+    Dyspozytor outboxu powiadomień (tabela notification).
+
+    Wiersze powstają w tej samej transakcji co Detection (DetectionWriter).
+    Wątek pobiera oczekujące wiersze partiami, oznacza je jako sending
+    i przekazuje do funkcji deliver. Wyniki (complete) zapisywane są partiami:
+    delivered z opóźnieniem, albo ponowna próba z backoffem / failed po
+    max_attempts. Wiersze sending pozostawione przez przerwany proces wracają
+    do pending przy starcie. Znaczniki doręczenia (row['marks']: claimed, upload,
+    send_start, sent) zapisywane są w Notification.trace. Wiersze odłożone przez otwarty bezpiecznik
+    (deferred) wracają do pending bez zużycia próby i są odtwarzane (replay)
+    po zamknięciu obwodu.
+    """
+
+    def __init__(self, deliver, batch_size=20, poll_interval=5.0, max_attempts=5, retry_base=30.0, retry_max=1800.0):
+        super().__init__(daemon=True, name='notification-outbox')
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.is_running = True
+
+        self._app = None
+        self._wake = threading.Event()
+        self._results_lock = threading.Lock()
+        self._results = []
+
+        self._stats_lock = threading.Lock()
+        self.claimed = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.suppressed = 0
+        self.deferred = 0
+        self.replayed = 0
+
+    @classmethod
+    def from_env(cls, deliver):
+        return cls(
+            deliver,
+            batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', '20')),
+            poll_interval=float(os.getenv('OUTBOX_POLL_INTERVAL', '5')),
+            max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5')),
+            retry_base=float(os.getenv('OUTBOX_RETRY_BASE', '30'))
+        )
+
+    def init_app(self, app):
+        """Ustawia instancję Flask (bez tego _get_app importuje moduł app)."""
+        self._app = app
+
+    def _get_app(self):
+        if self._app is None:
+            from app import app
+            self._app = app
+        return self._app
+
+    def wake(self, committed=None):
+        """Budzi dyspozytor (np. jako słuchacz commitów DetectionWriter)."""
+        if committed is None or any(record.get('notifications') for record in committed):
+            self._wake.set()
+
+    def complete(self, row, status, error=None):
+        """
+        Zgłasza wynik doręczenia wiersza (zapis odbywa się partiami w wątku outboxu).
+
+        Args:
+            row: Słownik wiersza przekazany do deliver
+            status: 'delivered', 'failed' (do ponowienia), 'suppressed' (pominięty przez limity)
+                    lub 'deferred' (odłożony przez otwarty bezpiecznik, bez zużycia próby)
+            error: Opis błędu; dla 'deferred' opcjonalnie czas (time.time()) ponownej próby
+        """
+        with self._results_lock:
+            self._results.append((row, status, error, datetime.utcnow()))
+        self._wake.set()
+
+    def replay(self, channel):
+        """
+        Natychmiast ponawia oczekujące wiersze kanału (np. po zamknięciu bezpiecznika).
+
+        Returns:
+            Liczba wierszy przywróconych do kolejki
+        """
+        with self._get_app().app_context():
+            try:
+                result = db.session.execute(
+                    update(Notification)
+                    .where(Notification.status == STATUS_PENDING, Notification.channel == channel,
+                           Notification.next_attempt_at.is_not(None))
+                    .values(next_attempt_at=None)
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        with self._stats_lock:
+            self.replayed += result.rowcount
+        if result.rowcount:
+            print(f"♻️  Outbox: {result.rowcount} zaległych powiadomień '{channel}' wysyłanych ponownie")
+        self._wake.set()
+        return result.rowcount
+
+    def _recover(self):
+        with self._get_app().app_context():
+            try:
+                result = db.session.execute(
+                    update(Notification).where(Notification.status == STATUS_SENDING).values(status=STATUS_PENDING)
+                )
+                db.session.commit()
+                if result.rowcount:
+                    print(f"♻️  Outbox: {result.rowcount} powiadomień wraca do kolejki po restarcie")
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _claim(self):
+        now = datetime.utcnow()
+        with self._get_app().app_context():
+            try:
+                rows = db.session.execute(
+                    select(
+                        Notification.id, Notification.detection_id, Notification.channel, Notification.attempts,
+                        Detection.timestamp, Detection.location, Detection.confidence, Detection.image_path,
+                        Detection.trace
+                    )
+                    .join(Detection, Detection.id == Notification.detection_id)
+                    .where(
+                        Notification.status == STATUS_PENDING,
+                        (Notification.next_attempt_at.is_(None)) | (Notification.next_attempt_at <= now)
+                    )
+                    .order_by(Notification.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    return []
+                db.session.execute(
+                    update(Notification)
+                    .where(Notification.id.in_([row.id for row in rows]))
+                    .values(status=STATUS_SENDING, attempts=Notification.attempts + 1, last_attempt_at=now)
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        with self._stats_lock:
+            self.claimed += len(rows)
+        claimed_at = time.time()
+        return [{
+            'id': row.id,
+            'detection_id': row.detection_id,
+            'channel': row.channel,
+            'attempts': row.attempts + 1,
+            'detected_at': row.timestamp,
+            'location': row.location,
+            'confidence': row.confidence,
+            'image_path': row.image_path,
+            'trace': row.trace,
+            'marks': {'claimed': claimed_at},
+        } for row in rows]
+
+    def _retry_delay(self, attempts):
+        return min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+
+    def _flush_results(self):
+        with self._results_lock:
+            results, self._results = self._results, []
+        if not results:
+            return
+
+        counts = {'delivered': 0, 'failed': 0, 'retried': 0, 'suppressed': 0, 'deferred': 0}
+        with self._get_app().app_context():
+            try:
+                for row, status, error, finished_at in results:
+                    values = {'last_error': str(error)[:500] if error else None}
+                    if row.get('marks') and status in (STATUS_DELIVERED, STATUS_FAILED):
+                        values['trace'] = row['marks']
+                    if status == STATUS_DEFERRED:
+                        retry_at = datetime.utcfromtimestamp(error) if isinstance(error, (int, float)) else None
+                        values.update(
+                            status=STATUS_PENDING,
+                            attempts=Notification.attempts - 1,
+                            last_error='circuit open',
+                            next_attempt_at=retry_at or finished_at + timedelta(seconds=self.retry_base)
+                        )
+                        counts['deferred'] += 1
+                    elif status == STATUS_DELIVERED:
+                        values.update(status=STATUS_DELIVERED, delivered_at=finished_at)
+                        if row.get('detected_at'):
+                            values['latency_ms'] = round((finished_at - row['detected_at']).total_seconds() * 1000, 1)
+                        counts['delivered'] += 1
+                    elif status == STATUS_SUPPRESSED:
+                        values.update(status=STATUS_SUPPRESSED)
+                        counts['suppressed'] += 1
+                    elif row['attempts'] >= self.max_attempts:
+                        values.update(status=STATUS_FAILED)
+                        counts['failed'] += 1
+                    else:
+                        values.update(
+                            status=STATUS_PENDING,
+                            next_attempt_at=finished_at + timedelta(seconds=self._retry_delay(row['attempts']))
+                        )
+                        counts['retried'] += 1
+                    db.session.execute(update(Notification).where(Notification.id == row['id']).values(**values))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._results_lock:
+                    self._results = results + self._results
+                raise
+
+        with self._stats_lock:
+            self.delivered += counts['delivered']
+            self.failed += counts['failed']
+            self.retried += counts['retried']
+            self.suppressed += counts['suppressed']
+            self.deferred += counts['deferred']
+
+    def run(self):
+        recovered = False
+        while self.is_running:
+            self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+            try:
+                if not recovered:
+                    self._recover()
+                    recovered = True
+                self._flush_results()
+                rows = self._claim()
+                while rows:
+                    try:
+                        self.deliver(rows)
+                    except Exception as e:
+                        logger.error(f"Outbox delivery error ({len(rows)} notifications): {e}")
+                        for row in rows:
+                            self.complete(row, STATUS_FAILED, e)
+                    if len(rows) < self.batch_size:
+                        break
+                    rows = self._claim()
+            except Exception as e:
+                logger.error(f"Notification outbox error: {e}")
+
+        try:
+            self._flush_results()
+        except Exception as e:
+            logger.error(f"Notification outbox error: {e}")
+
+    def get_backlog(self):
+        """Liczba wierszy outboxu wg statusu (zapytanie do bazy)."""
+        with self._get_app().app_context():
+            return dict(db.session.execute(
+                select(Notification.status, func.count(Notification.id)).group_by(Notification.status)
+            ).all())
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = {
+                'claimed': self.claimed,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'retried': self.retried,
+                'suppressed': self.suppressed,
+                'deferred': self.deferred,
+                'replayed': self.replayed,
+            }
+        with self._results_lock:
+            stats['unflushed_results'] = len(self._results)
+        try:
+            stats['backlog'] = self.get_backlog()
+        except Exception as e:
+            stats['backlog'] = {'error': str(e)}
+        return stats
+
+    def stop(self):
+        self.is_running = False
+        self._wake.set()
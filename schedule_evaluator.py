@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DAY_SECONDS = 24 * 3600
+
+
+def _parse_time(value, day, allow_end_of_day=False):
+    """'HH:MM' -> sekundy od północy ('24:00' dozwolone tylko jako koniec okna)."""
+    try:
+        hours, minutes = str(value).split(':')
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time format for {day}: {value!r}")
+    if not (0 <= minutes < 60) or not (0 <= hours < 24 or (allow_end_of_day and hours == 24 and minutes == 0)):
+        raise ValueError(f"Invalid time format for {day}: {value!r}")
+    return hours * 3600 + minutes * 60
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _compile_day(config, day):
+    """
+    Kompiluje konfigurację dnia do listy przedziałów [start, end) w sekundach od północy.
+
+    Dzień ma pola enabled, start, end albo listę windows [{start, end}, ...].
+    Okno z end < start obejmuje początek i koniec tego samego dnia
+    (00:00-end oraz start-24:00) - tak jak dotychczasowe sprawdzanie harmonogramu.
+    """
+    if not isinstance(config, dict) or 'enabled' not in config:
+        raise ValueError(f"Invalid config for {day}")
+    windows = config.get('windows')
+    if windows is None:
+        if 'start' not in config or 'end' not in config:
+            raise ValueError(f"Invalid config for {day}")
+        windows = [{'start': config['start'], 'end': config['end']}]
+    elif not isinstance(windows, list):
+        raise ValueError(f"Invalid config for {day}")
+
+    intervals = []
+    for window in windows:
+        if not isinstance(window, dict) or 'start' not in window or 'end' not in window:
+            raise ValueError(f"Invalid config for {day}")
+        start = _parse_time(window['start'], day)
+        end = _parse_time(window['end'], day, allow_end_of_day=True)
+        if end < start:
+            intervals.extend([(0, end), (start, DAY_SECONDS)])
+        elif end > start:
+            intervals.append((start, end))
+    return _merge(intervals) if config.get('enabled', False) else []
+
+
+class CompiledSchedule:
+    """
+    Skompilowany harmonogram pracy kamery.
+
+    Tygodniowa tabela przedziałów (lista [start, end) na dzień tygodnia) oraz
+    wyjątki dla konkretnych dat (święta, dni z innymi godzinami). Sprawdzenie
+    to przeszukanie kilku przedziałów bez parsowania napisów; next_transition
+    wyznacza najbliższą zmianę stanu, do której wątek kamery może spać.
+    """
+
+    def __init__(self, days, exceptions=None):
+        self.days = days
+        self.exceptions = exceptions or {}
+
+    @classmethod
+    def compile(cls, schedule):
+        """
+        Kompiluje harmonogram z ustawień (walidując go).
+
+        Args:
+            schedule: Słownik {dzień: {enabled, start, end | windows}}, opcjonalnie
+                      'holidays': [{date: 'YYYY-MM-DD', enabled, start, end | windows}]
+                      (wyjątek bez godzin lub z enabled=False wyłącza kamerę na cały dzień)
+
+        Returns:
+            CompiledSchedule
+
+        Raises:
+            ValueError: Jeśli harmonogram jest niepoprawny
+        """
+        if not schedule:
+            return cls([[] for _ in DAYS])
+        days = []
+        for day in DAYS:
+            if day not in schedule:
+                raise ValueError(f"Missing day in schedule: {day}")
+            days.append(_compile_day(schedule[day], day))
+
+        exceptions = {}
+        for holiday in schedule.get('holidays') or []:
+            try:
+                holiday_date = date.fromisoformat(holiday['date'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Invalid holiday date: {holiday!r}")
+            label = f"holiday {holiday_date.isoformat()}"
+            if holiday.get('enabled', False) and ('windows' in holiday or 'start' in holiday):
+                exceptions[holiday_date] = _compile_day(holiday, label)
+            else:
+                exceptions[holiday_date] = []
+        return cls(days, exceptions)
+
+    def intervals_for(self, day):
+        """Przedziały [start, end) (sekundy od północy) obowiązujące danego dnia."""
+        intervals = self.exceptions.get(day)
+        return intervals if intervals is not None else self.days[day.weekday()]
+
+    def is_within(self, now=None):
+        now = now or datetime.now()
+        seconds = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+        for start, end in self.intervals_for(now.date()):
+            if start <= seconds < end:
+                return True
+        return False
+
+    def next_transition(self, now=None, horizon_days=14):
+        """
+        Najbliższa chwila, w której zmieni się wynik is_within.
+
+        Returns:
+            datetime lub None, jeśli w horyzoncie nie ma zmiany
+        """
+        now = now or datetime.now()
+        current = self.is_within(now)
+        midnight = datetime.combine(now.date(), datetime.min.time())
+        for offset in range(horizon_days + 1):
+            day_start = midnight + timedelta(days=offset)
+            boundaries = {0}
+            for start, end in self.intervals_for(day_start.date()):
+                boundaries.update((start, end))
+            for seconds in sorted(boundaries):
+                candidate = day_start + timedelta(seconds=seconds)
+                if candidate > now and self.is_within(candidate) != current:
+                    return candidate
+        return None
+
+    def describe(self):
+        """Skompilowana tabela dla API (HH:MM)."""
+        def fmt(seconds):
+            return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}"
+        return {
+            'weekly': {day: [[fmt(s), fmt(e)] for s, e in intervals] for day, intervals in zip(DAYS, self.days)},
+            'exceptions': {d.isoformat(): [[fmt(s), fmt(e)] for s, e in intervals]
+                           for d, intervals in sorted(self.exceptions.items())},
+        }
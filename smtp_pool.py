@@ -0,0 +1,214 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from queue import LifoQueue, Empty
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# 421 = serwer zamyka połączenie (np. "421 4.4.2 Timeout"); smtplib zgłasza je jako SMTPSenderRefused itp.
+SERVICE_CLOSING = 421
+
+
+def _is_dropped(error):
+    """Czy błąd oznacza zerwaną sesję (warto połączyć się ponownie i wysłać jeszcze raz)."""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == SERVICE_CLOSING
+    return isinstance(error, RECONNECT_ERRORS)
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class _Session:
+    __slots__ = ('smtp', 'last_used', 'messages_sent')
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.messages_sent = 0
+
+
+class SMTPPool:
+    """
+    Pula utrzymywanych, zalogowanych sesji SMTP.
+
+    Zamiast pełnego TCP + TLS + AUTH przy każdym alercie, sesje są używane
+    ponownie. Wątek heartbeat wysyła NOOP do bezczynnych sesji i zamyka te,
+    które są bezczynne dłużej niż max_idle. Zerwana sesja jest transparentnie
+    odtwarzana, a wiadomość wysyłana ponownie (jednokrotnie).
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=True, starttls=False,
+                 size=1, noop_interval=60.0, max_idle=600.0, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.size = size
+        self.noop_interval = noop_interval
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._stats_lock = threading.Lock()
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.messages_sent = 0
+        self.heartbeats = 0
+
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='smtp-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    @classmethod
+    def from_env(cls, username, password):
+        return cls(
+            host=os.getenv('EMAIL_SMTP_HOST', 'smtp.gmail.com'),
+            port=int(os.getenv('EMAIL_SMTP_PORT', '465')),
+            username=username,
+            password=password,
+            use_ssl=_env_bool('EMAIL_SMTP_SSL', True),
+            starttls=_env_bool('EMAIL_SMTP_STARTTLS'),
+            size=int(os.getenv('EMAIL_SMTP_POOL_SIZE', '1')),
+            noop_interval=float(os.getenv('EMAIL_SMTP_NOOP_INTERVAL', '60')),
+            max_idle=float(os.getenv('EMAIL_SMTP_MAX_IDLE', '600'))
+        )
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        with self._stats_lock:
+            self.connections_opened += 1
+        return _Session(smtp)
+
+    @staticmethod
+    def _close(session):
+        try:
+            session.smtp.quit()
+        except Exception:
+            try:
+                session.smtp.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(session):
+        try:
+            return session.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    session = self._idle.get_nowait()
+                except Empty:
+                    return self._connect()
+                idle_for = time.monotonic() - session.last_used
+                if idle_for > self.max_idle:
+                    self._close(session)
+                    continue
+                if idle_for > self.noop_interval and not self._is_alive(session):
+                    self._close(session)
+                    continue
+                return session
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, session, healthy=True):
+        if healthy and not self._stop.is_set():
+            session.last_used = time.monotonic()
+            self._idle.put(session)
+        else:
+            self._close(session)
+        self._slots.release()
+
+    def _send_one(self, session, message):
+        try:
+            session.smtp.send_message(message)
+        except (smtplib.SMTPResponseException,) + RECONNECT_ERRORS as e:
+            if not _is_dropped(e):
+                raise
+            logger.info(f"SMTP session dropped ({e}) - reconnecting")
+            self._close(session)
+            fresh = self._connect()
+            session.smtp = fresh.smtp
+            with self._stats_lock:
+                self.reconnects += 1
+            session.smtp.send_message(message)
+        session.messages_sent += 1
+        with self._stats_lock:
+            self.messages_sent += 1
+
+    def send(self, message):
+        """Wysyła jedną wiadomość (email.message.Message) przez sesję z puli."""
+        self.send_many([message])
+
+    def send_many(self, messages):
+        """Wysyła kilka wiadomości przez jedną sesję."""
+        session = self._acquire()
+        healthy = False
+        try:
+            for message in messages:
+                self._send_one(session, message)
+            healthy = True
+        finally:
+            self._release(session, healthy)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.noop_interval):
+            survivors = []
+            while True:
+                try:
+                    session = self._idle.get_nowait()
+                except Empty:
+                    break
+                if time.monotonic() - session.last_used > self.max_idle or not self._is_alive(session):
+                    self._close(session)
+                    continue
+                with self._stats_lock:
+                    self.heartbeats += 1
+                survivors.append(session)
+            for session in reversed(survivors):
+                self._idle.put(session)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'host': self.host,
+                'pool_size': self.size,
+                'idle_sessions': self._idle.qsize(),
+                'connections_opened': self.connections_opened,
+                'reconnects': self.reconnects,
+                'messages_sent': self.messages_sent,
+                'heartbeats': self.heartbeats,
+            }
+
+    def close(self):
+        self._stop.set()
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except Empty:
+                break
+            self._close(session)
@@ -42,7 +42,7 @@ import {
   Area,
   AreaChart,
 } from 'recharts';
-import { dashboardAPI, DashboardStats } from '../services/api';
+import { dashboardAPI, DashboardStats, subscribeEvents } from '../services/api';
 import { handleDownloadImage } from '../utils/download';
 
 interface KPICardProps {
@@ -170,8 +170,24 @@ const Dashboard: React.FC = () => {
     };
     fetchChart();
     
-    const interval = setInterval(fetchData, 30000);
-    return () => clearInterval(interval);
+    const unsubscribe = subscribeEvents({
+      detection: (detection) => setStats((prev) => prev && {
+        ...prev,
+        recent_detections: [detection, ...prev.recent_detections.filter((d) => d.id !== detection.id)].slice(0, 5),
+      }),
+      stats: (delta) => setStats((prev) => prev && {
+        ...prev,
+        total_detections: delta.total_detections ?? prev.total_detections + delta.added,
+        today_detections: delta.today_detections ?? prev.today_detections + delta.added,
+      }),
+      status: (status) => setStats((prev) => prev && {
+        ...prev,
+        camera_status: status.is_running ? 'Online' : 'Offline',
+      }),
+      deleted: () => fetchData(),
+      reset: () => fetchData(),
+    });
+    return unsubscribe;
   }, []);
 
   if (loading && !stats) {
@@ -43,7 +43,7 @@ import {
   NavigateNext,
 } from '@mui/icons-material';
 import { DataGrid, GridColDef, GridRenderCellParams } from '@mui/x-data-grid';
-import { detectionAPI, Detection } from '../services/api';
+import { detectionAPI, Detection, subscribeEvents } from '../services/api';
 import { handleDownloadImage } from '../utils/download';
 
 const Detections: React.FC = () => {
@@ -67,10 +67,16 @@ const Detections: React.FC = () => {
 
   useEffect(() => {
     fetchDetections();
-    const intervalId = setInterval(() => {
-      fetchDetections();
-    }, 20000);
-    return () => clearInterval(intervalId);
+    const unsubscribe = subscribeEvents({
+      detection: (detection) => {
+        if (page === 1) {
+          setDetections((prev) => [detection, ...prev.filter((d) => d.id !== detection.id)].slice(0, 20));
+        }
+      },
+      deleted: ({ ids }) => setDetections((prev) => prev.filter((d) => !ids.includes(d.id))),
+      reset: () => fetchDetections(),
+    });
+    return unsubscribe;
   }, [page]);
 
   const fetchDetections = async () => {
@@ -254,7 +260,7 @@ const Detections: React.FC = () => {
               <CardMedia
                 component="img"
                 height="180"
-                image={getImageUrl(detection.image_path)}
+                image={getImageUrl(detection.thumbnails?.['320'] ?? detection.image_path)}
                 alt={`Detection ${detection.id}`}
                 sx={{
                   objectFit: 'cover',
@@ -542,6 +548,14 @@ const Detections: React.FC = () => {
                 Usuń zaznaczone ({selectedDetections.size})
               </Button>
             )}
+            <Button
+              variant="outlined"
+              size="small"
+              startIcon={<Download />}
+              href={detectionAPI.exportUrl('csv')}
+            >
+              Eksport CSV
+            </Button>
             <TextField
               size="small"
               placeholder="Search detections..."
@@ -70,7 +70,10 @@ export interface Detection {
   location: string;
   confidence: number;
   image_path: string;
+  clip_path?: string | null;
   status: string;
+  // Miniatury (rozmiar w px -> ścieżka względem /detections/), null gdy jeszcze nie wygenerowane
+  thumbnails?: Record<string, string> | null;
 }
 
 export interface PaginatedDetectionsResponse {
@@ -81,6 +84,26 @@ export interface PaginatedDetectionsResponse {
   has_prev: boolean;
 }
 
+export interface CursorDetectionsResponse {
+  detections: Detection[];
+  next_cursor: string | null;
+  prev_cursor: string | null;
+  has_next: boolean;
+  has_prev: boolean;
+  total_approx?: number;
+}
+
+export interface DetectionFilters {
+  from?: string;
+  to?: string;
+  location?: string;
+  min_confidence?: number;
+  status?: string;
+  fields?: string;
+}
+
+export type ExportFormat = 'ndjson' | 'csv' | 'zip';
+
 export const detectionAPI = {
   getAll: async (page: number = 1, perPage: number = 20): Promise<PaginatedDetectionsResponse> => {
     const response = await api.get<PaginatedDetectionsResponse>('/api/detections', {
@@ -89,6 +112,14 @@ export const detectionAPI = {
     return response.data;
   },
   
+  getPage: async (cursor: string | null = null, limit: number = 20, includeTotal: boolean = false,
+                  filters: DetectionFilters = {}): Promise<CursorDetectionsResponse> => {
+    const response = await api.get<CursorDetectionsResponse>('/api/detections', {
+      params: { ...filters, cursor: cursor ?? '', limit, include_total: includeTotal }
+    });
+    return response.data;
+  },
+  
   getById: async (id: number): Promise<Detection> => {
     const response = await api.get<Detection>(`/api/detections/${id}`);
     return response.data;
@@ -106,6 +137,14 @@ export const detectionAPI = {
     return response.data;
   },
   
+  exportUrl: (format: ExportFormat = 'csv', filters: DetectionFilters = {}): string => {
+    const params = new URLSearchParams({ format });
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') params.append(key, String(value));
+    });
+    return `${API_BASE_URL}/api/detections/export?${params.toString()}`;
+  },
+  
   downloadImage: async (imagePath: string) => {
     const response = await api.get(`/detections/${imagePath}`, {
       responseType: 'blob',
@@ -128,11 +167,43 @@ export interface DashboardStats {
   recent_detections: Detection[];
 }
 
+export type RollupGranularity = 'hour' | 'day' | 'week' | 'month';
+
+export interface RollupPoint {
+  bucket: string;
+  count: number;
+  avg_confidence: number | null;
+  max_confidence: number | null;
+  zones?: Record<string, number>;
+}
+
+export interface RollupResponse {
+  granularity: RollupGranularity;
+  from: string;
+  to: string;
+  total: number;
+  series: RollupPoint[];
+}
+
+export interface RollupQuery {
+  from?: string;
+  to?: string;
+  granularity?: RollupGranularity;
+  location?: string;
+  camera?: string;
+  group_by?: 'zone';
+}
+
 export const dashboardAPI = {
   getStats: async (): Promise<DashboardStats> => {
     const response = await api.get<DashboardStats>('/api/dashboard-stats');
     return response.data;
   },
+
+  getRollup: async (query: RollupQuery = {}): Promise<RollupResponse> => {
+    const response = await api.get<RollupResponse>('/api/stats/rollup', { params: query });
+    return response.data;
+  },
 };
 
 
@@ -252,5 +323,38 @@ export const settingsAPI = {
   },
 };
 
+export interface StatsEvent {
+  added: number;
+  total_detections: number | null;
+  today_detections: number | null;
+}
+
+export interface CameraStatusEvent {
+  is_running: boolean;
+  within_schedule: boolean | null;
+  next_transition: string | null;
+}
+
+export interface LiveEventHandlers {
+  detection?: (detection: Detection) => void;
+  stats?: (stats: StatsEvent) => void;
+  status?: (status: CameraStatusEvent) => void;
+  deleted?: (payload: { ids: number[] }) => void;
+  reset?: () => void;
+}
+
+// Server-Sent Events z /api/events; przeglądarka sama wznawia połączenie z Last-Event-ID.
+// Zwraca funkcję zamykającą połączenie.
+export const subscribeEvents = (handlers: LiveEventHandlers): (() => void) => {
+  const source = new EventSource(`${API_BASE_URL}/api/events`, { withCredentials: true });
+  (Object.keys(handlers) as Array<keyof LiveEventHandlers>).forEach((type) => {
+    source.addEventListener(type, (event) => {
+      const handler = handlers[type] as ((data: any) => void) | undefined;
+      handler?.(JSON.parse((event as MessageEvent).data));
+    });
+  });
+  return () => source.close();
+};
+
 export default api;
 
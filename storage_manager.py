@@ -0,0 +1,435 @@
+"""
+Cykl życia plików mediów detekcji (obrazy, klipy).
+
+Indeks plików (tabela stored_file) wypełniany jest przez DetectionWriter
+w tej samej transakcji co detekcja, więc GC nie przegląda katalogów:
+- pliki, których detekcja została usunięta, kasowane są w tle (sieroty),
+- retencja wg wieku i łącznego rozmiaru usuwa najstarsze pliki
+  (wiersz detekcji zostaje, bez image_path/clip_path - statystyki i agregaty bez zmian),
+- opcjonalnie starsze obrazy są ponownie kompresowane z niższą jakością.
+
+Jednorazowe zbudowanie indeksu dla istniejących plików:
+    python storage_manager.py --reindex
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select, update
+
+from models import db, Detection, StoredFile
+
+logger = logging.getLogger(__name__)
+
+KIND_IMAGE = 'image'
+KIND_CLIP = 'clip'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.webp', '.png')
+CLIP_EXTENSIONS = ('.mp4',)
+
+DEFAULT_MEDIA_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detections')
+
+
+def get_media_root():
+    """
+    Katalog mediów detekcji wspólny dla zapisu, indeksu, miniatur, klipów, GC i API.
+
+    Returns:
+        Ścieżka absolutna z DETECTION_MEDIA_ROOT (domyślnie detections obok aplikacji)
+    """
+    return os.path.abspath(os.getenv('DETECTION_MEDIA_ROOT') or DEFAULT_MEDIA_ROOT)
+
+
+def index_row(root, path, kind, detection_id, created_at=None):
+    """
+    Wiersz indeksu dla zapisanego pliku (rozmiar z os.stat) lub None, jeśli pliku nie ma.
+
+    Args:
+        root: Katalog detections
+        path: Ścieżka względem root (jak Detection.image_path / clip_path)
+        kind: KIND_IMAGE lub KIND_CLIP
+        detection_id: Id detekcji, do której należy plik
+        created_at: Czas utworzenia (naiwny UTC), domyślnie teraz
+    """
+    try:
+        size = os.stat(os.path.join(root, path)).st_size
+    except OSError:
+        return None
+    return {'path': path, 'kind': kind, 'bytes': size, 'created_at': created_at or datetime.utcnow(),
+            'detection_id': detection_id, 'recompressed': False}
+
+
+def _env_gb(name):
+    value = float(os.getenv(name, '0') or 0)
+    return int(value * 1024 ** 3)
+
+
+class StorageManager(threading.Thread):
+    """
+    Wątek GC plików mediów.
+
+    Cykl (co interval sekund lub po wake(), np. po usunięciu detekcji):
+    sieroty -> retencja wiek -> limit bajtów -> rekompresja. Każdy krok to
+    zapytania po indeksie stored_file i przetwarzanie partiami po batch_size.
+    """
+
+    def __init__(self, root='detections', thumbnails=None, interval=3600.0, retention_days=0, max_bytes=0,
+                 recompress_after_days=0, recompress_quality=60, orphan_grace=3600.0, batch_size=500):
+        super().__init__(daemon=True, name='storage-manager')
+        self.root = root
+        self.thumbnails = thumbnails
+        self.interval = interval
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.recompress_after_days = recompress_after_days
+        self.recompress_quality = recompress_quality
+        self.orphan_grace = orphan_grace
+        self.batch_size = batch_size
+        self.is_running = True
+
+        self._app = None
+        self._wake = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.reclaimed_bytes = 0
+        self.files_deleted = 0
+        self.files_recompressed = 0
+        self.last_run = None
+
+    @classmethod
+    def from_env(cls, root=None, thumbnails=None):
+        return cls(
+            root=root or get_media_root(),
+            thumbnails=thumbnails,
+            interval=float(os.getenv('STORAGE_GC_INTERVAL', '3600')),
+            retention_days=int(os.getenv('STORAGE_RETENTION_DAYS', '0')),
+            max_bytes=_env_gb('STORAGE_MAX_GB'),
+            recompress_after_days=int(os.getenv('STORAGE_RECOMPRESS_AFTER_DAYS', '0')),
+            recompress_quality=int(os.getenv('STORAGE_RECOMPRESS_QUALITY', '60')),
+            orphan_grace=float(os.getenv('STORAGE_ORPHAN_GRACE', '3600'))
+        )
+
+    def init_app(self, app):
+        """Ustawia instancję Flask (bez tego _get_app importuje moduł app)."""
+        self._app = app
+
+    def _get_app(self):
+        if self._app is None:
+            from app import app
+            self._app = app
+        return self._app
+
+    def wake(self):
+        """Uruchamia cykl GC w tle (np. po usunięciu detekcji)."""
+        self._wake.set()
+
+    def _remove_files(self, rows):
+        """Usuwa pliki z dysku (i miniatury obrazów); zwraca liczbę zwolnionych bajtów."""
+        freed = 0
+        for row in rows:
+            try:
+                os.remove(os.path.join(self.root, row.path))
+                freed += row.bytes
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Cannot remove {row.path}: {e}")
+            if row.kind == KIND_IMAGE and self.thumbnails is not None:
+                self.thumbnails.remove(row.path)
+        return freed
+
+    def _drop(self, rows, detach):
+        """Usuwa pliki i ich wiersze indeksu; detach=True czyści też ścieżkę w Detection."""
+        if not rows:
+            return 0
+        if detach:
+            for kind, column in ((KIND_IMAGE, 'image_path'), (KIND_CLIP, 'clip_path')):
+                ids = [row.detection_id for row in rows if row.kind == kind and row.detection_id is not None]
+                if ids:
+                    db.session.execute(update(Detection).where(Detection.id.in_(ids)).values({column: None}))
+        db.session.execute(delete(StoredFile).where(StoredFile.id.in_([row.id for row in rows])))
+        db.session.commit()
+        # Pliki znikają dopiero po commicie - przerwany cykl zostawia co najwyżej plik bez wiersza
+        return self._remove_files(rows)
+
+    def _file_columns(self):
+        return select(StoredFile.id, StoredFile.path, StoredFile.kind, StoredFile.bytes, StoredFile.detection_id)
+
+    def _collect_orphans(self):
+        grace_cutoff = datetime.utcnow() - timedelta(seconds=self.orphan_grace)
+        statement = (
+            self._file_columns()
+            .outerjoin(Detection, Detection.id == StoredFile.detection_id)
+            .where(Detection.id.is_(None),
+                   or_(StoredFile.detection_id.isnot(None), StoredFile.created_at < grace_cutoff))
+            .limit(self.batch_size)
+        )
+        count = freed = 0
+        while True:
+            rows = db.session.execute(statement).all()
+            if not rows:
+                return count, freed
+            freed += self._drop(rows, detach=False)
+            count += len(rows)
+
+    def _expire_by_age(self):
+        if not self.retention_days:
+            return 0, 0
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        statement = self._file_columns().where(StoredFile.created_at < cutoff).order_by(
+            StoredFile.created_at, StoredFile.id).limit(self.batch_size)
+        count = freed = 0
+        while True:
+            rows = db.session.execute(statement).all()
+            if not rows:
+                return count, freed
+            freed += self._drop(rows, detach=True)
+            count += len(rows)
+
+    def total_bytes(self):
+        """Łączny rozmiar plików w indeksie (SUM po stored_file, bez przeglądania dysku)."""
+        return db.session.execute(select(func.coalesce(func.sum(StoredFile.bytes), 0))).scalar_one()
+
+    def _enforce_budget(self):
+        if not self.max_bytes:
+            return 0, 0
+        excess = self.total_bytes() - self.max_bytes
+        statement = self._file_columns().order_by(StoredFile.created_at, StoredFile.id).limit(self.batch_size)
+        count = freed = 0
+        while excess > 0:
+            rows = db.session.execute(statement).all()
+            if not rows:
+                break
+            selected = []
+            for row in rows:
+                if excess <= 0:
+                    break
+                selected.append(row)
+                excess -= row.bytes
+            freed += self._drop(selected, detach=True)
+            count += len(selected)
+        return count, freed
+
+    def _recompress_one(self, row):
+        path = os.path.join(self.root, row.path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Cannot decode {row.path}")
+        extension = os.path.splitext(row.path)[1].lower()
+        if extension == '.webp':
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.recompress_quality]
+        elif extension in ('.jpg', '.jpeg'):
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.recompress_quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        else:
+            return 0
+        success, buffer = cv2.imencode(extension, image, params)
+        if not success or len(buffer) >= len(data):
+            return 0
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer)
+        os.replace(tmp_path, path)
+        if self.thumbnails is not None:
+            # Nowa treść = nowy skrót, więc miniatury dostają nowe adresy
+            self.thumbnails.generate(row.path, buffer.tobytes(), image)
+        return len(data) - len(buffer)
+
+    def _recompress(self):
+        if not self.recompress_after_days:
+            return 0, 0
+        cutoff = datetime.utcnow() - timedelta(days=self.recompress_after_days)
+        statement = self._file_columns().where(
+            StoredFile.kind == KIND_IMAGE, StoredFile.recompressed.is_(False), StoredFile.created_at < cutoff
+        ).order_by(StoredFile.created_at, StoredFile.id).limit(self.batch_size)
+        count = saved = 0
+        while self.is_running:
+            rows = db.session.execute(statement).all()
+            if not rows:
+                break
+            for row in rows:
+                try:
+                    reduced = self._recompress_one(row)
+                except FileNotFoundError:
+                    reduced = 0
+                except Exception as e:
+                    logger.error(f"Recompression failed for {row.path}: {e}")
+                    reduced = 0
+                db.session.execute(update(StoredFile).where(StoredFile.id == row.id).values(
+                    recompressed=True, bytes=StoredFile.bytes - reduced
+                ))
+                if reduced:
+                    count += 1
+                    saved += reduced
+            db.session.commit()
+        return count, saved
+
+    def collect(self):
+        """
+        Jeden cykl GC (wymaga kontekstu aplikacji).
+
+        Returns:
+            Raport: liczby plików i odzyskane bajty dla każdego kroku
+        """
+        start = time.perf_counter()
+        try:
+            orphans, orphan_bytes = self._collect_orphans()
+            expired, expired_bytes = self._expire_by_age()
+            evicted, evicted_bytes = self._enforce_budget()
+            recompressed, recompressed_bytes = self._recompress()
+            total = self.total_bytes()
+        except Exception:
+            db.session.rollback()
+            raise
+        reclaimed = orphan_bytes + expired_bytes + evicted_bytes + recompressed_bytes
+        report = {
+            'orphans': orphans,
+            'expired': expired,
+            'evicted': evicted,
+            'recompressed': recompressed,
+            'reclaimed_bytes': reclaimed,
+            'total_bytes': total,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            'finished_at': datetime.utcnow().isoformat(),
+        }
+        with self._stats_lock:
+            self.runs += 1
+            self.reclaimed_bytes += reclaimed
+            self.files_deleted += orphans + expired + evicted
+            self.files_recompressed += recompressed
+            self.last_run = report
+        if reclaimed:
+            print(f"🧹 GC mediów: {orphans} sierot, {expired} po terminie, {evicted} ponad limit, "
+                  f"{recompressed} przekompresowanych - odzyskano {reclaimed / 1024 ** 2:.1f} MB")
+        return report
+
+    def run(self):
+        # Pierwszy cykl po starcie bez czekania na interval (zaległe sieroty, retencja)
+        self._wake.set()
+        while self.is_running:
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+            if not self.is_running:
+                break
+            try:
+                with self._get_app().app_context():
+                    self.collect()
+            except Exception as e:
+                logger.error(f"Storage GC error: {e}")
+                with self._stats_lock:
+                    self.failures += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'runs': self.runs,
+                'failures': self.failures,
+                'reclaimed_bytes': self.reclaimed_bytes,
+                'files_deleted': self.files_deleted,
+                'files_recompressed': self.files_recompressed,
+                'retention_days': self.retention_days or None,
+                'max_bytes': self.max_bytes or None,
+                'last_run': dict(self.last_run) if self.last_run else None,
+            }
+
+    def stop(self):
+        self.is_running = False
+        self._wake.set()
+
+
+def reindex(session, root='detections', chunk=1000):
+    """
+    Buduje indeks stored_file od nowa na podstawie plików w katalogu i wierszy Detection.
+
+    Jedyne przeglądanie katalogu - potem indeks utrzymuje DetectionWriter.
+    Pliki bez detekcji trafiają do indeksu bez detection_id i zostaną usunięte
+    przez GC po okresie karencji (liczonym od czasu modyfikacji pliku).
+
+    Returns:
+        {'files', 'bytes', 'unreferenced'}
+    """
+    references = {}
+    result = session.execute(
+        select(Detection.id, Detection.timestamp, Detection.image_path, Detection.clip_path)
+        .execution_options(yield_per=chunk)
+    )
+    for detection_id, timestamp, image_path, clip_path in result:
+        if image_path:
+            references[os.path.basename(image_path)] = (detection_id, timestamp)
+        if clip_path:
+            references[clip_path] = (detection_id, timestamp)
+
+    candidates = []
+    clips_dir = os.path.join(root, 'clips')
+    for directory, prefix, kind, extensions in ((root, '', KIND_IMAGE, IMAGE_EXTENSIONS),
+                                                (clips_dir, 'clips/', KIND_CLIP, CLIP_EXTENSIONS)):
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(extensions):
+                    candidates.append((prefix + entry.name, kind, entry.stat()))
+
+    rows = []
+    unreferenced = 0
+    for path, kind, stat in candidates:
+        detection_id, created_at = references.get(path, (None, None))
+        if detection_id is None:
+            unreferenced += 1
+            created_at = datetime.utcfromtimestamp(stat.st_mtime)
+        rows.append({'path': path, 'kind': kind, 'bytes': stat.st_size, 'created_at': created_at,
+                     'detection_id': detection_id, 'recompressed': False})
+    try:
+        session.execute(delete(StoredFile))
+        for offset in range(0, len(rows), chunk):
+            session.execute(insert(StoredFile), rows[offset:offset + chunk])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return {'files': len(rows), 'bytes': sum(row['bytes'] for row in rows), 'unreferenced': unreferenced}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Indeks i GC plików mediów detekcji')
+    parser.add_argument('--reindex', action='store_true', help='zbuduj indeks stored_file z plików na dysku')
+    parser.add_argument('--gc', action='store_true', help='wykonaj jeden cykl GC (ustawienia STORAGE_* z .env)')
+    parser.add_argument('--dir', help='katalog mediów detekcji (domyślnie DETECTION_MEDIA_ROOT)')
+    args = parser.parse_args()
+    if not args.reindex and not args.gc:
+        parser.print_help()
+        return 1
+
+    from dotenv import load_dotenv
+    from flask import Flask
+    from db_config import DatabaseConfig
+    from thumbnail_store import ThumbnailStore
+
+    load_dotenv()
+    args.dir = args.dir or get_media_root()
+    app = Flask(__name__)
+    DatabaseConfig.from_env().init_app(app, db)
+
+    with app.app_context():
+        if args.reindex:
+            result = reindex(db.session, args.dir)
+            print(f"✅ Zindeksowano {result['files']} plików ({result['bytes'] / 1024 ** 2:.1f} MB), "
+                  f"bez detekcji: {result['unreferenced']}")
+        if args.gc:
+            manager = StorageManager.from_env(args.dir, ThumbnailStore.from_env(os.path.join(args.dir, 'thumbs')))
+            report = manager.collect()
+            print(f"✅ GC: {report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('captured', 'anonymized', 'stored', 'notified')
+STAGE_CAPTURED, STAGE_ANONYMIZED, STAGE_STORED, STAGE_NOTIFIED = range(len(STAGES))
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'detection_tasks.db')
+
+
+class TaskJournal:
+    """
+    Trwała kolejka zadań detekcji (lokalna tabela SQLite).
+
+    Każde zadanie ma etap: captured -> anonymized -> stored -> notified.
+    Etapy tylko rosną, więc po restarcie zadanie wznawiane jest od miejsca,
+    w którym się zatrzymało (at-least-once). Powiadomienie oznaczane jest
+    osobną flagą - jeśli wyprzedzi zapis do bazy, nie zostanie powtórzone.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS detection_task (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filepath TEXT NOT NULL UNIQUE,
+                stage INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'captured',
+                notified INTEGER NOT NULL DEFAULT 0,
+                detection_id INTEGER,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_detection_task_stage ON detection_task (stage)')
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('TASK_JOURNAL_PATH', DEFAULT_JOURNAL_PATH))
+
+    def record(self, task_data):
+        """
+        Zapisuje nowe zadanie (etap captured).
+
+        Returns:
+            id zadania w dzienniku
+
+        Raises:
+            ValueError: Jeśli zadanie dla tego pliku już istnieje (nazwy plików muszą być unikalne)
+        """
+        timestamp = task_data.get('timestamp')
+        payload = json.dumps({
+            'confidence': task_data.get('confidence', 0.0),
+            'zone_name': task_data.get('zone_name'),
+            'should_blur': task_data.get('should_blur', True),
+            'phone_box': task_data.get('phone_box'),
+            'zone_box': task_data.get('zone_box'),
+            'timestamp': timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        })
+        now = time.time()
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    'INSERT INTO detection_task (filepath, payload, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                    (task_data['filepath'], payload, now, now)
+                )
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"Task for {task_data['filepath']} already recorded") from e
+        return cursor.lastrowid
+
+    def _advance(self, task_id, stage, detection_id=None, notified=False):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT stage, notified, detection_id FROM detection_task WHERE id = ?', (task_id,)
+            ).fetchone()
+            if row is None:
+                return
+            new_stage = max(row['stage'], stage)
+            is_notified = bool(row['notified']) or notified
+            if is_notified and new_stage >= STAGE_STORED:
+                new_stage = STAGE_NOTIFIED
+            self._conn.execute(
+                'UPDATE detection_task SET stage = ?, state = ?, notified = ?, detection_id = ?, updated_at = ? WHERE id = ?',
+                (new_stage, STAGES[new_stage], int(is_notified),
+                 detection_id if detection_id is not None else row['detection_id'],
+                 time.time(), task_id)
+            )
+
+    def mark_anonymized(self, task_id):
+        self._advance(task_id, STAGE_ANONYMIZED)
+
+    def mark_stored(self, task_id, detection_id):
+        self._advance(task_id, STAGE_STORED, detection_id=detection_id)
+
+    def mark_notified(self, task_id):
+        self._advance(task_id, STAGE_CAPTURED, notified=True)
+
+    def discard(self, task_id):
+        """Usuwa zadanie, którego nie da się dokończyć (np. brak pliku)."""
+        with self._lock:
+            self._conn.execute('DELETE FROM detection_task WHERE id = ?', (task_id,))
+
+    def pending(self):
+        """
+        Zwraca niedokończone zadania w formacie kolejki AnonymizerWorker
+        (z polami task_id, stage, notified, detection_id) i zwiększa licznik prób.
+
+        Zadania, których obrazu nie ma już na dysku, nie da się dokończyć -
+        są usuwane z dziennika i pomijane.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM detection_task WHERE stage < ? ORDER BY id', (STAGE_NOTIFIED,)
+            ).fetchall()
+            missing = [row for row in rows if not os.path.exists(row['filepath'])]
+            for row in missing:
+                logger.error(f"Recovered task {row['id']} has no image on disk: {row['filepath']} - discarding")
+            if missing:
+                self._conn.executemany('DELETE FROM detection_task WHERE id = ?', [(row['id'],) for row in missing])
+            if len(rows) > len(missing):
+                self._conn.execute(
+                    'UPDATE detection_task SET attempts = attempts + 1 WHERE stage < ?', (STAGE_NOTIFIED,)
+                )
+
+        tasks = []
+        skipped = {row['id'] for row in missing}
+        for row in rows:
+            if row['id'] in skipped:
+                continue
+            payload = json.loads(row['payload'])
+            timestamp = payload.get('timestamp')
+            tasks.append({
+                'task_id': row['id'],
+                'filepath': row['filepath'],
+                'stage': row['stage'],
+                'notified': bool(row['notified']),
+                'detection_id': row['detection_id'],
+                'attempts': row['attempts'] + 1,
+                'confidence': payload.get('confidence', 0.0),
+                'zone_name': payload.get('zone_name'),
+                'should_blur': payload.get('should_blur', True),
+                'phone_box': payload.get('phone_box'),
+                'zone_box': payload.get('zone_box'),
+                'timestamp': datetime.fromisoformat(timestamp) if timestamp else None,
+                'recovered': True,
+            })
+        return tasks
+
+    def purge_completed(self, older_than_seconds=86400):
+        """Usuwa zakończone zadania starsze niż podany wiek. Zwraca liczbę usuniętych wierszy."""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM detection_task WHERE stage = ? AND updated_at < ?', (STAGE_NOTIFIED, cutoff)
+            )
+        return cursor.rowcount
+
+    def get_stats(self):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT state, COUNT(*) AS count FROM detection_task GROUP BY state'
+            ).fetchall()
+        counts = {state: 0 for state in STAGES}
+        for row in rows:
+            counts[row['state']] = row['count']
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from flask import Flask
+
+from models import db
+
+
+@pytest.fixture
+def app():
+    """Aplikacja z bazą SQLite w pamięci i utworzonymi tabelami."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def session(app):
+    return db.session
+
+
+@pytest.fixture
+def warsaw_tz(monkeypatch):
+    """Czas lokalny Europe/Warsaw (zmiany czasu: 2026-03-29 i 2026-10-25)."""
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset unavailable on this platform')
+    monkeypatch.setenv('TZ', 'Europe/Warsaw')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from alert_digest import build_contact_sheet
+from detection_artifact import DetectionArtifact
+
+
+def _jpeg(width=640, height=480):
+    frame = np.full((height, width, 3), 200, dtype=np.uint8)
+    success, buffer = cv2.imencode('.jpg', frame)
+    assert success
+    return buffer.tobytes()
+
+
+def _event(artifact):
+    return {'artifact': artifact, 'location': 'ławka 1', 'time': datetime(2026, 3, 1, 9, 30), 'confidence': 0.8}
+
+
+def test_preview_is_regenerated_from_stored_image():
+    # Jak po restarcie: artefakt odtworzony z pliku, bez klatki
+    artifact = DetectionArtifact.from_encoded('phone_test.jpg', _jpeg(), 'image/jpeg')
+    assert artifact.preview is None
+
+    preview = artifact.ensure_preview(preview_max_dimension=320)
+
+    decoded = cv2.imdecode(np.frombuffer(preview, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert max(decoded.shape[:2]) == 320
+    assert (artifact.width, artifact.height) == (640, 480)
+    assert artifact.ensure_preview() is preview
+
+
+def test_undecodable_image_has_no_preview():
+    artifact = DetectionArtifact.from_encoded('phone_test.jpg', b'not a jpeg', 'image/jpeg')
+    assert artifact.ensure_preview() is None
+
+
+def test_contact_sheet_uses_artifacts_restored_without_preview():
+    events = [_event(DetectionArtifact.from_encoded(f'phone_{i}.jpg', _jpeg(), 'image/jpeg')) for i in range(3)]
+    events.append(_event(None))
+
+    sheet = build_contact_sheet(events, tile_width=160)
+
+    decoded = cv2.imdecode(np.frombuffer(sheet, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape[:2] == (2 * 90, 2 * 160)
+    assert decoded[:80, :160].mean() > 150  # kafelek wypełniony obrazem, nie czarne tło
+
+
+def test_contact_sheet_without_images_is_none():
+    assert build_contact_sheet([_event(None)]) is None
@@ -0,0 +1,54 @@
+import time
+
+from alert_throttle import AlertThrottle
+
+NOW = 1_000_000.0
+
+
+def test_channels_are_unlimited_by_default():
+    throttle = AlertThrottle()
+
+    assert all(throttle.allow_channel('sms', now=NOW + i) for i in range(500))
+    assert all(throttle.allow_channel('email', now=NOW + i) for i in range(500))
+
+    state = throttle.get_state()['channels']['sms']
+    assert state['limit_per_hour'] is None
+    assert state['suppressed'] == 0
+
+
+def test_env_caps_default_to_unlimited(monkeypatch):
+    monkeypatch.delenv('ALERT_SMS_PER_HOUR', raising=False)
+    monkeypatch.setenv('ALERT_EMAIL_PER_HOUR', '2')
+
+    throttle = AlertThrottle.from_env()
+
+    assert throttle.channel_per_hour == {'sms': 0, 'email': 2}
+
+
+def test_explicit_cap_suppresses_until_window_expires():
+    throttle = AlertThrottle(channel_per_hour={'sms': 2})
+
+    assert throttle.allow_channel('sms', now=NOW)
+    assert throttle.allow_channel('sms', now=NOW + 1)
+    assert not throttle.allow_channel('sms', now=NOW + 2)
+    assert throttle.allow_channel('sms', now=NOW + 3600)
+
+    assert throttle.get_state()['channels']['sms']['suppressed'] == 1
+    assert throttle.allow_channel('email', now=NOW)
+
+
+def test_reset_zone_unmutes_one_or_all_zones():
+    now = time.time()
+    throttle = AlertThrottle(zone_cooldown=300.0)
+    for zone in ('ławka 1', 'ławka 2'):
+        assert throttle.allow_zone(zone, now=now) == (True, None)
+        assert throttle.allow_zone(zone, now=now + 1) == (False, now + 300.0)
+
+    throttle.reset_zone('ławka 1')
+
+    zones = throttle.get_state()['zones']
+    assert 'ławka 1' not in zones and zones['ławka 2']['muted']
+    assert throttle.allow_zone('ławka 1', now=now + 2)[0]
+
+    throttle.reset_zone()
+    assert throttle.allow_zone('ławka 2', now=now + 3)[0]
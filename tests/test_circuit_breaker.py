@@ -0,0 +1,207 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+from upload_service import UploadBackend, UploadService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+def _breaker(**kwargs):
+    breaker = CircuitBreaker('stub', failure_threshold=kwargs.pop('failure_threshold', 3),
+                             reset_timeout=kwargs.pop('reset_timeout', 30.0))
+    changes = []
+    breaker.add_listener(lambda name, old, new: changes.append((old, new)))
+    return breaker, changes
+
+
+def test_breaker_cycles_closed_open_half_open_closed(clock):
+    breaker, changes = _breaker()
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure(RuntimeError('timeout'))
+    assert breaker.state == STATE_CLOSED
+
+    assert breaker.allow()
+    breaker.record_failure(RuntimeError('timeout'))
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    assert breaker.is_open()
+
+    clock.advance(30.0)
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow()          # jedno wywołanie próbne
+    assert not breaker.allow()      # kolejne czekają na wynik próby
+    breaker.record_success()
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow()
+    assert changes == [(STATE_CLOSED, STATE_OPEN), (STATE_OPEN, STATE_HALF_OPEN), (STATE_HALF_OPEN, STATE_CLOSED)]
+    state = breaker.get_state()
+    assert state['times_opened'] == 1
+    assert state['rejected'] == 2
+
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker, changes = _breaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure('down')
+
+    clock.advance(10.0)
+    assert breaker.allow()
+    breaker.record_failure('still down')
+
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    clock.advance(9.9)
+    assert breaker.is_open()
+    clock.advance(0.1)
+    assert breaker.state == STATE_HALF_OPEN
+    assert changes[-2:] == [(STATE_OPEN, STATE_HALF_OPEN), (STATE_HALF_OPEN, STATE_OPEN)]
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker, _ = _breaker(failure_threshold=2)
+    breaker.record_failure('a')
+    breaker.record_success()
+    breaker.record_failure('b')
+    assert breaker.state == STATE_CLOSED
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class StubBackend(UploadBackend):
+    """Backend bez sieci: liczy wywołania, może zawodzić lub wstrzymywać upload."""
+
+    name = 'stub'
+
+    def __init__(self):
+        self.calls = 0
+        self.keys = []
+        self.fail = False
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def upload(self, key, data, mimetype, filename):
+        self.calls += 1
+        self.keys.append(key)
+        self.gate.wait(5.0)
+        if self.fail:
+            raise ConnectionError('provider down')
+        return f'https://stub.invalid/{key}'
+
+
+class StubArtifact:
+    def __init__(self, data):
+        self.data = data
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.filename = 'phone_test.jpg'
+        self.mimetype = 'image/jpeg'
+
+
+@pytest.fixture
+def upload_service(tmp_path):
+    services = []
+
+    def _make(backend, **kwargs):
+        breaker = CircuitBreaker('stub', failure_threshold=1, reset_timeout=kwargs.pop('reset_timeout', 60.0))
+        service = UploadService(backend, spool_dir=str(tmp_path / 'spool'), workers=1, max_attempts=5,
+                                backoff_base=60.0, link_deadline=kwargs.pop('link_deadline', 5.0), breaker=breaker)
+        service.start()
+        services.append(service)
+        return service
+
+    yield _make
+    for service in services:
+        service.stop()
+
+
+def test_open_circuit_defers_upload_without_calling_backend(upload_service):
+    backend = StubBackend()
+    service = upload_service(backend)
+
+    backend.fail = True
+    service.submit(StubArtifact(b'first'))  # nieudany upload otwiera obwód, ponowienie za backoff
+    assert _wait_for(lambda: service.breaker.state == STATE_OPEN)
+    calls = backend.calls
+
+    start = time.monotonic()
+    link = service.submit(StubArtifact(b'second')).result(5.0)
+
+    assert link is None
+    assert time.monotonic() - start < 1.0   # fast-fail, bez czekania na link_deadline
+    assert backend.calls == calls
+    stats = service.get_stats()
+    assert stats['deferred'] == 1
+    assert stats['spooled'] == 2
+
+
+def test_closing_circuit_replays_deferred_uploads(upload_service):
+    backend = StubBackend()
+    service = upload_service(backend, reset_timeout=0.2)
+
+    backend.fail = True
+    service.submit(StubArtifact(b'first'))
+    assert _wait_for(lambda: service.breaker.get_state()['state'] == STATE_OPEN)
+    assert service.submit(StubArtifact(b'second')).result(5.0) is None
+    assert backend.calls == 1
+
+    # Po reset_timeout odłożony upload jest próbą; sukces zamyka obwód i odtwarza ponowienie pierwszego
+    backend.fail = False
+    assert _wait_for(lambda: service.get_stats()['spooled'] == 0)
+
+    stats = service.get_stats()
+    assert stats['spooled'] == 0
+    assert stats['succeeded'] == 2
+    assert service.breaker.state == STATE_CLOSED
+
+
+def test_deferred_upload_leaves_active_and_is_sent_once(upload_service):
+    backend = StubBackend()
+    service = upload_service(backend, reset_timeout=0.3)
+
+    backend.fail = True
+    service.submit(StubArtifact(b'first'))
+    assert _wait_for(lambda: service.breaker.state == STATE_OPEN)
+    second = StubArtifact(b'second')
+    assert service.submit(second).result(5.0) is None
+    assert service.get_stats()['active'] == 1   # tylko 'first' (ponowienie po błędzie)
+
+    # Ponowne zgłoszenie tej samej treści przy otwartym obwodzie też od razu dostaje None
+    start = time.monotonic()
+    assert service.submit(second).result(5.0) is None
+    assert time.monotonic() - start < 1.0
+    assert service.get_stats()['deferred'] == 2
+
+    backend.fail = False
+    assert _wait_for(lambda: service.get_stats()['spooled'] == 0)
+    assert _wait_for(lambda: service.get_stats()['active'] == 0)
+    assert backend.keys.count(second.sha256) == 1
+    assert service.submit(second).result(5.0) == f'https://stub.invalid/{second.sha256}'
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from clip_recorder import ClipJob, ClipRecorder, FrameRingBuffer
+
+EVENT_TIME = 1000.0
+FPS = 10
+
+
+def _packet(value):
+    """Klatka 64x48 z wzorem (rozmycie zmienia jej zawartość)."""
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[:, ::2] = value
+    success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    assert success
+    return buffer.tobytes()
+
+
+def _packets(seconds_before=2.0, seconds_after=2.0):
+    count_before, count_after = int(seconds_before * FPS), int(seconds_after * FPS)
+    return [(EVENT_TIME + i / FPS, _packet(255)) for i in range(-count_before + 1, count_after + 1)]
+
+
+def _recorder(tmp_path, **kwargs):
+    return ClipRecorder(FrameRingBuffer(fps=FPS), clips_dir=str(tmp_path / 'clips'), **kwargs)
+
+
+def _job(head_boxes):
+    job = ClipJob(EVENT_TIME, 'clips/test.mp4', [], should_blur=True)
+    job.set_head_boxes(head_boxes)
+    return job
+
+
+def _render(recorder, job, packets):
+    """Klatki po anonimizacji (bez zapisu wideo)."""
+    anchors = recorder._anchors(job, packets)
+    frames = []
+    for ts, packet in packets:
+        frame = cv2.imdecode(np.frombuffer(packet, dtype=np.uint8), cv2.IMREAD_COLOR)
+        frames.append((ts, recorder._anonymize(frame, ts, anchors)))
+    return frames
+
+
+def _is_fully_blurred(frame):
+    # Rozmycie usuwa wzorzec pasków (w oryginale sąsiednie kolumny różnią się o ~255)
+    return np.abs(np.diff(frame.astype(int), axis=1)).mean() < 30
+
+
+def test_without_detector_only_frames_near_event_use_detection_boxes(tmp_path):
+    recorder = _recorder(tmp_path, max_box_age=0.25)
+    frames = _render(recorder, _job([(0.1, 0.1, 0.3, 0.3)]), _packets())
+
+    for ts, frame in frames:
+        if abs(ts - EVENT_TIME) <= 0.25:
+            assert not _is_fully_blurred(frame), ts
+        else:
+            assert _is_fully_blurred(frame), ts
+    assert recorder.frames_fully_blurred == sum(1 for ts, _ in frames if abs(ts - EVENT_TIME) > 0.25)
+
+
+def test_redetection_boxes_cover_whole_clip(tmp_path):
+    calls = []
+
+    def detector(path, size):
+        calls.append(size)
+        return [(0, 0, 10, 10)]
+
+    recorder = _recorder(tmp_path, head_detector=detector, redetect_interval=0.5, max_box_age=0.4)
+    frames = _render(recorder, _job([]), _packets())
+
+    assert calls and all(size == (64, 48) for size in calls)
+    assert not any(_is_fully_blurred(frame) for _, frame in frames)
+    assert recorder.frames_fully_blurred == 0
+    assert not list((tmp_path / 'clips').iterdir())  # pliki tymczasowe usunięte
+
+
+@pytest.mark.parametrize('detector', [
+    lambda path, size: None,
+    lambda path, size: (_ for _ in ()).throw(RuntimeError('model offline')),
+])
+def test_failed_redetection_blurs_whole_frame(tmp_path, detector):
+    recorder = _recorder(tmp_path, head_detector=detector, redetect_interval=0.5, max_box_age=0.4)
+    frames = _render(recorder, _job([]), _packets())
+
+    far = [frame for ts, frame in frames if abs(ts - EVENT_TIME) > 0.4]
+    assert far and all(_is_fully_blurred(frame) for frame in far)
+    assert recorder.redetect_failures == recorder.redetections > 0
+
+
+def test_detected_heads_are_blurred_on_redetected_frames(tmp_path):
+    recorder = _recorder(tmp_path, head_detector=lambda path, size: [(0, 0, 32, 48)],
+                         redetect_interval=0.5, box_margin=0.0)
+    packets = _packets()
+    frames = dict(_render(recorder, _job([]), packets))
+
+    later = frames[packets[-1][0]]
+    assert _is_fully_blurred(later[:, :32])
+    assert not _is_fully_blurred(later[:, 40:])
+
+
+def test_clip_without_detection_boxes_is_not_written(tmp_path):
+    recorder = _recorder(tmp_path, wait_timeout=0.01, post_seconds=0)
+    recorder.ring_buffer.push(np.zeros((48, 64, 3), dtype=np.uint8), timestamp=EVENT_TIME)
+    job = recorder.request_clip('phone_test.jpg', should_blur=True, event_time=EVENT_TIME)
+    job.set_head_boxes(None)
+
+    recorder._process(recorder._jobs.get_nowait())
+
+    assert recorder.clips_skipped == 1
+    assert not (tmp_path / 'clips' / 'phone_test.mp4').exists()
+
+
+def test_back_to_back_jobs_keep_their_post_event_frames(tmp_path):
+    # Bufor mieści tylko 0.6 s, a każdy klip (wolna detekcja głów) przetwarzany jest ~0.5 s -
+    # trzecie zlecenie trafia do wątku dawno po tym, jak jego klatki wypadły z bufora.
+    ring_buffer = FrameRingBuffer(max_seconds=0.6, fps=FPS)
+    recorder = ClipRecorder(ring_buffer, clips_dir=str(tmp_path / 'clips'), pre_seconds=0.2, post_seconds=0.3,
+                            head_detector=lambda path, size: time.sleep(0.1) or [(0, 0, 4, 4)],
+                            redetect_interval=0.1, wait_timeout=5.0)
+    written = []
+
+    def _write_clip(job, packets):
+        recorder._anchors(job, packets)
+        written.append((job, [ts for ts, _ in packets]))
+        return 0
+
+    recorder._write_clip = _write_clip
+    stop = threading.Event()
+
+    def _camera():
+        while not stop.is_set():
+            ring_buffer.push(np.zeros((48, 64, 3), dtype=np.uint8))
+            time.sleep(0.01)
+
+    camera = threading.Thread(target=_camera, daemon=True)
+    camera.start()
+    time.sleep(0.3)
+    recorder.start()
+    jobs = []
+    for i in range(3):
+        jobs.append(recorder.request_clip(f'phone_{i}.jpg', should_blur=True))
+        jobs[-1].set_head_boxes([(0.1, 0.1, 0.2, 0.2)])
+        time.sleep(0.05)
+
+    deadline = time.time() + 10.0
+    while len(written) < len(jobs) and time.time() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    recorder.stop()
+
+    assert [job for job, _ in written] == jobs
+    for job, timestamps in written:
+        post = [ts for ts in timestamps if ts > job.event_time]
+        assert post and post[-1] >= job.event_time + 0.3 - 2.0 / FPS, job.clip_path
+        assert len(post) >= 0.3 * FPS - 1
+    assert recorder.clips_skipped == 0
+
+
+def test_redetections_are_capped_per_clip(tmp_path):
+    calls = []
+    recorder = _recorder(tmp_path, head_detector=lambda path, size: calls.append(path) or [(0, 0, 10, 10)],
+                         redetect_interval=0.1, max_redetections=3)
+
+    anchors = recorder._anchors(_job([]), _packets(seconds_before=5.0, seconds_after=5.0))
+
+    assert 0 < len(calls) <= 3   # bez limitu: ~90 detekcji (co 0.1 s przez 10 s)
+    assert len(anchors) == len(calls) + 1
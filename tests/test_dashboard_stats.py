@@ -0,0 +1,172 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from models import db, Detection
+from dashboard_stats import DashboardStats, day_range_utc, day_ranges_utc, per_day_query, today_range_utc
+
+
+def _add(timestamp, location='ławka 1'):
+    detection = Detection(location=location, confidence=0.8, image_path=None, timestamp=timestamp)
+    db.session.add(detection)
+    db.session.commit()
+    return detection.id
+
+
+def _record(detection_id, timestamp):
+    return {'id': detection_id, 'timestamp': timestamp, 'location': 'ławka 1', 'confidence': 0.8,
+            'image_path': 'detections/phone.jpg', 'status': 'Pending'}
+
+
+def _in_thread(app, fn):
+    result = {}
+
+    def run():
+        with app.app_context():
+            result['value'] = fn()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def _blocking_load(stats):
+    """Podmienia _load: zapytanie się wykonuje, ale wynik czeka na release."""
+    real_load = stats._load
+    loaded, release = threading.Event(), threading.Event()
+
+    def load():
+        state = real_load()
+        loaded.set()
+        assert release.wait(5.0)
+        return state
+
+    stats._load = load
+    return loaded, release, real_load
+
+
+def test_day_ranges_are_half_open_across_autumn_dst(warsaw_tz):
+    ranges = day_ranges_utc(3, now=datetime(2026, 10, 26, 12, 0))
+
+    assert [day for day, _, _ in ranges] == [date(2026, 10, 24), date(2026, 10, 25), date(2026, 10, 26)]
+    assert day_range_utc(date(2026, 10, 25)) == (datetime(2026, 10, 24, 22), datetime(2026, 10, 25, 23))
+    assert [end - start for _, start, end in ranges] == [timedelta(hours=24), timedelta(hours=25),
+                                                         timedelta(hours=24)]
+    assert all(ranges[n][2] == ranges[n + 1][1] for n in range(2))
+
+
+def test_per_day_counts_boundaries_once(session, warsaw_tz):
+    ranges = day_ranges_utc(3, now=datetime(2026, 10, 26, 12, 0))
+    for timestamp in (
+        datetime(2026, 10, 23, 21, 59, 59),   # 23.10 lokalnie - poza zakresem
+        datetime(2026, 10, 23, 22, 0),        # północ 24.10 (CEST)
+        datetime(2026, 10, 24, 22, 0),        # północ 25.10 (CEST)
+        datetime(2026, 10, 25, 0, 30),        # 02:30 CEST - przed cofnięciem zegara
+        datetime(2026, 10, 25, 1, 30),        # 02:30 CET - ta sama godzina lokalna po zmianie
+        datetime(2026, 10, 25, 22, 59, 59),   # 23:59:59 CET 25.10
+        datetime(2026, 10, 25, 23, 0),        # północ 26.10 (CET)
+    ):
+        _add(timestamp)
+
+    assert tuple(session.execute(per_day_query(ranges)).one()) == (1, 4, 1)
+
+
+def test_ttl_hits_and_reloads(app):
+    stats = DashboardStats(ttl=300.0)
+    _add(datetime.utcnow())
+
+    assert stats.get()['total_detections'] == 1
+    assert stats.get()['total_detections'] == 1
+    assert (stats.get_stats()['loads'], stats.get_stats()['hits']) == (1, 1)
+
+    stats.ttl = 0.0
+    _add(datetime.utcnow())   # bez on_commit - widoczne dopiero po ponownym załadowaniu
+    assert stats.get()['total_detections'] == 2
+    assert stats.get_stats()['loads'] == 2
+
+
+def test_on_commit_updates_without_query(app):
+    stats = DashboardStats(recent_limit=2)
+    first = _add(datetime.utcnow() - timedelta(minutes=5))
+    stats.get()
+    today_start, _ = today_range_utc()
+
+    stats.on_commit([_record(first, datetime.utcnow()),                       # już policzona
+                     _record(first + 1, datetime.utcnow()),
+                     _record(first + 2, today_start - timedelta(seconds=1))])   # wczoraj
+
+    result = stats.peek()
+    assert (result['total_detections'], result['today_detections']) == (3, 2)
+    assert [item['id'] for item in result['recent_detections']] == [first + 1, first]
+    assert result['recent_detections'][0]['image_path'] == 'phone.jpg'
+    assert stats.get_stats()['loads'] == 1
+
+
+def test_invalidate_forces_reload(app):
+    stats = DashboardStats()
+    detection_id = _add(datetime.utcnow())
+    stats.get()
+
+    db.session.delete(db.session.get(Detection, detection_id))
+    db.session.commit()
+    stats.invalidate()
+
+    assert stats.peek() is None
+    assert stats.get()['total_detections'] == 0
+
+
+def test_commit_during_refresh_is_not_lost(app):
+    stats = DashboardStats()
+    loaded, release, _ = _blocking_load(stats)
+    thread, result = _in_thread(app, stats.get)
+    assert loaded.wait(5.0)
+
+    # Commit po zapytaniu, ale przed zapisaniem wyniku odświeżenia
+    late = _add(datetime.utcnow())
+    stats.on_commit([_record(late, datetime.utcnow())])
+    release.set()
+    thread.join(5.0)
+
+    assert result['value']['total_detections'] == 1
+    assert stats.peek()['total_detections'] == 1
+
+
+def test_refresh_started_before_invalidate_is_not_cached(app):
+    stats = DashboardStats()
+    _add(datetime.utcnow())
+    loaded, release, _ = _blocking_load(stats)
+    thread, _ = _in_thread(app, stats.get)
+    assert loaded.wait(5.0)
+
+    stats.invalidate()
+    release.set()
+    thread.join(5.0)
+
+    assert stats.get_stats()['cached'] is False
+
+
+def test_stale_refresh_does_not_overwrite_newer_one(app):
+    stats = DashboardStats(ttl=0.0)
+    loaded, release, real_load = _blocking_load(stats)
+    slow, _ = _in_thread(app, stats.get)
+    assert loaded.wait(5.0)
+
+    # Detekcja zapisana poza DetectionWriter: widzi ją tylko nowsze odświeżenie
+    _add(datetime.utcnow())
+    stats._load = real_load
+    assert stats.get()['total_detections'] == 1
+
+    release.set()
+    slow.join(5.0)
+
+    stats.ttl = 300.0
+    assert stats.get()['total_detections'] == 1
+
+
+@pytest.mark.parametrize('now, expected', [
+    (datetime(2026, 10, 25, 12, 0), (datetime(2026, 10, 24, 22), datetime(2026, 10, 25, 23))),
+    (datetime(2026, 3, 29, 12, 0), (datetime(2026, 3, 28, 23), datetime(2026, 3, 29, 22))),
+])
+def test_today_range_on_dst_days(warsaw_tz, now, expected):
+    assert today_range_utc(now) == expected
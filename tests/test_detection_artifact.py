@@ -0,0 +1,94 @@
+import hashlib
+
+import cv2
+import numpy as np
+import pytest
+
+from detection_artifact import DetectionArtifact
+from image_writer import ImageWriter
+
+
+def _frame(width=1280, height=720):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (100, 100), (600, 500), (40, 180, 220), -1)
+    return frame
+
+
+@pytest.fixture
+def writer():
+    writer = ImageWriter(quality=80, max_workers=1)
+    yield writer
+    writer.shutdown()
+
+
+def _decode(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_from_frame_encodes_once_with_preview(writer):
+    artifact = DetectionArtifact.from_frame(_frame(), 'phone_a.jpg', writer, preview_max_dimension=320)
+
+    assert artifact.data == writer.encode(_frame())
+    assert (artifact.width, artifact.height, artifact.mimetype) == (1280, 720, 'image/jpeg')
+    assert _decode(artifact.preview).shape[:2] == (180, 320)
+    assert (artifact.stem, artifact.subtype, artifact.size) == ('phone_a', 'jpeg', len(artifact.data))
+
+
+def test_from_encoded_keeps_bytes_and_skips_preview_without_frame(writer):
+    data = writer.encode(_frame())
+
+    bare = DetectionArtifact.from_encoded('phone_a.jpg', data, writer.mimetype)
+    with_frame = DetectionArtifact.from_encoded('phone_a.jpg', data, writer.mimetype, frame=_frame())
+
+    assert bare.data is data and bare.preview is None and bare.width is None
+    assert with_frame.data is data and with_frame.preview is not None
+    assert (with_frame.width, with_frame.height) == (1280, 720)
+
+
+def test_ensure_preview_decodes_stored_bytes_once(writer, monkeypatch):
+    artifact = DetectionArtifact.from_encoded('phone_a.jpg', writer.encode(_frame()), writer.mimetype)
+
+    preview = artifact.ensure_preview(preview_max_dimension=480)
+    assert _decode(preview).shape[:2] == (270, 480)
+    monkeypatch.setattr(cv2, 'imdecode', lambda *args: pytest.fail('preview decoded twice'))
+
+    assert artifact.ensure_preview() is preview
+    assert (artifact.width, artifact.height) == (1280, 720)
+
+
+def test_ensure_preview_of_broken_bytes_is_none():
+    artifact = DetectionArtifact.from_encoded('phone_a.jpg', b'not an image', 'image/jpeg')
+
+    assert artifact.ensure_preview() is None
+
+
+def test_sha256_depends_only_on_content(writer):
+    data = writer.encode(_frame())
+
+    first = DetectionArtifact.from_encoded('phone_a.jpg', data, writer.mimetype)
+    renamed = DetectionArtifact.from_encoded('phone_b.webp', bytes(data), 'image/webp', frame=_frame())
+    changed = DetectionArtifact.from_encoded('phone_a.jpg', data + b'\0', writer.mimetype)
+
+    assert first.sha256 == renamed.sha256 == hashlib.sha256(data).hexdigest()
+    assert changed.sha256 != first.sha256
+
+
+def test_written_bytes_come_back_through_future(writer, tmp_path):
+    filepath = tmp_path / 'phone_a.jpg'
+
+    data = writer.submit(_frame(), str(filepath)).result(5.0)
+    artifact = DetectionArtifact.from_encoded(filepath.name, data, writer.mimetype)
+
+    assert filepath.read_bytes() == data
+    assert artifact.sha256 == hashlib.sha256(filepath.read_bytes()).hexdigest()
+    assert writer.get_stats()['bytes_written'] == len(data)
+
+
+def test_write_to_is_atomic_without_writer(tmp_path):
+    artifact = DetectionArtifact('phone_a.jpg', b'abc', 'image/jpeg')
+    filepath = tmp_path / 'phone_a.jpg'
+
+    assert artifact.write_to(str(filepath)) == 3
+    assert filepath.read_bytes() == b'abc'
+    assert not (tmp_path / 'phone_a.jpg.tmp').exists()
+    assert artifact.as_file().name == 'phone_a.jpg'
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from models import Detection
+from detection_export import export_stream, iter_detections
+from detection_query import parse_fields
+
+BASE = datetime(2026, 3, 2, 8, 0, 0)
+
+
+def _insert(session, rows):
+    session.execute(insert(Detection), [
+        dict({'location': 'ławka 1', 'camera': 'Camera 1', 'confidence': 0.5, 'status': 'Pending'}, **row)
+        for row in rows
+    ])
+    session.commit()
+
+
+def _ids(session, **kwargs):
+    return [item['id'] for batch in iter_detections(session, **kwargs) for item in batch]
+
+
+def test_keyset_resumes_inside_run_of_equal_timestamps(session):
+    # 7 detekcji w tej samej sekundzie, partia 3 - granice partii wypadają wewnątrz serii
+    _insert(session, [{'timestamp': BASE + timedelta(seconds=1)} for _ in range(7)])
+    _insert(session, [{'timestamp': BASE}, {'timestamp': BASE + timedelta(seconds=2)}])
+
+    batches = list(iter_detections(session, chunk=3))
+    ids = [item['id'] for batch in batches for item in batch]
+
+    assert [len(batch) for batch in batches] == [3, 3, 3]
+    assert ids == [8, 1, 2, 3, 4, 5, 6, 7, 9]   # (timestamp, id) rosnąco, bez duplikatów i luk
+
+
+def test_keyset_with_projection_without_key_columns(session):
+    _insert(session, [{'timestamp': BASE, 'location': f'strefa {i}'} for i in range(5)])
+
+    batches = list(iter_detections(session, columns=parse_fields('location'), chunk=2))
+
+    assert [item for batch in batches for item in batch] == [{'location': f'strefa {i}'} for i in range(5)]
+
+
+def test_exact_multiple_of_chunk_ends_with_empty_query(session):
+    _insert(session, [{'timestamp': BASE} for _ in range(4)])
+    assert _ids(session, chunk=2) == [1, 2, 3, 4]
+    assert _ids(session, chunk=10) == [1, 2, 3, 4]
+
+
+def test_ndjson_applies_filters(session):
+    _insert(session, [
+        {'timestamp': BASE, 'location': 'ławka 1'},
+        {'timestamp': BASE, 'location': 'tablica'},
+        {'timestamp': BASE + timedelta(days=2), 'location': 'ławka 1'},
+    ])
+
+    data = b''.join(export_stream(session, 'ndjson', {'location': 'ławka 1', 'to': '2026-03-03T00:00:00+00:00'},
+                                  chunk=1))
+
+    items = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+    assert [(item['id'], item['location']) for item in items] == [(1, 'ławka 1')]
+
+
+def test_csv_has_bom_header_and_all_rows(session):
+    _insert(session, [{'timestamp': BASE + timedelta(seconds=i % 2), 'image_path': f'detections/phone_{i}.jpg'}
+                      for i in range(5)])
+
+    data = b''.join(export_stream(session, 'csv', {'fields': 'id,timestamp,image_path'}, chunk=2))
+
+    assert data.startswith('\ufeff'.encode('utf-8'))
+    rows = list(csv.DictReader(io.StringIO(data.decode('utf-8-sig'))))
+    assert list(rows[0]) == ['id', 'timestamp', 'image_path']
+    assert [int(row['id']) for row in rows] == [1, 3, 5, 2, 4]
+    assert rows[0]['image_path'] == 'phone_0.jpg'
+
+
+def test_zip_contains_images_once_and_ndjson(session, tmp_path):
+    (tmp_path / 'phone_a.jpg').write_bytes(b'a' * 100_000)
+    (tmp_path / 'phone_b.jpg').write_bytes(b'b' * 10)
+    _insert(session, [
+        {'timestamp': BASE, 'image_path': 'phone_a.jpg'},
+        {'timestamp': BASE, 'image_path': 'phone_a.jpg'},        # ten sam obraz - jeden wpis w archiwum
+        {'timestamp': BASE, 'image_path': 'phone_b.jpg'},
+        {'timestamp': BASE, 'image_path': 'phone_missing.jpg'},  # usunięty przez retencję - pomijany
+        {'timestamp': BASE, 'image_path': None},
+    ])
+
+    data = b''.join(export_stream(session, 'zip', {}, images_dir=str(tmp_path), chunk=2))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == ['detections.ndjson', 'images/phone_a.jpg', 'images/phone_b.jpg']
+        assert archive.read('images/phone_a.jpg') == b'a' * 100_000
+        lines = archive.read('detections.ndjson').decode('utf-8').splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [1, 2, 3, 4, 5]
+
+
+def test_invalid_format_and_fields(session):
+    with pytest.raises(ValueError):
+        export_stream(session, 'xlsx', {})
+    with pytest.raises(ValueError):
+        export_stream(session, 'csv', {'fields': 'id,password'})
@@ -0,0 +1,204 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from models import db, Detection
+from detection_query import (decode_cursor, encode_cursor, estimate_total, keyset_page, offset_page, parse_fields,
+                             parse_filters, parse_page, serialize_row)
+
+BASE = datetime(2026, 3, 2, 8, 0, 0)
+
+
+def _insert(session, rows):
+    session.execute(insert(Detection), [
+        dict({'timestamp': BASE, 'location': 'ławka 1', 'confidence': 0.5, 'status': 'Pending'}, **row)
+        for row in rows
+    ])
+    session.commit()
+
+
+def _ids(session, args):
+    rows, _ = offset_page(session, parse_fields('id'), 1, 100, parse_filters(args))
+    return sorted(row['id'] for row in rows)
+
+
+def test_from_to_is_half_open(session):
+    _insert(session, [
+        {'timestamp': BASE - timedelta(microseconds=1)},
+        {'timestamp': BASE},
+        {'timestamp': BASE + timedelta(hours=1) - timedelta(microseconds=1)},
+        {'timestamp': BASE + timedelta(hours=1)},
+    ])
+
+    assert _ids(session, {'from': '2026-03-02T08:00:00Z', 'to': '2026-03-02T09:00:00+00:00'}) == [2, 3]
+
+
+def test_date_only_to_covers_whole_local_day(session, warsaw_tz):
+    # 2026-03-02 lokalnie (CET) = [03-01 23:00, 03-02 23:00) UTC
+    _insert(session, [
+        {'timestamp': datetime(2026, 3, 1, 22, 59)},
+        {'timestamp': datetime(2026, 3, 1, 23, 0)},
+        {'timestamp': datetime(2026, 3, 2, 22, 59)},
+        {'timestamp': datetime(2026, 3, 2, 23, 0)},
+    ])
+
+    assert _ids(session, {'from': '2026-03-02', 'to': '2026-03-02'}) == [2, 3]
+    assert _ids(session, {'to': '2026-03-01'}) == [1]
+
+
+def test_location_status_and_confidence_filters(session):
+    _insert(session, [
+        {'location': 'ławka 1', 'status': 'Pending', 'confidence': 0.9},
+        {'location': 'ławka 2', 'status': 'Confirmed', 'confidence': 0.4},
+        {'location': 'tablica', 'status': 'Dismissed', 'confidence': 0.7},
+        {'location': 'ławka 2', 'status': 'Pending', 'confidence': 0.6},
+    ])
+
+    assert _ids(session, {'location': 'ławka 2'}) == [2, 4]
+    assert _ids(session, {'location': 'ławka 1, tablica'}) == [1, 3]
+    assert _ids(session, {'min_confidence': '0.6'}) == [1, 3, 4]
+    assert _ids(session, {'status': 'Confirmed,Dismissed'}) == [2, 3]
+    assert _ids(session, {'location': 'ławka 2', 'status': 'Pending', 'min_confidence': '0.5'}) == [4]
+
+
+@pytest.mark.parametrize('args, message', [
+    ({'min_confidence': 'high'}, 'min_confidence'),
+    ({'from': '2026-13-01'}, "'from'"),
+    ({'to': 'yesterday'}, "'to'"),
+])
+def test_invalid_filters_raise_value_error(args, message):
+    # /api/detections zamienia ValueError na odpowiedź 400
+    with pytest.raises(ValueError, match=message):
+        parse_filters(args)
+
+
+def test_unknown_field_raises_value_error():
+    with pytest.raises(ValueError, match='Unknown fields: password'):
+        parse_fields('id,password')
+
+
+@pytest.mark.parametrize('args, expected', [
+    ({}, (1, 20)),
+    ({'page': '3', 'per_page': '50'}, (3, 50)),
+    ({'per_page': '1000'}, (1, 100)),
+])
+def test_parse_page(args, expected):
+    assert parse_page(args) == expected
+
+
+@pytest.mark.parametrize('args', [{'page': 'two'}, {'page': '0'}, {'per_page': '-5'}, {'per_page': '2.5'}])
+def test_invalid_page_raises_value_error(args):
+    with pytest.raises(ValueError):
+        parse_page(args)
+
+
+def test_offset_page_selects_only_requested_columns(session):
+    _insert(session, [{'timestamp': BASE + timedelta(minutes=i), 'image_path': f'detections/phone_{i}.jpg'}
+                      for i in range(5)])
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rows, pagination = offset_page(session, parse_fields('id,image_path'), 2, 2)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert [serialize_row(row) for row in rows] == [
+        {'id': 3, 'image_path': 'phone_2.jpg'}, {'id': 2, 'image_path': 'phone_1.jpg'},
+    ]
+    assert (pagination.pages, pagination.has_next, pagination.has_prev) == (3, True, True)
+    page_query = next(statement for statement in statements if 'LIMIT' in statement)
+    assert 'confidence' not in page_query and 'status' not in page_query
+
+
+def _page(session, cursor=None, limit=3, where=()):
+    rows, next_cursor, prev_cursor = keyset_page(session, parse_fields('id'), limit, cursor=cursor, where=where)
+    return [row['id'] for row in rows], next_cursor, prev_cursor
+
+
+def test_keyset_next_then_prev_returns_same_page(session):
+    _insert(session, [{'timestamp': BASE + timedelta(minutes=i)} for i in range(10)])
+
+    first, next_cursor, prev_cursor = _page(session)
+    second, next_cursor_2, prev_cursor_2 = _page(session, next_cursor)
+    back, _, back_prev = _page(session, prev_cursor_2)
+
+    assert first == [10, 9, 8] and prev_cursor is None
+    assert second == [7, 6, 5]
+    assert back == first and back_prev is None
+    assert _page(session, next_cursor_2)[0] == [4, 3, 2]
+
+
+def test_keyset_splits_equal_timestamps_across_pages(session):
+    _insert(session, [{'timestamp': BASE} for _ in range(5)] + [{'timestamp': BASE - timedelta(minutes=1)}])
+
+    seen, cursor = [], None
+    while True:
+        ids, cursor, _ = _page(session, cursor, limit=2)
+        seen += ids
+        if cursor is None:
+            break
+
+    assert seen == [5, 4, 3, 2, 1, 6]
+
+
+def test_keyset_last_page_has_no_next_cursor(session):
+    _insert(session, [{'timestamp': BASE + timedelta(minutes=i)} for i in range(6)])
+
+    _, next_cursor, _ = _page(session)
+    last, last_next, last_prev = _page(session, next_cursor)
+
+    assert last == [3, 2, 1]
+    assert last_next is None and last_prev is not None
+    assert _page(session, limit=6)[1] is None
+    assert _page(session, where=parse_filters({'location': 'nowhere'})) == ([], None, None)
+
+
+def test_keyset_respects_filters(session):
+    _insert(session, [{'timestamp': BASE + timedelta(minutes=i), 'location': 'ab'[i % 2]} for i in range(8)])
+
+    ids, next_cursor, _ = _page(session, limit=2, where=parse_filters({'location': 'a'}))
+    more, _, _ = _page(session, next_cursor, limit=2, where=parse_filters({'location': 'a'}))
+
+    assert ids + more == [7, 5, 3, 1]
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor!',
+    base64.urlsafe_b64encode(b'{"t": "2026-03-02T08:00:00", "i": 1}').decode(),               # brak kierunku
+    base64.urlsafe_b64encode(b'{"t": "2026-03-02T08:00:00", "i": 1, "d": "up"}').decode(),
+    base64.urlsafe_b64encode(b'{"t": "wczoraj", "i": 1, "d": "next"}').decode(),
+    base64.urlsafe_b64encode(b'{"t": "2026-03-02T08:00:00", "i": "x", "d": "next"}').decode(),
+    base64.urlsafe_b64encode(b'[1, 2, 3]').decode(),
+])
+def test_malformed_or_tampered_cursor_raises_value_error(session, cursor):
+    # /api/detections zamienia ValueError na odpowiedź 400
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        keyset_page(session, parse_fields('id'), 3, cursor=cursor)
+
+
+def test_tampered_cursor_bytes_are_rejected(session):
+    cursor = encode_cursor(BASE, 7, 'next')
+    assert decode_cursor(cursor) == (BASE, 7, 'next')
+    with pytest.raises(ValueError):
+        decode_cursor(cursor[:-4])
+
+
+def test_include_total_uses_cache_without_filters_and_counts_with_filters(session):
+    _insert(session, [{'location': 'ławka 1'} for _ in range(4)] + [{'location': 'tablica'}])
+    cache_calls = []
+
+    def cached_total():
+        cache_calls.append(1)
+        return 1234
+
+    assert estimate_total(session, [], cached_total) == {'total_approx': 1234}
+    assert estimate_total(session, parse_filters({'location': 'ławka 1'}), cached_total) == {
+        'total_approx': 4, 'total_capped': False,
+    }
+    assert estimate_total(session, parse_filters({'location': 'ławka 1'}), cached_total, cap=3) == {
+        'total_approx': 3, 'total_capped': True,
+    }
+    assert len(cache_calls) == 1
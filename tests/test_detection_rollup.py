@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+
+from detection_rollup import MAX_BUCKETS, _bucket_start, _next_bucket, aggregate, apply_increments, query_series
+
+
+def _detections(*timestamps, location='ławka 1', confidence=0.5):
+    return [{'camera': 'Camera 1', 'location': location, 'timestamp': ts, 'confidence': confidence}
+            for ts in timestamps]
+
+
+def _store(session, records):
+    apply_increments(session, aggregate(records))
+    session.commit()
+
+
+def _counts(series):
+    return {item['bucket']: item['count'] for item in series}
+
+
+@pytest.mark.parametrize('moment, granularity, expected', [
+    (datetime(2026, 3, 11, 14, 37, 5), 'hour', datetime(2026, 3, 11, 14)),
+    (datetime(2026, 3, 11, 14, 37, 5), 'day', datetime(2026, 3, 11)),
+    (datetime(2026, 3, 11, 14, 37, 5), 'week', datetime(2026, 3, 9)),   # środa -> poniedziałek
+    (datetime(2026, 3, 9, 0, 0), 'week', datetime(2026, 3, 9)),
+    (datetime(2026, 3, 15, 23, 59), 'week', datetime(2026, 3, 9)),      # niedziela należy do tygodnia od poniedziałku
+    (datetime(2026, 1, 1, 8, 0), 'week', datetime(2025, 12, 29)),       # tydzień przez granicę roku
+    (datetime(2026, 3, 31, 23, 59), 'month', datetime(2026, 3, 1)),
+])
+def test_bucket_start(moment, granularity, expected):
+    assert _bucket_start(moment, granularity) == expected
+
+
+@pytest.mark.parametrize('bucket, granularity, expected', [
+    (datetime(2026, 3, 29, 1), 'hour', datetime(2026, 3, 29, 2)),
+    (datetime(2026, 2, 28), 'day', datetime(2026, 3, 1)),
+    (datetime(2025, 12, 29), 'week', datetime(2026, 1, 5)),
+    (datetime(2026, 1, 1), 'month', datetime(2026, 2, 1)),
+    (datetime(2026, 11, 1), 'month', datetime(2026, 12, 1)),
+    (datetime(2026, 12, 1), 'month', datetime(2027, 1, 1)),
+])
+def test_next_bucket(bucket, granularity, expected):
+    assert _next_bucket(bucket, granularity) == expected
+
+
+def test_day_buckets_follow_local_midnight_across_spring_dst(session, warsaw_tz):
+    # 2026-03-29 00:00 lokalnie = 03-28 23:00 UTC (CET), 03-30 00:00 lokalnie = 03-29 22:00 UTC (CEST)
+    _store(session, _detections(
+        datetime(2026, 3, 28, 22, 30),   # 03-28 23:30 lokalnie
+        datetime(2026, 3, 28, 23, 10),   # 03-29 00:10 lokalnie
+        datetime(2026, 3, 29, 21, 50),   # 03-29 23:50 lokalnie
+        datetime(2026, 3, 29, 22, 5),    # 03-30 00:05 lokalnie
+    ))
+
+    series = query_series(session, datetime(2026, 3, 27, 23), datetime(2026, 3, 30, 22), 'day')
+
+    assert _counts(series) == {'2026-03-28': 1, '2026-03-29': 2, '2026-03-30': 1}
+
+
+def test_hour_buckets_across_dst_changes_keep_every_detection(session, warsaw_tz):
+    spring = _detections(datetime(2026, 3, 29, 0, 30), datetime(2026, 3, 29, 1, 30))   # 01:30 CET, 03:30 CEST
+    autumn = _detections(datetime(2026, 10, 25, 0, 30), datetime(2026, 10, 25, 1, 30))  # 02:30 CEST, 02:30 CET
+    _store(session, spring + autumn)
+
+    spring_series = _counts(query_series(session, datetime(2026, 3, 28, 23), datetime(2026, 3, 29, 3), 'hour'))
+    autumn_series = _counts(query_series(session, datetime(2026, 10, 24, 22), datetime(2026, 10, 25, 3), 'hour'))
+
+    assert spring_series['2026-03-29T01:00'] == 1
+    assert spring_series['2026-03-29T02:00'] == 0   # godzina, której nie było
+    assert spring_series['2026-03-29T03:00'] == 1
+    assert autumn_series['2026-10-25T02:00'] == 2   # powtórzona godzina w jednym kubełku
+    assert sum(spring_series.values()) == sum(autumn_series.values()) == 2
+
+
+def test_week_and_month_buckets(session, warsaw_tz):
+    _store(session, _detections(
+        datetime(2026, 1, 31, 22, 30),   # sobota 01-31 23:30 lokalnie
+        datetime(2026, 1, 31, 23, 30),   # niedziela 02-01 00:30 lokalnie
+        datetime(2026, 2, 1, 23, 30),    # poniedziałek 02-02 00:30 lokalnie
+        datetime(2026, 2, 28, 22, 59),   # 02-28 23:59 lokalnie
+    ))
+    start, end = datetime(2026, 1, 25, 23), datetime(2026, 3, 31, 22)
+
+    weeks = _counts(query_series(session, start, end, 'week'))
+    months = _counts(query_series(session, start, end, 'month'))
+
+    assert weeks['2026-01-26'] == 2
+    assert weeks['2026-02-02'] == 1
+    assert weeks['2026-02-23'] == 1
+    assert months == {'2026-01': 1, '2026-02': 3, '2026-03': 0}
+
+
+def test_series_aggregates_confidence_and_zones(session, warsaw_tz):
+    _store(session, _detections(datetime(2026, 5, 4, 9, 5), datetime(2026, 5, 4, 9, 40), confidence=0.4)
+           + _detections(datetime(2026, 5, 4, 9, 50), location='tablica', confidence=0.9))
+
+    series = query_series(session, datetime(2026, 5, 4, 9), datetime(2026, 5, 4, 11), 'hour', group_by_zone=True)
+    only_board = query_series(session, datetime(2026, 5, 4, 9), datetime(2026, 5, 4, 11), 'hour', zones=['tablica'])
+
+    busy = next(item for item in series if item['count'])
+    assert busy['count'] == 3
+    assert busy['avg_confidence'] == pytest.approx((0.4 + 0.4 + 0.9) / 3, abs=1e-4)
+    assert busy['max_confidence'] == 0.9
+    assert busy['zones'] == {'ławka 1': 2, 'tablica': 1}
+    assert sum(item['count'] for item in only_board) == 1
+    assert [item['avg_confidence'] for item in series if not item['count']] == [None]
+
+
+def test_invalid_arguments(session):
+    with pytest.raises(ValueError):
+        query_series(session, datetime(2026, 1, 1), datetime(2026, 1, 2), 'year')
+    with pytest.raises(ValueError):
+        query_series(session, datetime(2026, 1, 2), datetime(2026, 1, 1))
+    with pytest.raises(ValueError, match=str(MAX_BUCKETS)):
+        query_series(session, datetime(2020, 1, 1), datetime(2026, 1, 1), 'hour')
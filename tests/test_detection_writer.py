@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from models import db, Detection, DetectionRollup, Notification, StoredFile, User
+from detection_writer import DetectionWriter
+
+BASE = datetime(2026, 3, 2, 8, 15)
+
+
+@pytest.fixture
+def writer(app, tmp_path):
+    owner = User(username='admin')
+    owner.set_password('admin')
+    db.session.add(owner)
+    db.session.commit()
+    writer = DetectionWriter(flush_interval=0.05, media_root=str(tmp_path))
+    writer.init_app(app)
+    return writer
+
+
+def _image(tmp_path, name, size=100):
+    (tmp_path / name).write_bytes(b'x' * size)
+    return name
+
+
+def _flush(writer, items):
+    """Zapisuje jedną grupę: items = [(kwargs submit, dedupe)]."""
+    batch = []
+    for kwargs, dedupe in items:
+        future = writer.submit(dedupe=dedupe, **kwargs)
+        batch.append(writer._queue.get_nowait())
+        assert batch[-1][1] is future
+    writer._flush(batch)
+    return [item[1] for item in batch]
+
+
+def _count(model):
+    return db.session.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_batch_writes_all_related_rows_in_one_commit(writer, tmp_path):
+    committed = []
+    writer.add_commit_listener(committed.append)
+    futures = _flush(writer, [
+        ({'location': 'ławka 1', 'confidence': 0.8, 'image_path': _image(tmp_path, 'phone_a.jpg', 300),
+          'timestamp': BASE, 'camera': 'Camera 1', 'notifications': ['sms', 'email']}, False),
+        ({'location': 'ławka 1', 'confidence': 0.6, 'image_path': _image(tmp_path, 'phone_b.jpg'),
+          'timestamp': BASE + timedelta(minutes=10), 'camera': 'Camera 1', 'notifications': ['email']}, False),
+    ])
+
+    ids = [future.result(0) for future in futures]
+    assert _count(Detection) == 2
+    assert sorted(db.session.execute(select(Notification.detection_id, Notification.channel)).all()) == sorted([
+        (ids[0], 'sms'), (ids[0], 'email'), (ids[1], 'email'),
+    ])
+    rollup = db.session.execute(select(DetectionRollup)).scalar_one()
+    assert (rollup.camera, rollup.zone, rollup.hour, rollup.count) == ('Camera 1', 'ławka 1', datetime(2026, 3, 2, 8), 2)
+    assert rollup.confidence_max == 0.8
+    files = dict(db.session.execute(select(StoredFile.path, StoredFile.bytes)).all())
+    assert files == {'phone_a.jpg': 300, 'phone_b.jpg': 100}
+    assert [record['notifications'] for record in committed[0]] == [['sms', 'email'], ['email']]
+    assert writer.get_stats()['batches_committed'] == 1
+
+
+def test_failed_batch_leaves_nothing_behind(writer, tmp_path):
+    committed = []
+    writer.add_commit_listener(committed.append)
+    # Drugi wiersz outboxu dla tej samej pary (detekcja, kanał) łamie unikalność - już po INSERT detekcji
+    futures = _flush(writer, [
+        ({'location': 'ławka 1', 'confidence': 0.8, 'image_path': _image(tmp_path, 'phone_a.jpg'),
+          'timestamp': BASE, 'notifications': ['sms']}, False),
+        ({'location': 'ławka 2', 'confidence': 0.7, 'image_path': _image(tmp_path, 'phone_b.jpg'),
+          'timestamp': BASE, 'notifications': ['sms', 'sms']}, False),
+    ])
+
+    for future in futures:
+        with pytest.raises(Exception):
+            future.result(0)
+    assert [_count(model) for model in (Detection, Notification, DetectionRollup, StoredFile)] == [0, 0, 0, 0]
+    assert committed == []
+    assert writer.get_stats()['failures'] == 2
+
+
+def test_dedupe_returns_existing_id_without_new_rows(writer, tmp_path):
+    path = _image(tmp_path, 'phone_a.jpg')
+    (first,) = _flush(writer, [({'location': 'ławka 1', 'confidence': 0.8, 'image_path': path,
+                                 'timestamp': BASE, 'notifications': ['sms']}, False)])
+
+    futures = _flush(writer, [
+        ({'location': 'ławka 1', 'confidence': 0.8, 'image_path': path, 'timestamp': BASE,
+          'notifications': ['sms']}, True),
+        ({'location': 'ławka 1', 'confidence': 0.5, 'image_path': _image(tmp_path, 'phone_b.jpg'),
+          'timestamp': BASE}, True),
+    ])
+
+    assert futures[0].result(0) == first.result(0)
+    assert futures[1].result(0) not in (None, first.result(0))
+    assert _count(Detection) == 2
+    assert _count(Notification) == 1
+    assert db.session.execute(select(DetectionRollup.count)).scalar_one() == 2
+
+
+def test_returned_ids_follow_submission_order(writer, tmp_path):
+    items = [({'location': f'strefa {i}', 'confidence': i / 100, 'image_path': f'phone_{i}.jpg',
+               'timestamp': BASE - timedelta(seconds=i)}, False) for i in range(40)]
+    futures = _flush(writer, items)
+
+    stored = dict(db.session.execute(select(Detection.id, Detection.image_path)).all())
+    assert [stored[future.result(0)] for future in futures] == [f'phone_{i}.jpg' for i in range(40)]
+    assert _count(StoredFile) == 0   # pliki nie istnieją - brak wierszy indeksu
+
+
+def test_trace_gets_commit_time(writer):
+    trace = {'capture': 1.0}
+    (future,) = _flush(writer, [({'location': 'ławka 1', 'confidence': 0.8, 'image_path': None,
+                                  'timestamp': BASE, 'trace': trace}, False)])
+
+    stored = db.session.get(Detection, future.result(0)).trace
+    assert stored['capture'] == 1.0 and stored['db_commit'] > 1.0
+
+
+def test_thread_flushes_pending_on_stop(writer, tmp_path):
+    writer.start()
+    futures = [writer.submit('ławka 1', 0.5, f'phone_{i}.jpg', timestamp=BASE) for i in range(5)]
+    writer.stop()
+    writer.join(5.0)
+
+    assert sorted(future.result(0) for future in futures) == [1, 2, 3, 4, 5]
@@ -0,0 +1,122 @@
+import threading
+
+from event_bus import EventBus
+
+
+def _ids(chunk):
+    return [line[4:] for line in chunk.splitlines() if line.startswith('id: ')]
+
+
+def _events(chunk):
+    return [line[7:] for line in chunk.splitlines() if line.startswith('event: ')]
+
+
+def test_new_client_gets_only_future_events():
+    bus = EventBus(keepalive=1.0)
+    bus.publish('stats', {'added': 1})
+    stream = bus.stream()
+
+    assert next(stream) == 'retry: 3000\n\n'
+    second = bus.publish('detection', {'id': 7})
+    chunk = next(stream)
+
+    assert _ids(chunk) == [second]
+    assert 'data: {"id":7}' in chunk
+    stream.close()
+
+
+def test_last_event_id_resumes_missed_events():
+    bus = EventBus(keepalive=1.0)
+    first = bus.publish('detection', {'id': 1})
+    missed = [bus.publish('detection', {'id': 2}), bus.publish('deleted', {'ids': [1]})]
+    stream = bus.stream(first)
+
+    next(stream)
+    chunk = next(stream)
+
+    assert _ids(chunk) == missed
+    assert _events(chunk) == ['detection', 'deleted']
+    assert bus.get_stats()['resumed'] == 1
+    stream.close()
+
+
+def test_id_outside_history_gets_reset():
+    bus = EventBus(history=2, keepalive=1.0)
+    first = bus.publish('detection', {'id': 1})
+    for n in range(2, 5):
+        bus.publish('detection', {'id': n})
+
+    for last_event_id in (first, f'1-{4}', 'garbage'):   # wypadło z bufora, inna epoka (restart), błędne id
+        stream = bus.stream(last_event_id)
+        next(stream)
+        chunk = next(stream)
+        assert _events(chunk) == ['reset']
+        stream.close()
+    assert bus.get_stats()['resets'] == 3
+
+
+def test_lagging_client_gets_reset_mid_stream():
+    bus = EventBus(history=2, keepalive=1.0)
+    stream = bus.stream()
+    next(stream)
+    for n in range(5):
+        bus.publish('detection', {'id': n})
+
+    assert _events(next(stream)) == ['reset']
+    last = bus.publish('stats', {})
+    assert _ids(next(stream)) == [last]
+    stream.close()
+
+
+def test_idle_stream_sends_keepalive():
+    bus = EventBus(keepalive=0.05)
+    stream = bus.stream()
+    next(stream)
+
+    assert next(stream) == ': keepalive\n\n'
+    stream.close()
+
+
+def test_concurrent_connections_never_exceed_limit():
+    bus = EventBus(max_clients=3)
+    barrier = threading.Barrier(20)
+    streams = []
+    lock = threading.Lock()
+
+    def connect():
+        barrier.wait()
+        stream = bus.stream()
+        with lock:
+            streams.append(stream)
+
+    threads = [threading.Thread(target=connect) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    accepted = [stream for stream in streams if stream is not None]
+    assert len(accepted) == 3
+    assert bus.get_stats()['clients'] == 3
+
+    # Zamknięcie przed pierwszym fragmentem (klient rozłączony od razu) też zwalnia miejsce, i tylko raz
+    accepted[0].close()
+    accepted[0].close()
+    assert bus.get_stats()['clients'] == 2
+    assert bus.stream() is not None
+    assert bus.stream() is None
+
+
+def test_close_ends_streams_and_releases_clients():
+    bus = EventBus(keepalive=5.0)
+    stream = bus.stream()
+    next(stream)
+    chunks = []
+    reader = threading.Thread(target=lambda: chunks.extend(stream))
+    reader.start()
+
+    bus.close()
+    reader.join(5.0)
+
+    assert not reader.is_alive() and chunks == []
+    assert bus.get_stats()['clients'] == 0
@@ -0,0 +1,157 @@
+"""
+AnonymizerWorker._fan_out z atrapami dostawców: bezpieczniki kanałów, termin
+linku do obrazu i odkładanie wierszy outboxu - bez połączeń sieciowych.
+Wymaga zależności camera_controller (ultralytics, vonage, python-dotenv).
+"""
+import threading
+import time
+
+import pytest
+
+camera_controller = pytest.importorskip('camera_controller')
+
+from circuit_breaker import CircuitBreaker, STATE_OPEN
+from latency_tracer import LatencyTracer
+from notification_dispatcher import NotificationDispatcher, PRIORITY_HIGH
+from notification_outbox import STATUS_DEFERRED, STATUS_DELIVERED, STATUS_FAILED
+from upload_service import UploadBackend, UploadService
+
+
+class RecordingOutbox:
+    """Zapisuje wyniki complete() zamiast zapisu do bazy."""
+
+    def __init__(self):
+        self.results = []
+        self._cond = threading.Condition()
+
+    def complete(self, row, status, error=None):
+        with self._cond:
+            self.results.append((row['id'], status, error))
+            self._cond.notify_all()
+
+    def wait(self, count, timeout=5.0):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.results) >= count, timeout)
+            return list(self.results)
+
+
+class BlockingBackend(UploadBackend):
+    name = 'stub'
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = threading.Event()
+
+    def upload(self, key, data, mimetype, filename):
+        self.calls += 1
+        self.gate.wait(5.0)
+        return f'https://stub.invalid/{key}'
+
+
+class StubArtifact:
+    filename = 'phone_test.jpg'
+    mimetype = 'image/jpeg'
+    data = b'jpeg'
+    sha256 = 'a' * 64
+
+
+class StubSender:
+    """Funkcja wysyłki kanału: zapisuje otrzymane linki, opcjonalnie zawodzi."""
+
+    def __init__(self, result=True):
+        self.links = []
+        self.result = result
+
+    def __call__(self, public_link):
+        self.links.append(public_link)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def worker(tmp_path):
+    worker = camera_controller.AnonymizerWorker.__new__(camera_controller.AnonymizerWorker)
+    worker.breakers = {
+        'sms': CircuitBreaker('vonage', failure_threshold=1, reset_timeout=60.0),
+        'email': CircuitBreaker('smtp', failure_threshold=1, reset_timeout=60.0),
+    }
+    worker.notification_outbox = RecordingOutbox()
+    worker.notification_dispatcher = NotificationDispatcher(workers=2)
+    worker.notification_dispatcher.start()
+    worker.latency_tracer = LatencyTracer()
+    worker.upload_service = None
+    yield worker
+    worker.notification_dispatcher.stop()
+    if worker.upload_service is not None:
+        worker.upload_service.backend.gate.set()
+        worker.upload_service.stop()
+
+
+def _senders(sms, email):
+    return [
+        ('sms', sms, PRIORITY_HIGH, [{'id': 1}]),
+        ('email', email, PRIORITY_HIGH, [{'id': 2}, {'id': 3}]),
+    ]
+
+
+def test_open_circuit_defers_rows_without_calling_provider(worker):
+    sms, email = StubSender(), StubSender()
+    worker.breakers['sms'].record_failure('vonage down')
+    retry_at = worker.breakers['sms'].retry_at()
+
+    worker._fan_out(None, _senders(sms, email), time.time(), PRIORITY_HIGH)
+    results = worker.notification_outbox.wait(3)
+
+    assert sms.links == []
+    assert (1, STATUS_DEFERRED, pytest.approx(retry_at, abs=1.0)) in results
+    assert {(row_id, status) for row_id, status, _ in results} >= {(2, STATUS_DELIVERED), (3, STATUS_DELIVERED)}
+    assert email.links == [None]
+
+
+def test_failed_send_opens_circuit_and_next_alert_is_deferred(worker):
+    sms = StubSender(result=ConnectionError('gateway timeout'))
+    email = StubSender()
+
+    worker._fan_out(None, _senders(sms, email), time.time(), PRIORITY_HIGH)
+    first = worker.notification_outbox.wait(3)
+    assert (1, STATUS_FAILED, 'send failed') in first
+    assert worker.breakers['sms'].state == STATE_OPEN
+
+    worker._fan_out(None, _senders(sms, email), time.time(), PRIORITY_HIGH)
+    second = worker.notification_outbox.wait(6)[3:]
+
+    assert len(sms.links) == 1  # druga wysyłka nie dotarła do dostawcy
+    assert (1, STATUS_DEFERRED) in {(row_id, status) for row_id, status, _ in second}
+
+
+def test_alerts_go_out_without_link_when_upload_misses_deadline(worker, tmp_path):
+    backend = BlockingBackend()
+    worker.upload_service = UploadService(backend, spool_dir=str(tmp_path / 'spool'), workers=1,
+                                          link_deadline=0.1, breaker=CircuitBreaker('stub'))
+    worker.upload_service.start()
+    sms, email = StubSender(), StubSender()
+
+    start = time.monotonic()
+    worker._fan_out(StubArtifact(), _senders(sms, email), time.time(), PRIORITY_HIGH)
+    results = worker.notification_outbox.wait(3)
+
+    assert time.monotonic() - start < 2.0
+    assert backend.calls == 1 and not backend.gate.is_set()  # upload nadal trwa
+    assert sms.links == [None] and email.links == [None]
+    assert {status for _, status, _ in results} == {STATUS_DELIVERED}
+
+
+def test_alerts_carry_link_when_upload_beats_deadline(worker, tmp_path):
+    backend = BlockingBackend()
+    backend.gate.set()
+    worker.upload_service = UploadService(backend, spool_dir=str(tmp_path / 'spool'), workers=1,
+                                          link_deadline=5.0, breaker=CircuitBreaker('stub'))
+    worker.upload_service.start()
+    sms, email = StubSender(), StubSender()
+
+    worker._fan_out(StubArtifact(), _senders(sms, email), time.time(), PRIORITY_HIGH)
+    worker.notification_outbox.wait(3)
+
+    assert sms.links == [f'https://stub.invalid/{StubArtifact.sha256}']
+    assert email.links == sms.links
@@ -0,0 +1,162 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import image_writer
+from image_writer import ImageWriter
+
+
+def _frame(width=1600, height=900):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.circle(frame, (width // 2, height // 2), height // 3, (30, 120, 250), -1)
+    cv2.putText(frame, 'telefon', (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+    return frame
+
+
+@pytest.fixture
+def writers():
+    created = []
+
+    def _make(**kwargs):
+        writer = ImageWriter(max_workers=1, **kwargs)
+        created.append(writer)
+        return writer
+
+    yield _make
+    for writer in created:
+        writer.shutdown()
+
+
+def _decode(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_write_goes_through_tmp_file(writers, tmp_path, monkeypatch):
+    writer = writers()
+    filepath = tmp_path / 'nested' / 'phone_a.jpg'
+    replaced = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        # W chwili podmiany plik docelowy jeszcze nie istnieje - nikt nie czyta połowy obrazu
+        assert src == f'{filepath}.tmp' and not os.path.exists(dst)
+        replaced.append(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(image_writer.os, 'replace', replace)
+    size = writer.write(_frame(), str(filepath))
+
+    assert replaced == [str(filepath)]
+    assert filepath.stat().st_size == size
+    assert not os.path.exists(f'{filepath}.tmp')
+    assert writer.get_stats()['writes'] == 1 and writer.get_stats()['bytes_written'] == size
+
+
+def test_failed_write_keeps_previous_file(writers, tmp_path, monkeypatch):
+    writer = writers()
+    filepath = tmp_path / 'phone_a.jpg'
+    filepath.write_bytes(b'old')
+
+    def replace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(image_writer.os, 'replace', replace)
+    with pytest.raises(OSError):
+        writer.write(_frame(), str(filepath))
+
+    assert filepath.read_bytes() == b'old'
+    assert writer.get_stats()['failures'] == 1
+
+
+@pytest.mark.parametrize('max_dimension, shape', [
+    (None, (900, 1600)),
+    (2000, (900, 1600)),
+    (800, (450, 800)),
+    (300, (168, 300)),
+])
+def test_max_dimension_keeps_aspect_ratio(writers, max_dimension, shape):
+    writer = writers(max_dimension=max_dimension)
+
+    assert writer.prepare(_frame()).shape[:2] == shape
+    assert _decode(writer.encode(_frame())).shape[:2] == shape
+
+
+def test_portrait_frame_is_limited_by_height(writers):
+    writer = writers(max_dimension=400)
+
+    assert writer.prepare(_frame(width=600, height=1200)).shape[:2] == (400, 200)
+
+
+def test_jpeg_options(writers):
+    frame = _frame()
+    low = writers(quality=30).encode(frame)
+    high = writers(quality=95).encode(frame)
+    progressive = writers(quality=95, progressive=True).encode(frame)
+
+    assert low[:3] == b'\xff\xd8\xff' and len(low) < len(high)
+    assert b'\xff\xc2' in progressive and b'\xff\xc2' not in high   # SOF2 = JPEG progresywny
+    assert writers(quality=500).quality == 100 and writers(quality=0).quality == 1
+
+
+def test_webp_format(writers, tmp_path):
+    writer = writers(image_format='WEBP', quality=60)
+
+    data = writer.encode(_frame())
+
+    assert data[:4] == b'RIFF' and data[8:12] == b'WEBP'
+    assert (writer.extension, writer.mimetype) == ('.webp', 'image/webp')
+    assert _decode(data).shape[:2] == (900, 1600)
+
+
+def test_jpg_alias_and_unknown_format(writers):
+    assert writers(image_format='jpg').image_format == 'jpeg'
+    with pytest.raises(ValueError, match='png'):
+        ImageWriter(image_format='png')
+
+
+def test_empty_frame_is_rejected(writers):
+    writer = writers()
+
+    with pytest.raises(ValueError):
+        writer.encode(np.zeros((0, 0, 3), dtype=np.uint8))
+
+
+def test_submit_runs_in_background_and_tracks_pending(writers, tmp_path, monkeypatch):
+    writer = writers()
+    started, release = threading.Event(), threading.Event()
+    real_write_bytes = writer.write_bytes
+
+    def slow_write_bytes(*args, **kwargs):
+        started.set()
+        release.wait(5.0)
+        return real_write_bytes(*args, **kwargs)
+
+    monkeypatch.setattr(writer, 'write_bytes', slow_write_bytes)
+    done = threading.Event()
+    future = writer.submit(_frame(), str(tmp_path / 'phone_a.jpg'), callback=lambda f: done.set())
+
+    assert started.wait(5.0)
+    assert writer.get_stats()['pending'] == 1
+    release.set()
+
+    data = future.result(5.0)
+    assert (tmp_path / 'phone_a.jpg').read_bytes() == data
+    assert done.wait(5.0)
+    assert writer.get_stats()['pending'] == 0
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('DETECTION_IMAGE_FORMAT', 'webp')
+    monkeypatch.setenv('DETECTION_IMAGE_QUALITY', '70')
+    monkeypatch.setenv('DETECTION_IMAGE_PROGRESSIVE', 'yes')
+    monkeypatch.setenv('DETECTION_IMAGE_MAX_DIMENSION', '1280')
+
+    writer = ImageWriter.from_env()
+    try:
+        assert (writer.image_format, writer.quality, writer.progressive, writer.max_dimension) == (
+            'webp', 70, True, 1280)
+    finally:
+        writer.shutdown()
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+from latency_tracer import HISTOGRAM_BUCKETS_MS, LatencyTracer, _StageHistogram, mark
+
+T0 = 1_790_000_000.0
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = _StageHistogram(window=100)
+    for duration_ms in (0.0, 10.0, 10.5, 50.0, 999.9, 60000.0, 60000.1, 3_600_000.0):
+        histogram.add(duration_ms)
+
+    buckets = histogram.snapshot()['histogram']
+    assert list(buckets) == [f'le_{bound}ms' for bound in HISTOGRAM_BUCKETS_MS] + ['inf']
+    assert (buckets['le_10ms'], buckets['le_50ms'], buckets['le_1000ms'], buckets['le_60000ms'],
+            buckets['inf']) == (2, 2, 1, 1, 2)
+    assert sum(buckets.values()) == 8
+
+
+def test_percentiles_use_recent_window_and_totals_everything():
+    histogram = _StageHistogram(window=100)
+    for duration_ms in range(1000, 1100):   # wypadną z okna
+        histogram.add(float(duration_ms))
+    for duration_ms in range(1, 101):
+        histogram.add(float(duration_ms))
+
+    snapshot = histogram.snapshot()
+    assert (snapshot['p50_ms'], snapshot['p95_ms'], snapshot['p99_ms']) == (51.0, 95.0, 99.0)
+    assert (snapshot['count'], snapshot['max_ms']) == (200, 1099.0)
+    assert snapshot['avg_ms'] == round((sum(range(1000, 1100)) + sum(range(1, 101))) / 200, 1)
+
+
+def test_empty_stage_snapshot():
+    snapshot = _StageHistogram(window=10).snapshot()
+
+    assert (snapshot['count'], snapshot['avg_ms'], snapshot['p95_ms']) == (0, 0.0, 0.0)
+
+
+def test_committed_traces_fill_pipeline_stages():
+    tracer = LatencyTracer()
+    trace = {'capture': T0, 'inference_start': T0 + 0.5, 'inference_end': T0 + 0.75,
+             'zone_match': T0 + 0.75, 'enqueue': T0 + 1.0, 'anonymized': T0 + 2.0, 'db_commit': T0 + 2.5}
+
+    tracer.observe_committed([{'trace': trace}, {'trace': None}, {'trace': {'capture': T0, 'db_commit': T0 - 1}}])
+
+    stats = tracer.get_stats()
+    assert stats['traces_committed'] == 2
+    stages = stats['stages']
+    assert stages['inference']['p50_ms'] == 250.0
+    assert stages['zone_match']['p50_ms'] == 0.0
+    assert stages['capture_to_commit']['count'] == 1   # ujemny czas (przestawiony zegar) pominięty
+    assert 'frame_wait' in stages and stats['slo'] == {}
+
+
+def test_delivery_stages_and_slo_flag():
+    tracer = LatencyTracer(slo_alert_p95=5.0)
+    trace = {'capture': T0, 'db_commit': T0 + 1.0}
+    for offset in (2.0, 3.0, 4.0):
+        tracer.observe_delivery('sms', trace, {'claimed': T0 + 1.5, 'upload': T0 + 1.75,
+                                              'send_start': T0 + 1.75, 'sent': T0 + offset})
+    tracer.observe_delivery('email', trace, {'claimed': T0 + 1.5, 'send_start': T0 + 2.0, 'sent': T0 + 8.0})
+    tracer.observe_delivery('email', None, {'claimed': T0, 'sent': T0 + 1.0})   # bez śladu detekcji
+
+    stats = tracer.get_stats()
+    assert stats['deliveries_traced'] == 5
+    assert stats['stages']['outbox_claim']['count'] == 4
+    assert stats['stages']['upload']['count'] == 3
+    assert stats['stages']['send_email']['p50_ms'] == 6000.0
+    assert stats['slo'] == {
+        'alert_sms': {'target_p95_s': 5.0, 'p95_s': 4.0, 'met': True},
+        'alert_email': {'target_p95_s': 5.0, 'p95_s': 8.0, 'met': False},
+    }
+
+
+def test_timeline_orders_marks_and_offsets_from_capture():
+    trace = {'db_commit': T0 + 2.0, 'capture': T0, 'anonymized': T0 + 1.5}
+    notifications = [('sms', {'sent': T0 + 4.0, 'claimed': T0 + 2.5}), ('email', None),
+                     ('email', {'sent': T0 + 3.0, 'bad': 'x'})]
+
+    timeline = LatencyTracer.timeline(trace, notifications)
+
+    assert [(item['mark'], item['channel'], item['offset_ms']) for item in timeline] == [
+        ('capture', None, 0.0), ('anonymized', None, 1500.0), ('db_commit', None, 2000.0),
+        ('claimed', 'sms', 2500.0), ('sent', 'email', 3000.0), ('sent', 'sms', 4000.0),
+    ]
+    assert timeline[0]['at'] == datetime.fromtimestamp(T0).isoformat()
+
+
+def test_timeline_without_capture_starts_at_first_mark():
+    timeline = LatencyTracer.timeline({'db_commit': T0 + 1.0}, [('sms', {'sent': T0 + 3.0})])
+
+    assert [item['offset_ms'] for item in timeline] == [0.0, 2000.0]
+    assert LatencyTracer.timeline(None) == []
+
+
+@pytest.mark.parametrize('trace', [None, {}])
+def test_mark(trace):
+    result = mark(trace, 'capture', at=T0)
+
+    assert result is trace
+    if trace is not None:
+        assert trace == {'capture': T0}
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from notification_dispatcher import NotificationDispatcher, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def dispatcher():
+    dispatchers = []
+
+    def _make(**kwargs):
+        dispatcher = NotificationDispatcher(**kwargs)
+        dispatcher.start()
+        dispatchers.append(dispatcher)
+        return dispatcher
+
+    yield _make
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+
+class Gate:
+    """Zadanie blokujące do release(); zapisuje maksymalną liczbę równoległych wywołań na kanał."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+
+    def __call__(self, channel):
+        with self._lock:
+            self.running[channel] = self.running.get(channel, 0) + 1
+            self.peak[channel] = max(self.peak.get(channel, 0), self.running[channel])
+        self.release.wait(5.0)
+        with self._lock:
+            self.running[channel] -= 1
+        return True
+
+
+def _channel(dispatcher, channel, key):
+    return dispatcher.get_stats()['channels'][channel][key]
+
+
+def test_channel_concurrency_limits(dispatcher):
+    notifications = dispatcher(workers=4, channel_limits={'sms': 1, 'email': 2})
+    gate = Gate()
+    for _ in range(3):
+        notifications.submit('sms', gate, 'sms')
+        notifications.submit('email', gate, 'email')
+
+    assert _wait_for(lambda: gate.running.get('sms') == 1 and gate.running.get('email') == 2)
+    time.sleep(0.1)   # wolny czwarty wątek nie może wziąć kolejnego zadania SMS ani e-mail
+    stats = notifications.get_stats()
+    assert (stats['in_flight'], stats['queue_depth']) == (3, 3)
+    assert _channel(notifications, 'sms', 'queue_depth') == 2
+
+    gate.release.set()
+    assert _wait_for(lambda: _channel(notifications, 'sms', 'completed') == 3
+                     and _channel(notifications, 'email', 'completed') == 3)
+    assert gate.peak == {'sms': 1, 'email': 2}
+
+
+def test_priority_order_across_channels(dispatcher):
+    notifications = dispatcher(workers=1, channel_limits={'sms': 1, 'email': 1})
+    gate = Gate()
+    order = []
+    notifications.submit('email', gate, 'email')
+    assert _wait_for(lambda: gate.running.get('email') == 1)
+
+    for channel, name, priority in (('sms', 'digest', PRIORITY_LOW), ('email', 'first', PRIORITY_NORMAL),
+                                    ('sms', 'alert', PRIORITY_HIGH), ('email', 'second', PRIORITY_NORMAL),
+                                    ('email', 'urgent', PRIORITY_HIGH)):
+        notifications.submit(channel, order.append, name, priority=priority)
+    gate.release.set()
+
+    assert _wait_for(lambda: len(order) == 5)
+    assert order == ['alert', 'urgent', 'first', 'second', 'digest']
+
+
+def test_full_queue_drops_job(dispatcher):
+    notifications = dispatcher(workers=1, queue_size=2)
+    gate = Gate()
+    notifications.submit('sms', gate, 'sms')
+    assert _wait_for(lambda: gate.running.get('sms') == 1)
+
+    assert notifications.submit('sms', gate, 'sms')
+    assert notifications.submit('sms', gate, 'sms')
+    assert not notifications.submit('sms', gate, 'sms')
+    assert notifications.submit('email', gate, 'email')   # limit dotyczy kanału
+    assert _channel(notifications, 'sms', 'dropped') == 1
+    gate.release.set()
+
+
+def test_failures_and_callbacks(dispatcher):
+    notifications = dispatcher(workers=2)
+    results = []
+
+    def boom():
+        raise ConnectionError('SMTP down')
+
+    notifications.submit('email', boom, on_done=results.append)
+    notifications.submit('sms', lambda: False, on_done=results.append)
+    notifications.submit('sms', lambda: 'sent', on_done=results.append, created_at=time.time() - 2.0)
+
+    assert _wait_for(lambda: len(results) == 3)
+    assert sorted(results, key=str) == [None, None, 'sent']
+    assert _channel(notifications, 'email', 'failed') == 1
+    assert (_channel(notifications, 'sms', 'failed'), _channel(notifications, 'sms', 'completed')) == (1, 1)
+    assert _channel(notifications, 'sms', 'latency_avg_s') >= 2.0
+
+
+def test_unknown_channel_is_rejected():
+    with pytest.raises(ValueError, match='cloud'):
+        NotificationDispatcher().submit('cloud', print)
@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Detection, Notification
+from notification_outbox import NotificationOutbox
+
+
+@pytest.fixture
+def outbox(app):
+    outbox = NotificationOutbox(lambda rows: None, batch_size=10, max_attempts=3, retry_base=30.0, retry_max=100.0)
+    outbox.init_app(app)
+    return outbox
+
+
+def _notification(channel='sms', status='pending', **values):
+    detection = Detection(location='ławka 1', confidence=0.8, image_path='phone.jpg', timestamp=datetime.utcnow())
+    db.session.add(detection)
+    db.session.flush()
+    notification = Notification(detection_id=detection.id, channel=channel, status=status, **values)
+    db.session.add(notification)
+    db.session.commit()
+    return notification.id
+
+
+def _row(notification_id):
+    db.session.expire_all()
+    return db.session.get(Notification, notification_id)
+
+
+def _claim_one(outbox):
+    rows = outbox._claim()
+    assert len(rows) == 1
+    return rows[0]
+
+
+def _make_due(notification_id):
+    _row(notification_id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_failed_delivery_backs_off_then_gives_up(outbox):
+    notification_id = _notification()
+
+    delays = []
+    for attempt in range(1, 4):
+        row = _claim_one(outbox)
+        assert row['attempts'] == attempt
+        assert _row(notification_id).status == 'sending'
+        before = datetime.utcnow()
+        outbox.complete(row, 'failed', 'bramka SMS niedostępna')
+        outbox._flush_results()
+        stored = _row(notification_id)
+        if attempt < 3:
+            assert stored.status == 'pending'
+            assert outbox._claim() == []   # backoff jeszcze trwa
+            delays.append(round((stored.next_attempt_at - before).total_seconds()))
+            _make_due(notification_id)
+
+    assert delays == [30, 60]
+    stored = _row(notification_id)
+    assert (stored.status, stored.attempts, stored.last_error) == ('failed', 3, 'bramka SMS niedostępna')
+    assert outbox.get_stats()['retried'] == 2 and outbox.get_stats()['failed'] == 1
+
+
+def test_retry_delay_is_capped(outbox):
+    assert [outbox._retry_delay(n) for n in (1, 2, 3, 4, 10)] == [30.0, 60.0, 100.0, 100.0, 100.0]
+
+
+def test_sending_rows_return_to_pending_on_startup(outbox):
+    stuck = _notification(status='sending', attempts=1)
+    delivered = _notification(channel='email', status='delivered', attempts=1)
+
+    outbox._recover()
+
+    assert _row(stuck).status == 'pending'
+    assert _row(delivered).status == 'delivered'
+    assert _claim_one(outbox)['id'] == stuck
+
+
+def test_deferred_row_keeps_its_attempt(outbox):
+    notification_id = _notification()
+    row = _claim_one(outbox)
+    retry_at = time.time() + 120
+
+    outbox.complete(row, 'deferred', retry_at)
+    outbox._flush_results()
+
+    stored = _row(notification_id)
+    assert (stored.status, stored.attempts, stored.last_error) == ('pending', 0, 'circuit open')
+    assert abs((stored.next_attempt_at - datetime.utcfromtimestamp(retry_at)).total_seconds()) < 1
+    assert outbox._claim() == []
+    assert outbox.get_stats()['deferred'] == 1
+
+
+def test_replay_releases_only_that_channel(outbox):
+    later = datetime.utcnow() + timedelta(hours=1)
+    sms = _notification(channel='sms', next_attempt_at=later)
+    email = _notification(channel='email', next_attempt_at=later)
+
+    assert outbox._claim() == []
+    assert outbox.replay('sms') == 1
+
+    assert _claim_one(outbox)['id'] == sms
+    assert _row(email).next_attempt_at is not None
+    assert outbox.get_stats()['replayed'] == 1
+
+
+def test_delivered_row_records_latency_and_marks(outbox):
+    notification_id = _notification()
+    row = _claim_one(outbox)
+    row['marks']['sent'] = time.time()
+
+    outbox.complete(row, 'delivered')
+    outbox._flush_results()
+
+    stored = _row(notification_id)
+    assert stored.status == 'delivered' and stored.delivered_at is not None
+    assert stored.latency_ms >= 0
+    assert set(stored.trace) == {'claimed', 'sent'}
+
+
+def test_thread_recovers_and_delivers(app):
+    delivered = threading.Event()
+
+    def deliver(rows):
+        for row in rows:
+            outbox.complete(row, 'delivered')
+        delivered.set()
+
+    outbox = NotificationOutbox(deliver, poll_interval=0.05)
+    outbox.init_app(app)
+    notification_id = _notification(status='sending', attempts=1)
+    outbox.start()
+    try:
+        assert delivered.wait(5.0)
+    finally:
+        outbox.stop()
+        outbox.join(5.0)
+
+    stored = _row(notification_id)
+    assert (stored.status, stored.attempts) == ('delivered', 2)
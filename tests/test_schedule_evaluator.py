@@ -0,0 +1,124 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from schedule_evaluator import DAYS, CompiledSchedule
+
+MONDAY = date(2026, 10, 19)
+
+
+def _schedule(**days):
+    schedule = {day: {'enabled': False, 'start': '00:00', 'end': '00:00'} for day in DAYS}
+    schedule.update(days)
+    return schedule
+
+
+def _at(day, hour, minute=0, second=0):
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute, seconds=second)
+
+
+def test_window_is_half_open():
+    schedule = CompiledSchedule.compile(_schedule(monday={'enabled': True, 'start': '08:00', 'end': '16:00'}))
+
+    assert not schedule.is_within(_at(MONDAY, 7, 59, 59))
+    assert schedule.is_within(_at(MONDAY, 8))
+    assert schedule.is_within(_at(MONDAY, 15, 59, 59))
+    assert not schedule.is_within(_at(MONDAY, 16))
+
+
+def test_window_crossing_midnight_covers_both_ends_of_the_day():
+    schedule = CompiledSchedule.compile(_schedule(monday={'enabled': True, 'start': '22:00', 'end': '06:00'}))
+
+    assert schedule.describe()['weekly']['monday'] == [['00:00', '06:00'], ['22:00', '24:00']]
+    assert [schedule.is_within(_at(MONDAY, hour)) for hour in (0, 5, 6, 21, 22, 23)] == [
+        True, True, False, False, True, True]
+    assert not schedule.is_within(_at(MONDAY + timedelta(days=1), 1))
+    assert schedule.next_transition(_at(MONDAY, 23)) == _at(MONDAY + timedelta(days=1), 0)
+
+
+def test_transition_skips_continuous_midnight():
+    schedule = CompiledSchedule.compile(_schedule(
+        monday={'enabled': True, 'start': '22:00', 'end': '24:00'},
+        tuesday={'enabled': True, 'start': '00:00', 'end': '06:00'},
+    ))
+
+    assert schedule.next_transition(_at(MONDAY, 23)) == _at(MONDAY + timedelta(days=1), 6)
+    assert schedule.next_transition(_at(MONDAY, 12)) == _at(MONDAY, 22)
+
+
+def test_several_windows_per_day_are_merged():
+    schedule = CompiledSchedule.compile(_schedule(friday={'enabled': True, 'windows': [
+        {'start': '13:00', 'end': '17:00'}, {'start': '08:00', 'end': '12:00'}, {'start': '11:00', 'end': '12:30'},
+    ]}))
+    friday = MONDAY + timedelta(days=4)
+
+    assert schedule.describe()['weekly']['friday'] == [['08:00', '12:30'], ['13:00', '17:00']]
+    transitions = []
+    moment = _at(friday, 0)
+    while (moment := schedule.next_transition(moment)) is not None and moment.date() == friday:
+        transitions.append(moment.strftime('%H:%M'))
+    assert transitions == ['08:00', '12:30', '13:00', '17:00']
+
+
+def test_disabled_day_ignores_its_windows():
+    schedule = CompiledSchedule.compile(_schedule(monday={'enabled': False, 'start': '08:00', 'end': '16:00'}))
+
+    assert not schedule.is_within(_at(MONDAY, 12))
+
+
+def test_holiday_exceptions_override_weekday():
+    weekday = {'enabled': True, 'start': '08:00', 'end': '16:00'}
+    christmas, eve = date(2026, 12, 25), date(2026, 12, 24)
+    schedule = CompiledSchedule.compile(dict(
+        _schedule(**{day: weekday for day in DAYS[:5]}),
+        holidays=[{'date': christmas.isoformat()},
+                  {'date': eve.isoformat(), 'enabled': True, 'windows': [{'start': '08:00', 'end': '12:00'}]}],
+    ))
+
+    assert not schedule.is_within(_at(christmas, 10))
+    assert schedule.is_within(_at(eve, 10)) and not schedule.is_within(_at(eve, 13))
+    assert schedule.is_within(_at(eve - timedelta(days=1), 13))
+    # Po 12:00 w Wigilię następne włączenie dopiero w poniedziałek 28.12 (piątek 25.12 wyłączony)
+    assert schedule.next_transition(_at(eve, 13)) == _at(date(2026, 12, 28), 8)
+    assert schedule.describe()['exceptions'] == {'2026-12-24': [['08:00', '12:00']], '2026-12-25': []}
+
+
+@pytest.mark.parametrize('offset, expected', [(14, True), (15, False)])
+def test_next_transition_horizon(offset, expected):
+    special = MONDAY + timedelta(days=offset)
+    schedule = CompiledSchedule.compile(dict(
+        _schedule(), holidays=[{'date': special.isoformat(), 'enabled': True, 'start': '08:00', 'end': '10:00'}]
+    ))
+
+    transition = schedule.next_transition(_at(MONDAY, 12))
+    assert transition == (_at(special, 8) if expected else None)
+
+
+def test_always_on_has_no_transition():
+    schedule = CompiledSchedule.compile(_schedule(**{day: {'enabled': True, 'start': '00:00', 'end': '24:00'}
+                                                    for day in DAYS}))
+
+    assert schedule.is_within(_at(MONDAY, 3))
+    assert schedule.next_transition(_at(MONDAY, 3)) is None
+
+
+def test_empty_schedule_is_always_off():
+    assert not CompiledSchedule.compile({}).is_within(_at(MONDAY, 12))
+
+
+@pytest.mark.parametrize('schedule, message', [
+    ({day: {'enabled': True, 'start': '08:00', 'end': '16:00'} for day in DAYS[:6]}, 'Missing day in schedule: sunday'),
+    (_schedule(monday={'enabled': True, 'start': '8', 'end': '16:00'}), "Invalid time format for monday: '8'"),
+    (_schedule(monday={'enabled': True, 'start': '24:00', 'end': '16:00'}), 'Invalid time format for monday'),
+    (_schedule(monday={'enabled': True, 'start': '08:00', 'end': '16:60'}), 'Invalid time format for monday'),
+    (_schedule(monday={'start': '08:00', 'end': '16:00'}), 'Invalid config for monday'),
+    (_schedule(monday={'enabled': True, 'windows': '08:00-16:00'}), 'Invalid config for monday'),
+    (_schedule(monday={'enabled': True, 'windows': [{'start': '08:00'}]}), 'Invalid config for monday'),
+    (dict(_schedule(), holidays=[{'date': '2026-02-30'}]), 'Invalid holiday date'),
+    (dict(_schedule(), holidays=[{'date': '2026-12-24', 'enabled': True, 'start': 'x', 'end': '12:00'}]),
+     'Invalid time format for holiday 2026-12-24'),
+])
+def test_invalid_schedule_is_rejected(schedule, message):
+    # Ten sam błąd zwraca POST /api/settings jako 400 (walidacja = kompilacja)
+    with pytest.raises(ValueError, match=message):
+        CompiledSchedule.compile(schedule)
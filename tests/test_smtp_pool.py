@@ -0,0 +1,260 @@
+import asyncio
+import smtplib
+import socket
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+from smtp_pool import SMTPPool
+
+
+class RecordingHandler:
+    """Lokalny serwer SMTP: zapisuje wiadomości, opcjonalnie wstrzymuje DATA lub odrzuca MAIL kodem 421."""
+
+    def __init__(self):
+        self.messages = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.in_data = threading.Event()
+        self.reject_mail = 0
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        if self.reject_mail:
+            self.reject_mail -= 1
+            return '421 4.7.0 Try again later, closing connection'
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.in_data.set()
+        while not self.gate.is_set():
+            await asyncio.sleep(0.01)
+        self.messages.append(envelope.content)
+        return '250 Message accepted'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LocalSMTPServer:
+    """aiosmtpd na wolnym porcie; restart() zrywa wszystkie otwarte sesje."""
+
+    def __init__(self, idle_timeout=None):
+        self.handler = RecordingHandler()
+        self.port = _free_port()
+        self.kwargs = {'timeout': idle_timeout} if idle_timeout else {}
+        self.controller = None
+
+    def start(self):
+        self.controller = aiosmtpd_controller.Controller(
+            self.handler, hostname='127.0.0.1', port=self.port, **self.kwargs
+        )
+        self.controller.start()
+
+    def stop(self):
+        self.handler.gate.set()
+        self.controller.stop()
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+
+@pytest.fixture
+def smtp_server(request):
+    """Parametr fixture (indirect) = limit bezczynności sesji po stronie serwera (s)."""
+    server = LocalSMTPServer(idle_timeout=getattr(request, 'param', None))
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def _make(port, **kwargs):
+        kwargs.setdefault('noop_interval', 60.0)
+        kwargs.setdefault('max_idle', 600.0)
+        pool = SMTPPool('127.0.0.1', port, use_ssl=False, timeout=5.0, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield _make
+    for pool in pools:
+        pool.close()
+
+
+def _message(subject='Alert'):
+    message = EmailMessage()
+    message['From'] = 'camera@example.com'
+    message['To'] = 'teacher@example.com'
+    message['Subject'] = subject
+    message.set_content('Phone detected')
+    return message
+
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_session_is_reused_across_messages(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port)
+
+    for i in range(3):
+        pool.send(_message(f'Alert {i}'))
+    pool.send_many([_message('Batch 1'), _message('Batch 2')])
+
+    stats = pool.get_stats()
+    assert len(handler.messages) == 5
+    assert stats['connections_opened'] == 1
+    assert stats['messages_sent'] == 5
+    assert stats['reconnects'] == 0
+    assert stats['idle_sessions'] == 1
+
+
+@pytest.mark.parametrize('smtp_server', [0.2], indirect=True)
+def test_reconnects_after_server_drops_idle_session(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port)  # noop_interval > limit serwera - zerwana sesja trafia do wysyłki
+
+    pool.send(_message('Before drop'))
+    time.sleep(0.5)
+    pool.send(_message('After drop'))
+
+    stats = pool.get_stats()
+    assert len(handler.messages) == 2
+    assert stats['reconnects'] == 1
+    assert stats['connections_opened'] == 2
+    assert stats['messages_sent'] == 2
+
+
+def test_reconnects_after_421_service_closing(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port)
+    pool.send(_message('First'))
+
+    handler.reject_mail = 1
+    pool.send(_message('Second'))
+
+    stats = pool.get_stats()
+    assert len(handler.messages) == 2
+    assert stats['reconnects'] == 1
+
+
+def test_permanent_rejection_is_not_retried(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port)
+
+    async def reject(server, session, envelope, address, mail_options):
+        return '550 5.7.1 Sender rejected'
+
+    handler.handle_MAIL = reject
+    with pytest.raises(smtplib.SMTPSenderRefused):
+        pool.send(_message())
+
+    stats = pool.get_stats()
+    assert stats['reconnects'] == 0
+    assert stats['idle_sessions'] == 0  # sesja po błędzie nie wraca do puli
+
+
+def test_dead_idle_session_is_replaced_before_send(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port, noop_interval=0.05)
+
+    pool.send(_message('First'))
+    smtp_server.restart()  # serwer zrywa sesję leżącą w puli
+    time.sleep(0.2)
+    pool.send(_message('Second'))
+
+    stats = pool.get_stats()
+    assert len(handler.messages) == 2
+    assert stats['connections_opened'] == 2
+    assert stats['reconnects'] == 0  # martwa sesja odrzucona przez NOOP, nie przez nieudaną wysyłkę
+
+
+def test_heartbeat_keeps_idle_session_alive(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port, noop_interval=0.05, max_idle=60.0)
+
+    pool.send(_message('First'))
+    assert _wait_for(lambda: pool.get_stats()['heartbeats'] >= 2)
+    pool.send(_message('Second'))
+
+    stats = pool.get_stats()
+    assert stats['connections_opened'] == 1
+    assert stats['idle_sessions'] == 1
+
+
+def test_heartbeat_closes_session_after_max_idle(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port, noop_interval=0.05, max_idle=0.15)
+
+    pool.send(_message('First'))
+    assert pool.get_stats()['idle_sessions'] == 1
+    assert _wait_for(lambda: pool.get_stats()['idle_sessions'] == 0)
+
+    pool.send(_message('Second'))
+    assert pool.get_stats()['connections_opened'] == 2
+
+
+def test_exhausted_pool_blocks_until_session_is_released(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port, size=1)
+    handler.gate.clear()
+
+    first = threading.Thread(target=pool.send, args=(_message('Slow'),))
+    first.start()
+    assert handler.in_data.wait(3.0)
+
+    second_done = threading.Event()
+
+    def _second():
+        pool.send(_message('Waiting'))
+        second_done.set()
+
+    second = threading.Thread(target=_second)
+    second.start()
+    assert not second_done.wait(0.3)
+    assert pool.get_stats()['connections_opened'] == 1
+
+    handler.gate.set()
+    first.join(3.0)
+    second.join(3.0)
+    assert second_done.is_set()
+    stats = pool.get_stats()
+    assert stats['connections_opened'] == 1
+    assert stats['messages_sent'] == 2
+
+
+def test_pool_opens_at_most_size_connections(smtp_server, make_pool):
+    handler, port = smtp_server.handler, smtp_server.port
+    pool = make_pool(port, size=2)
+    handler.gate.clear()
+
+    threads = [threading.Thread(target=pool.send, args=(_message(f'Alert {i}'),)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    assert _wait_for(lambda: pool.get_stats()['connections_opened'] == 2)
+    time.sleep(0.2)
+    assert pool.get_stats()['connections_opened'] == 2
+
+    handler.gate.set()
+    for thread in threads:
+        thread.join(3.0)
+    assert len(handler.messages) == 5
+    assert pool.get_stats()['connections_opened'] == 2
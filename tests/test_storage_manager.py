@@ -0,0 +1,125 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from models import db, Detection, StoredFile
+from detection_writer import DetectionWriter
+from storage_manager import KIND_CLIP, KIND_IMAGE, StorageManager, get_media_root
+
+NOW = datetime.utcnow()
+
+
+class RecordingThumbnails:
+    def __init__(self):
+        self.removed = []
+
+    def remove(self, path):
+        self.removed.append(path)
+
+
+@pytest.fixture
+def manager(app, tmp_path):
+    manager = StorageManager(root=str(tmp_path), thumbnails=RecordingThumbnails(), orphan_grace=3600.0,
+                             batch_size=2)
+    manager.init_app(app)
+    return manager
+
+
+def _detection(image_path=None, clip_path=None, timestamp=NOW):
+    detection = Detection(location='ławka 1', confidence=0.8, image_path=image_path, clip_path=clip_path,
+                          timestamp=timestamp)
+    db.session.add(detection)
+    db.session.flush()
+    return detection.id
+
+
+def _file(root, path, size, age=timedelta(0), detection_id=None, kind=KIND_IMAGE):
+    filepath = root / path
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    filepath.write_bytes(b'x' * size)
+    db.session.add(StoredFile(path=path, kind=kind, bytes=size, created_at=NOW - age, detection_id=detection_id))
+    db.session.commit()
+    return filepath
+
+
+def _indexed():
+    return sorted(db.session.execute(select(StoredFile.path)).scalars())
+
+
+def _paths(detection_id):
+    db.session.expire_all()
+    detection = db.session.get(Detection, detection_id)
+    return detection.image_path, detection.clip_path
+
+
+def test_orphans_respect_grace_only_for_unreferenced_files(manager, tmp_path):
+    deleted = _file(tmp_path, 'phone_deleted.jpg', 10, detection_id=999)
+    fresh = _file(tmp_path, 'phone_fresh.jpg', 20)
+    stale = _file(tmp_path, 'phone_stale.jpg', 30, age=timedelta(hours=2))
+    kept = _file(tmp_path, 'phone_kept.jpg', 40, detection_id=_detection('phone_kept.jpg'))
+
+    report = manager.collect()
+
+    assert (report['orphans'], report['reclaimed_bytes']) == (2, 40)
+    assert not deleted.exists() and not stale.exists()
+    assert fresh.exists() and kept.exists()
+    assert _indexed() == ['phone_fresh.jpg', 'phone_kept.jpg']
+    assert sorted(manager.thumbnails.removed) == ['phone_deleted.jpg', 'phone_stale.jpg']
+
+
+def test_age_retention_detaches_paths_but_keeps_detection(manager, tmp_path):
+    manager.retention_days = 30
+    old_id = _detection('phone_old.jpg', 'clips/phone_old.mp4', timestamp=NOW - timedelta(days=40))
+    new_id = _detection('phone_new.jpg')
+    old_image = _file(tmp_path, 'phone_old.jpg', 100, age=timedelta(days=40), detection_id=old_id)
+    old_clip = _file(tmp_path, 'clips/phone_old.mp4', 500, age=timedelta(days=40), detection_id=old_id,
+                     kind=KIND_CLIP)
+    new_image = _file(tmp_path, 'phone_new.jpg', 100, detection_id=new_id)
+
+    report = manager.collect()
+
+    assert (report['expired'], report['reclaimed_bytes'], report['total_bytes']) == (2, 600, 100)
+    assert not old_image.exists() and not old_clip.exists() and new_image.exists()
+    assert _paths(old_id) == (None, None)
+    assert _paths(new_id) == ('phone_new.jpg', None)
+    assert manager.thumbnails.removed == ['phone_old.jpg']
+
+
+def test_byte_budget_evicts_oldest_first(manager, tmp_path):
+    manager.max_bytes = 250
+    ids = [_detection(f'phone_{n}.jpg') for n in range(4)]
+    files = [_file(tmp_path, f'phone_{n}.jpg', 100, age=timedelta(hours=4 - n), detection_id=ids[n])
+             for n in range(4)]
+
+    report = manager.collect()
+
+    assert (report['evicted'], report['total_bytes']) == (2, 200)
+    assert [f.exists() for f in files] == [False, False, True, True]
+    assert [_paths(i)[0] for i in ids] == [None, None, 'phone_2.jpg', 'phone_3.jpg']
+    assert manager.collect()['evicted'] == 0
+
+
+def test_disabled_limits_keep_everything(manager, tmp_path):
+    detection_id = _detection('phone_old.jpg')
+    old_image = _file(tmp_path, 'phone_old.jpg', 100, age=timedelta(days=400), detection_id=detection_id)
+
+    report = manager.collect()
+
+    assert (report['expired'], report['evicted'], report['reclaimed_bytes']) == (0, 0, 0)
+    assert old_image.exists() and _paths(detection_id)[0] == 'phone_old.jpg'
+
+
+def test_media_root_is_shared_and_absolute(monkeypatch, tmp_path):
+    monkeypatch.delenv('DETECTION_MEDIA_ROOT', raising=False)
+    default = get_media_root()
+    assert os.path.isabs(default) and os.path.basename(default) == 'detections'
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DETECTION_MEDIA_ROOT', 'media')
+    root = str(tmp_path / 'media')
+
+    assert get_media_root() == root
+    assert DetectionWriter.from_env().media_root == root
+    assert StorageManager.from_env().root == root
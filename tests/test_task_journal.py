@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import pytest
+
+from task_journal import STAGE_ANONYMIZED, STAGE_CAPTURED, STAGE_STORED, TaskJournal
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'journal.db')
+
+
+@pytest.fixture
+def image(tmp_path):
+    def _image(name):
+        path = tmp_path / name
+        path.write_bytes(b'jpeg')
+        return str(path)
+    return _image
+
+
+def _task(filepath, **kwargs):
+    return dict({'filepath': filepath, 'confidence': 0.8, 'zone_name': 'ławka 1', 'should_blur': True,
+                 'phone_box': [1, 2, 3, 4], 'timestamp': datetime(2026, 3, 2, 8, 30)}, **kwargs)
+
+
+def _restart(journal):
+    journal.close()
+    return TaskJournal(journal.path)
+
+
+def test_stage_is_resumed_after_restart(journal_path, image):
+    journal = TaskJournal(journal_path)
+    captured = journal.record(_task(image('phone_a.jpg')))
+    anonymized = journal.record(_task(image('phone_b.jpg')))
+    stored = journal.record(_task(image('phone_c.jpg')))
+    done = journal.record(_task(image('phone_d.jpg')))
+    journal.mark_anonymized(anonymized)
+    journal.mark_anonymized(stored)
+    journal.mark_stored(stored, detection_id=42)
+    journal.mark_stored(done, detection_id=43)
+    journal.mark_notified(done)
+
+    journal = _restart(journal)
+    tasks = {task['task_id']: task for task in journal.pending()}
+
+    assert set(tasks) == {captured, anonymized, stored}
+    assert tasks[captured]['stage'] == STAGE_CAPTURED
+    assert tasks[anonymized]['stage'] == STAGE_ANONYMIZED
+    assert tasks[stored]['stage'] == STAGE_STORED and tasks[stored]['detection_id'] == 42
+    task = tasks[captured]
+    assert (task['confidence'], task['zone_name'], task['phone_box']) == (0.8, 'ławka 1', [1, 2, 3, 4])
+    assert task['timestamp'] == datetime(2026, 3, 2, 8, 30) and task['recovered']
+    assert journal.get_stats()['notified'] == 1
+
+
+def test_notification_before_store_is_not_repeated(journal_path, image):
+    journal = TaskJournal(journal_path)
+    task_id = journal.record(_task(image('phone_a.jpg')))
+    journal.mark_notified(task_id)
+
+    (task,) = _restart(journal).pending()
+    assert task['notified'] and task['stage'] == STAGE_CAPTURED
+
+    journal = TaskJournal(journal_path)
+    journal.mark_stored(task_id, detection_id=7)
+    assert journal.pending() == []
+    assert journal.get_stats()['notified'] == 1
+
+
+def test_stages_never_go_back(journal_path, image):
+    journal = TaskJournal(journal_path)
+    task_id = journal.record(_task(image('phone_a.jpg')))
+    journal.mark_stored(task_id, detection_id=5)
+    journal.mark_anonymized(task_id)
+
+    (task,) = journal.pending()
+    assert task['stage'] == STAGE_STORED and task['detection_id'] == 5
+
+
+def test_attempts_increase_on_every_recovery(journal_path, image):
+    journal = TaskJournal(journal_path)
+    journal.record(_task(image('phone_a.jpg')))
+
+    assert [task['attempts'] for task in journal.pending()] == [1]
+    journal = _restart(journal)
+    assert [task['attempts'] for task in journal.pending()] == [2]
+    assert [task['attempts'] for task in _restart(journal).pending()] == [3]
+
+
+def test_duplicate_filepath_raises(journal_path, image):
+    journal = TaskJournal(journal_path)
+    path = image('phone_a.jpg')
+    journal.record(_task(path))
+
+    with pytest.raises(ValueError, match='already recorded'):
+        journal.record(_task(path, confidence=0.3))
+    assert len(journal.pending()) == 1
+
+
+def test_recovery_drops_tasks_without_image(journal_path, image, tmp_path):
+    journal = TaskJournal(journal_path)
+    kept = journal.record(_task(image('phone_a.jpg')))
+    lost = journal.record(_task(str(tmp_path / 'phone_deleted.jpg')))
+
+    assert [task['task_id'] for task in _restart(journal).pending()] == [kept]
+    # Usunięte z dziennika, a nie tylko pominięte w tym przebiegu
+    assert [task['task_id'] for task in TaskJournal(journal_path).pending()] == [kept]
+    assert lost != kept
+
+
+def test_purge_completed_keeps_recent_and_pending(journal_path, image):
+    journal = TaskJournal(journal_path)
+    done = journal.record(_task(image('phone_a.jpg')))
+    journal.record(_task(image('phone_b.jpg')))
+    journal.mark_stored(done, detection_id=1)
+    journal.mark_notified(done)
+
+    assert journal.purge_completed(older_than_seconds=3600) == 0
+    assert journal.purge_completed(older_than_seconds=-1) == 1
+    assert journal.get_stats() == {'captured': 1, 'anonymized': 0, 'stored': 0, 'notified': 0}
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import pytest
+
+from thumbnail_store import DIGEST_LENGTH, ThumbnailStore
+
+DIGEST = '0123456789abcdef'
+
+
+def _jpeg(value=200, width=800, height=600):
+    frame = np.full((height, width, 3), value, dtype=np.uint8)
+    success, buffer = cv2.imencode('.jpg', frame)
+    assert success
+    return buffer.tobytes()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ThumbnailStore(root=str(tmp_path / 'thumbs'), sizes=(160, 320))
+
+
+@pytest.mark.parametrize('name, expected', [
+    (f'phone_20260301_093000_123_camera-1_lawka-1_1a2b3c4d-{DIGEST}.jpg',
+     ('phone_20260301_093000_123_camera-1_lawka-1_1a2b3c4d', DIGEST)),   # myślniki w nazwie obrazu
+    (f'phone_x-{DIGEST}.jpg', ('phone_x', DIGEST)),
+    (f'phone_x-{DIGEST.upper()}.jpg', None),       # skrót tylko małymi literami
+    (f'phone_x-{DIGEST[:-1]}.jpg', None),          # za krótki skrót
+    (f'phone_x{DIGEST}.jpg', None),                # brak separatora przed skrótem
+    (f'phone_x-{DIGEST}.jpg.tmp', None),           # niedokończony zapis
+    (f'phone_x-{DIGEST}.webp', None),
+    (f'-{DIGEST}.jpg', None),
+])
+def test_parse_name(name, expected):
+    assert ThumbnailStore.parse_name(name) == expected
+
+
+def test_digest_is_content_prefix():
+    digest = ThumbnailStore.digest(b'image')
+    assert len(digest) == DIGEST_LENGTH
+    assert digest == ThumbnailStore.digest(b'image') != ThumbnailStore.digest(b'image2')
+
+
+def test_generate_creates_pyramid_and_urls(store, tmp_path):
+    data = _jpeg()
+    assert store.urls('phone_a.jpg') is None
+
+    assert store.generate('detections/phone_a.jpg', data) == 2
+
+    digest = ThumbnailStore.digest(data)
+    assert store.urls('phone_a.jpg') == {
+        '160': f'thumbs/160/phone_a-{digest}.jpg',
+        '320': f'thumbs/320/phone_a-{digest}.jpg',
+    }
+    thumb = cv2.imread(str(tmp_path / 'thumbs' / '320' / f'phone_a-{digest}.jpg'))
+    assert thumb.shape[:2] == (240, 320)
+    for url in store.urls('phone_a.jpg').values():
+        assert ThumbnailStore.parse_name(url.rsplit('/', 1)[1]) == ('phone_a', digest)
+    assert store.generate('phone_a.jpg', data) == 0   # ta sama treść - nic do zrobienia
+
+
+def test_changed_content_replaces_thumbnails(store, tmp_path):
+    old, new = _jpeg(100), _jpeg(220)
+    store.generate('phone_a.jpg', old)
+    store.generate('phone_a.jpg', new)
+
+    new_digest = ThumbnailStore.digest(new)
+    assert store.urls('phone_a.jpg')['160'].endswith(f'-{new_digest}.jpg')
+    assert sorted(p.name for p in (tmp_path / 'thumbs' / '160').iterdir()) == [f'phone_a-{new_digest}.jpg']
+
+
+def test_index_is_rebuilt_from_disk(store, tmp_path):
+    data = _jpeg()
+    store.generate('phone_a.jpg', data)
+    (tmp_path / 'thumbs' / '160' / 'notes.txt').write_text('ignored')
+
+    reloaded = ThumbnailStore(root=store.root, sizes=store.sizes)
+
+    assert reloaded.urls('phone_a.jpg') == store.urls('phone_a.jpg')
+    assert reloaded.get_stats()['indexed_images'] == 1
+
+
+def test_remove_deletes_files_and_urls(store, tmp_path):
+    store.generate('phone_a.jpg', _jpeg())
+    store.remove('phone_a.jpg')
+
+    assert store.urls('phone_a.jpg') is None
+    assert not any((tmp_path / 'thumbs' / '160').iterdir())
+
+
+def test_undecodable_image_counts_failure(store):
+    assert store.generate('phone_bad.jpg', b'not an image') == 0
+    assert store.get_stats()['failures'] == 1
+    assert store.urls('phone_bad.jpg') is None
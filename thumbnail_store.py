@@ -0,0 +1,252 @@
+"""
+Miniatury obrazów detekcji (piramida kilku stałych rozmiarów).
+
+Miniatury powstają raz, przy zapisie detekcji (z obrazu w pamięci, już
+zanonimizowanego), w katalogu detections/thumbs/<rozmiar>/<nazwa>-<skrót>.jpg.
+Skrót to początek SHA-256 pliku źródłowego, więc adres miniatury zmienia się
+razem z treścią obrazu i może być cache'owany bez końca (immutable, ETag = skrót).
+
+Uzupełnienie miniatur dla istniejących plików:
+    python thumbnail_store.py --backfill
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIGEST_LENGTH = 16
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.webp', '.png')
+
+_THUMB_NAME = re.compile(r'^(?P<stem>.+)-(?P<digest>[0-9a-f]{%d})\.jpg$' % DIGEST_LENGTH)
+
+
+def _parse_sizes(value):
+    return tuple(sorted({int(size) for size in value.split(',') if size.strip()}))
+
+
+class ThumbnailStore:
+    """
+    Piramida miniatur z adresami zależnymi od treści.
+
+    Indeks nazwa obrazu -> skrót ładowany jest raz z katalogu miniatur
+    i aktualizowany przy generowaniu, więc budowanie adresów dla listy
+    detekcji nie dotyka dysku.
+    """
+
+    def __init__(self, root=os.path.join('detections', 'thumbs'), sizes=(160, 320, 640), quality=75):
+        self.root = root
+        self.sizes = tuple(sizes)
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        self._index = None
+
+        self.generated = 0
+        self.failures = 0
+        self.bytes_written = 0
+
+    @classmethod
+    def from_env(cls, root=os.path.join('detections', 'thumbs')):
+        return cls(
+            root=root,
+            sizes=_parse_sizes(os.getenv('THUMBNAIL_SIZES', '160,320,640')),
+            quality=int(os.getenv('THUMBNAIL_QUALITY', '75'))
+        )
+
+    @staticmethod
+    def digest(data):
+        """Skrót treści obrazu źródłowego (część adresu miniatury)."""
+        return hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+
+    @staticmethod
+    def parse_name(name):
+        """Nazwa pliku miniatury -> (nazwa obrazu bez rozszerzenia, skrót) lub None."""
+        match = _THUMB_NAME.match(name)
+        return (match.group('stem'), match.group('digest')) if match else None
+
+    def _load_index(self):
+        index = {}
+        for size in self.sizes:
+            directory = os.path.join(self.root, str(size))
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    parsed = self.parse_name(entry.name)
+                    if parsed:
+                        index.setdefault(parsed[0], set()).add((size, parsed[1]))
+        return {stem: {size: digest for size, digest in entries} for stem, entries in index.items()}
+
+    def _get_index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            return self._index
+
+    def path_for(self, size, stem, digest):
+        return os.path.join(self.root, str(size), f'{stem}-{digest}.jpg')
+
+    def urls(self, image_path):
+        """
+        Adresy miniatur względem /detections/ (np. 'thumbs/320/phone_x-<skrót>.jpg').
+
+        Returns:
+            {rozmiar (str): adres} lub None, jeśli miniatur jeszcze nie ma
+        """
+        if not image_path:
+            return None
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        digests = self._get_index().get(stem)
+        if not digests:
+            return None
+        return {str(size): f'thumbs/{size}/{stem}-{digest}.jpg' for size, digest in sorted(digests.items())}
+
+    def _resize(self, image, size):
+        h, w = image.shape[:2]
+        longest = max(h, w)
+        if longest <= size:
+            return image
+        scale = size / float(longest)
+        return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    def generate(self, image_path, data, image=None):
+        """
+        Tworzy brakujące miniatury obrazu i usuwa nieaktualne (po zmianie treści).
+
+        Args:
+            image_path: Ścieżka lub nazwa obrazu detekcji
+            data: Bajty obrazu źródłowego (do skrótu)
+            image: Zdekodowany obraz (BGR) - jeśli None, dekodowany z data
+
+        Returns:
+            Liczba utworzonych miniatur
+        """
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        digest = self.digest(data)
+        index = self._get_index()
+        with self._lock:
+            current = dict(index.get(stem) or {})
+        missing = [size for size in self.sizes if current.get(size) != digest]
+        if not missing:
+            return 0
+
+        created = 0
+        try:
+            if image is None:
+                image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    raise ValueError(f"Cannot decode image {image_path}")
+            # Od największej: każda mniejsza miniatura skalowana jest z poprzedniej
+            source = image
+            for size in sorted(self.sizes, reverse=True):
+                source = self._resize(source, size)
+                if size not in missing:
+                    continue
+                success, buffer = cv2.imencode('.jpg', source, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not success:
+                    raise RuntimeError(f"Cannot encode {size}px thumbnail for {image_path}")
+                path = self.path_for(size, stem, digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer)
+                os.replace(tmp_path, path)
+                if current.get(size):
+                    self._remove(self.path_for(size, stem, current[size]))
+                with self._lock:
+                    index.setdefault(stem, {})[size] = digest
+                    self.generated += 1
+                    self.bytes_written += len(buffer)
+                created += 1
+        except Exception as e:
+            logger.error(f"Thumbnail generation failed for {image_path}: {e}")
+            with self._lock:
+                self.failures += 1
+        return created
+
+    def generate_from_file(self, image_path):
+        """Tworzy miniatury dla pliku na dysku (backfill)."""
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        return self.generate(image_path, data)
+
+    def remove(self, image_path):
+        """Usuwa miniatury obrazu (np. po usunięciu detekcji)."""
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        index = self._get_index()
+        with self._lock:
+            digests = index.pop(stem, None) or {}
+        for size, digest in digests.items():
+            self._remove(self.path_for(size, stem, digest))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cannot remove thumbnail {path}: {e}")
+
+    def backfill(self, images_dir):
+        """
+        Generuje brakujące miniatury dla wszystkich obrazów w katalogu.
+
+        Returns:
+            {'images': sprawdzone obrazy, 'generated': utworzone miniatury, 'failures': błędy}
+        """
+        images = generated = 0
+        failures_before = self.failures
+        with os.scandir(images_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                images += 1
+                try:
+                    generated += self.generate_from_file(entry.path)
+                except OSError as e:
+                    logger.error(f"Cannot read {entry.path}: {e}")
+                    self.failures += 1
+        return {'images': images, 'generated': generated, 'failures': self.failures - failures_before}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'sizes': list(self.sizes),
+                'indexed_images': len(self._index) if self._index is not None else None,
+                'generated': self.generated,
+                'failures': self.failures,
+                'bytes_written': self.bytes_written,
+                'avg_bytes': int(self.bytes_written / self.generated) if self.generated else 0,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Miniatury obrazów detekcji')
+    parser.add_argument('--backfill', action='store_true', help='utwórz brakujące miniatury istniejących obrazów')
+    parser.add_argument('--dir', help='katalog obrazów detekcji (domyślnie DETECTION_MEDIA_ROOT)')
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+        return 1
+
+    if not args.dir:
+        from storage_manager import get_media_root
+        args.dir = get_media_root()
+    store = ThumbnailStore.from_env(root=os.path.join(args.dir, 'thumbs'))
+    result = store.backfill(args.dir)
+    print(f"✅ Sprawdzono {result['images']} obrazów, utworzono {result['generated']} miniatur"
+          f" (błędy: {result['failures']})")
+    return 1 if result['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,488 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from circuit_breaker import CircuitBreaker, STATE_CLOSED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'upload_spool')
+
+
+class UploadBackend:
+    """
+    Interfejs backendu uploadu. upload() zwraca publiczny URL lub rzuca wyjątek.
+    """
+
+    name = 'base'
+
+    def upload(self, key, data, mimetype, filename):
+        """
+        Args:
+            key: Nazwa obiektu wyprowadzona z hasha treści (bez rozszerzenia)
+            data: Bajty obrazu
+            mimetype: Typ MIME (np. image/jpeg)
+            filename: Oryginalna nazwa pliku
+
+        Returns:
+            Publiczny URL (str)
+        """
+        raise NotImplementedError
+
+
+class CloudinaryBackend(UploadBackend):
+    """Upload na Cloudinary. overwrite=False - istniejący obiekt o tym public_id nie jest wysyłany ponownie."""
+
+    name = 'cloudinary'
+
+    def __init__(self, folder='phone_detections'):
+        import cloudinary.uploader
+        self._uploader = cloudinary.uploader
+        self.folder = folder
+
+    def upload(self, key, data, mimetype, filename):
+        from io import BytesIO
+        payload = BytesIO(data)
+        payload.name = filename
+        response = self._uploader.upload(
+            payload,
+            folder=self.folder,
+            public_id=key,
+            resource_type='image',
+            overwrite=False
+        )
+        secure_url = response.get('secure_url')
+        if not secure_url:
+            raise RuntimeError(f"Cloudinary response without secure_url: {response}")
+        return secure_url
+
+
+class LocalDirectoryBackend(UploadBackend):
+    """Kopiuje obraz do lokalnego katalogu (np. statycznie serwowanego) - lokalny zamiennik chmury."""
+
+    name = 'local'
+
+    def __init__(self, directory, base_url=None):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/') if base_url else None
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, key, data, mimetype, filename):
+        name = f"{key}{os.path.splitext(filename)[1]}"
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        if self.base_url:
+            return f"{self.base_url}/{name}"
+        return f"file://{os.path.abspath(path)}"
+
+
+class S3Backend(UploadBackend):
+    """Upload do bucketu S3 lub zgodnego z S3 (MinIO, R2) - wymaga pakietu boto3."""
+
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, prefix='phone_detections', public_base_url=None, region=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("S3 upload backend requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') if prefix else ''
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+        self._client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+
+    def upload(self, key, data, mimetype, filename):
+        object_key = f"{key}{os.path.splitext(filename)[1]}"
+        if self.prefix:
+            object_key = f"{self.prefix}/{object_key}"
+        self._client.put_object(Bucket=self.bucket, Key=object_key, Body=data, ContentType=mimetype)
+        if self.public_base_url:
+            return f"{self.public_base_url}/{object_key}"
+        return self._client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': object_key}, ExpiresIn=7 * 24 * 3600
+        )
+
+
+def backend_from_env(cloudinary_enabled=False):
+    """
+    Wybiera backend na podstawie UPLOAD_BACKEND (cloudinary, local, s3, none).
+    Domyślnie cloudinary, jeśli Cloudinary jest skonfigurowane.
+
+    Returns:
+        UploadBackend lub None
+    """
+    name = os.getenv('UPLOAD_BACKEND', 'cloudinary' if cloudinary_enabled else 'none').strip().lower()
+    if name == 'cloudinary':
+        if not cloudinary_enabled:
+            logger.error("UPLOAD_BACKEND=cloudinary but Cloudinary is not configured")
+            return None
+        return CloudinaryBackend()
+    if name == 'local':
+        return LocalDirectoryBackend(
+            os.getenv('UPLOAD_LOCAL_DIR', os.path.join('detections', 'uploads')),
+            base_url=os.getenv('UPLOAD_LOCAL_BASE_URL')
+        )
+    if name == 's3':
+        return S3Backend(
+            os.getenv('S3_BUCKET'),
+            endpoint_url=os.getenv('S3_ENDPOINT_URL') or None,
+            prefix=os.getenv('S3_PREFIX', 'phone_detections'),
+            public_base_url=os.getenv('S3_PUBLIC_BASE_URL') or None,
+            region=os.getenv('S3_REGION') or None
+        )
+    if name not in ('none', ''):
+        logger.error(f"Unknown UPLOAD_BACKEND: {name}")
+    return None
+
+
+class _UploadJob:
+    __slots__ = ('digest', 'filename', 'mimetype', 'data', 'attempts', 'futures', 'spooled')
+
+    def __init__(self, digest, filename, mimetype, data, attempts=0, spooled=False):
+        self.digest = digest
+        self.filename = filename
+        self.mimetype = mimetype
+        self.data = data
+        self.attempts = attempts
+        self.futures = []
+        self.spooled = spooled
+
+
+class UploadService:
+    """
+    Równoległy upload obrazów detekcji z ponawianiem i deduplikacją.
+
+    - ograniczona pula wątków (workers),
+    - ponawianie z wykładniczym backoffem (+ losowy jitter),
+    - deduplikacja po SHA-256 treści: ten sam obraz nie jest wysyłany ponownie,
+      a równoległe zgłoszenia tej samej treści czekają na jeden upload,
+    - spool na dysku (SQLite + pliki): nieudane uploady są wznawiane po restarcie,
+    - CircuitBreaker: przy awarii dostawcy uploady są od razu odkładane (bez czekania
+      na timeout i bez zużywania prób), a po jego powrocie kolejka jest odtwarzana.
+    """
+
+    def __init__(self, backend, spool_dir=DEFAULT_SPOOL_DIR, workers=2, max_attempts=5,
+                 backoff_base=1.0, backoff_max=60.0, link_deadline=10.0, breaker=None):
+        self.backend = backend
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.link_deadline = link_deadline
+        self.breaker = breaker if breaker is not None else CircuitBreaker.from_env(backend.name)
+        self.breaker.add_listener(self._on_breaker_change)
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(spool_dir, 'uploads.db'), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS uploaded (
+                digest TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS spool (
+                digest TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                mimetype TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._retry_heap = []
+        self._active = {}
+        self._scheduler = None
+        self.is_running = False
+
+        self._stats_lock = threading.Lock()
+        self.uploads_succeeded = 0
+        self.uploads_failed = 0
+        self.retries = 0
+        self.dedupe_hits = 0
+        self.gave_up = 0
+        self.deferred = 0
+        self.last_upload_ms = 0.0
+
+    @classmethod
+    def from_env(cls, cloudinary_enabled=False):
+        """Tworzy usługę lub zwraca None, jeśli żaden backend uploadu nie jest skonfigurowany."""
+        backend = backend_from_env(cloudinary_enabled)
+        if backend is None:
+            return None
+        return cls(
+            backend,
+            spool_dir=os.getenv('UPLOAD_SPOOL_DIR', DEFAULT_SPOOL_DIR),
+            workers=int(os.getenv('UPLOAD_WORKERS', '2')),
+            max_attempts=int(os.getenv('UPLOAD_MAX_ATTEMPTS', '5')),
+            backoff_base=float(os.getenv('UPLOAD_BACKOFF_BASE', '1')),
+            backoff_max=float(os.getenv('UPLOAD_BACKOFF_MAX', '60')),
+            link_deadline=float(os.getenv('UPLOAD_LINK_DEADLINE', '10'))
+        )
+
+    def start(self):
+        """Uruchamia wątek ponowień i wznawia uploady ze spoolu (po restarcie)."""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._scheduler = threading.Thread(target=self._retry_loop, name='upload-retry', daemon=True)
+        self._scheduler.start()
+
+        with self._db_lock:
+            rows = self._conn.execute('SELECT digest, filename, mimetype, attempts FROM spool').fetchall()
+        resumed = 0
+        for row in rows:
+            path = self._spool_path(row['digest'], row['filename'])
+            if not os.path.exists(path):
+                self._unspool(row['digest'], row['filename'])
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            job = _UploadJob(row['digest'], row['filename'], row['mimetype'], data, attempts=row['attempts'], spooled=True)
+            with self._cond:
+                if job.digest in self._active:
+                    continue
+                self._active[job.digest] = job
+            self._executor.submit(self._attempt, job)
+            resumed += 1
+        if resumed:
+            print(f"♻️  Wznowiono {resumed} uploadów ze spoolu")
+
+    def _lookup(self, digest):
+        with self._db_lock:
+            row = self._conn.execute('SELECT url FROM uploaded WHERE digest = ?', (digest,)).fetchone()
+        return row['url'] if row else None
+
+    def _spool_path(self, digest, filename):
+        return os.path.join(self.spool_dir, f"{digest}{os.path.splitext(filename)[1]}")
+
+    def _spool(self, job, error):
+        path = self._spool_path(job.digest, job.filename)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(job.data)
+            os.replace(tmp_path, path)
+        with self._db_lock:
+            self._conn.execute(
+                'INSERT INTO spool (digest, filename, mimetype, attempts, last_error, updated_at) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(digest) DO UPDATE SET attempts = excluded.attempts, last_error = excluded.last_error, '
+                'updated_at = excluded.updated_at',
+                (job.digest, job.filename, job.mimetype, job.attempts, str(error)[:500], time.time())
+            )
+        job.spooled = True
+
+    def _unspool(self, digest, filename):
+        with self._db_lock:
+            self._conn.execute('DELETE FROM spool WHERE digest = ?', (digest,))
+        try:
+            os.remove(self._spool_path(digest, filename))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, artifact):
+        """
+        Zleca upload artefaktu (DetectionArtifact).
+
+        Returns:
+            concurrent.futures.Future z publicznym URL (None, jeśli wszystkie próby się nie powiodły)
+        """
+        future = Future()
+        url = self._lookup(artifact.sha256)
+        if url is not None:
+            with self._stats_lock:
+                self.dedupe_hits += 1
+            future.set_result(url)
+            return future
+
+        with self._cond:
+            job = self._active.get(artifact.sha256)
+            if job is not None:
+                job.futures.append(future)
+                with self._stats_lock:
+                    self.dedupe_hits += 1
+                return future
+            job = _UploadJob(artifact.sha256, artifact.filename, artifact.mimetype, artifact.data)
+            job.futures.append(future)
+            self._active[job.digest] = job
+        self._executor.submit(self._attempt, job)
+        return future
+
+    def _on_breaker_change(self, name, old_state, new_state):
+        if new_state != STATE_CLOSED:
+            return
+        # Dostawca wrócił - odkładane uploady ruszają od razu
+        with self._cond:
+            now = time.monotonic()
+            self._retry_heap = [(min(due, now), seq, job) for due, seq, job in self._retry_heap]
+            heapq.heapify(self._retry_heap)
+            self._cond.notify()
+        print(f"🔌 Dostawca uploadu '{name}' dostępny - odtwarzam {len(self._retry_heap)} zaległych uploadów")
+
+    def _defer(self, job):
+        """
+        Odkłada upload do czasu próby obwodu; czekający na link dostają None od razu (fast-fail).
+
+        Zlecenie opuszcza _active, więc kolejne zgłoszenie tej samej treści też
+        dostaje od razu None, zamiast czekać na zamknięcie obwodu.
+        """
+        retry_at = self.breaker.retry_at() or time.time()
+        try:
+            self._spool(job, 'circuit open')
+        except Exception as spool_error:
+            logger.error(f"Cannot spool upload {job.filename}: {spool_error}")
+        with self._cond:
+            if self._active.get(job.digest) is job:
+                del self._active[job.digest]
+            futures, job.futures = job.futures, []
+            heapq.heappush(self._retry_heap, (time.monotonic() + max(0.0, retry_at - time.time()), next(self._seq), job))
+            self._cond.notify()
+        with self._stats_lock:
+            self.deferred += 1
+        for future in futures:
+            if not future.done():
+                future.set_result(None)
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _finish(self, job, url):
+        with self._cond:
+            self._active.pop(job.digest, None)
+            futures, job.futures = job.futures, []
+        for future in futures:
+            if not future.done():
+                future.set_result(url)
+
+    def _attempt(self, job):
+        with self._cond:
+            current = self._active.get(job.digest)
+            if current is None:
+                self._active[job.digest] = job
+        if current is not None and current is not job:
+            # Ta sama treść jest już wysyłana przez nowsze zlecenie (zgłoszone po odłożeniu tego)
+            return None
+        if current is None:
+            # Powrót odłożonego zlecenia - treść mogła już zostać wysłana przez inne
+            url = self._lookup(job.digest)
+            if url is not None:
+                if job.spooled:
+                    self._unspool(job.digest, job.filename)
+                self._finish(job, url)
+                return url
+
+        if not self.breaker.allow():
+            self._defer(job)
+            return None
+
+        job.attempts += 1
+        start = time.perf_counter()
+        try:
+            url = self.backend.upload(job.digest, job.data, job.mimetype, job.filename)
+        except Exception as e:
+            self.breaker.record_failure(e)
+            with self._stats_lock:
+                self.uploads_failed += 1
+            if job.attempts >= self.max_attempts:
+                logger.error(f"Upload of {job.filename} failed after {job.attempts} attempts: {e} - left in spool")
+                with self._stats_lock:
+                    self.gave_up += 1
+                try:
+                    self._spool(job, e)
+                except Exception as spool_error:
+                    logger.error(f"Cannot spool upload {job.filename}: {spool_error}")
+                self._finish(job, None)
+                return None
+
+            delay = self._backoff(job.attempts)
+            logger.warning(f"Upload of {job.filename} failed (attempt {job.attempts}/{self.max_attempts}): {e} - retry in {delay:.1f}s")
+            try:
+                self._spool(job, e)
+            except Exception as spool_error:
+                logger.error(f"Cannot spool upload {job.filename}: {spool_error}")
+            with self._cond:
+                heapq.heappush(self._retry_heap, (time.monotonic() + delay, next(self._seq), job))
+                self._cond.notify()
+            with self._stats_lock:
+                self.retries += 1
+            return None
+
+        self.breaker.record_success()
+        elapsed = time.perf_counter() - start
+        with self._db_lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO uploaded (digest, url, backend, created_at) VALUES (?, ?, ?, ?)',
+                (job.digest, url, self.backend.name, time.time())
+            )
+        if job.spooled:
+            self._unspool(job.digest, job.filename)
+        with self._stats_lock:
+            self.uploads_succeeded += 1
+            self.last_upload_ms = round(elapsed * 1000, 2)
+        print(f"✅ Plik wysłany ({self.backend.name}): {url}")
+        self._finish(job, url)
+        return url
+
+    def _retry_loop(self):
+        while self.is_running:
+            with self._cond:
+                while self.is_running and (not self._retry_heap or self._retry_heap[0][0] > time.monotonic()):
+                    timeout = self._retry_heap[0][0] - time.monotonic() if self._retry_heap else None
+                    self._cond.wait(timeout=timeout)
+                if not self.is_running:
+                    break
+                _, _, job = heapq.heappop(self._retry_heap)
+            self._executor.submit(self._attempt, job)
+
+    def get_stats(self):
+        with self._db_lock:
+            spooled = self._conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+        with self._cond:
+            active = len(self._active)
+            waiting_retry = len(self._retry_heap)
+        with self._stats_lock:
+            return {
+                'backend': self.backend.name,
+                'workers': self.workers,
+                'link_deadline_s': self.link_deadline,
+                'active': active,
+                'waiting_retry': waiting_retry,
+                'spooled': spooled,
+                'succeeded': self.uploads_succeeded,
+                'failed_attempts': self.uploads_failed,
+                'retries': self.retries,
+                'gave_up': self.gave_up,
+                'deferred': self.deferred,
+                'circuit': self.breaker.get_state(),
+                'dedupe_hits': self.dedupe_hits,
+                'last_upload_ms': self.last_upload_ms,
+            }
+
+    def stop(self):
+        """Zatrzymuje usługę. Oczekujące ponowienia zostają w spoolu i zostaną wznowione po restarcie."""
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)